@@ -0,0 +1,75 @@
+"""
+Benchmark de persistência do CustomAIManager.
+Mede quantos bytes cada tipo de atualização grava em disco, comparado com
+a regravação completa (index.json + um template por modelo) do formato antigo.
+
+Uso: python benchmark_custom_ai_storage.py [modelos] [nodes_por_modelo]
+"""
+import json
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from src.core.custom_ai_manager import CustomAIManager, CustomAIModel
+
+
+def _dir_bytes(path):
+    return sum(f.stat().st_size for f in Path(path).rglob("*.json") if f.is_file())
+
+
+def run_benchmark(n_models=200, n_nodes=200):
+    app_dir = Path(tempfile.mkdtemp(prefix="aica_bench_"))
+    CustomAIManager._get_app_dir = staticmethod(lambda: app_dir)
+
+    print("=== BENCHMARK DE PERSISTÊNCIA DO CustomAIManager ===")
+    print(f"Modelos: {n_models} | Nodes por modelo: {n_nodes} | Pasta: {app_dir}")
+
+    manager = CustomAIManager()
+    with manager.batch():
+        for i in range(n_models):
+            model = CustomAIModel(
+                id=f"bench{i:04d}", name=f"Bot {i % (n_models // 4 or 1)}", description="benchmark",
+                base_provider="offline", base_model="richie-v1", system_prompt="Você é um bot de teste.",
+                _flow_nodes=[{"id": f"n{j}", "type": "message", "data": {"text": "x" * 120}} for j in range(n_nodes)],
+                training_data=[{"input": "pergunta " * 8, "output": "resposta " * 16} for _ in range(50)]
+            )
+            manager.models[model.id] = model
+            manager._save_models(model.id)
+    manager.flush()
+
+    # Formato antigo: index.json com os modelos completos + todos os templates
+    legacy_index = json.dumps({"version": "1.0", "models": [asdict(m) for m in manager.models.values()]},
+                              indent=2, ensure_ascii=False)
+    full_rewrite = len(legacy_index.encode("utf-8")) + _dir_bytes(manager.templates_dir)
+    print(f"\nRegravação completa (formato antigo, por atualização): {full_rewrite / 1024:.0f} KB")
+
+    cold = time.perf_counter()
+    manager = CustomAIManager()
+    print(f"Cold start (headers + manifest): {(time.perf_counter() - cold) * 1000:.1f} ms")
+
+    target = "bench0007"
+    scenarios = [
+        ("update_model (campo do header)", lambda: manager.update_model(target, temperature=0.4)),
+        ("add_training_data", lambda: manager.add_training_data(target, "nova pergunta", "nova resposta")),
+        ("add_knowledge", lambda: manager.add_knowledge(target, "fato novo")),
+        ("set_active_version", lambda: manager.set_active_version(target)),
+        ("save_models() sem mudanças", manager.save_models),
+    ]
+    print(f"\n{'Operação':<34}{'bytes gravados':>16}{'vs. completo':>14}{'tempo':>10}")
+    for label, action in scenarios:
+        start = time.perf_counter()
+        action()
+        elapsed = (time.perf_counter() - start) * 1000
+        written = manager.write_stats["last_flush_bytes"]
+        ratio = written / full_rewrite * 100 if full_rewrite else 0
+        print(f"{label:<34}{written:>16,}{ratio:>13.2f}%{elapsed:>8.1f}ms")
+
+    print(f"\nTotais: {manager.write_stats}")
+    print(f"Payloads: {manager.payload_stats}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run_benchmark(*args)
@@ -0,0 +1,77 @@
+"""
+Benchmark da detecção de intenção do FlowEngine.
+Compara o automato compilado (Aho-Corasick) com a varredura antiga
+(`kw in texto` para cada keyword de cada intent) e confere que os dois
+devolvem o mesmo resultado.
+
+Uso: python benchmark_flow_intents.py [intents] [keywords_por_intent] [consultas]
+"""
+import random
+import sys
+import time
+
+from src.core.json_flow_engine import FlowEngine
+
+
+def _linear_detect(intents_config, user_input):
+    """Implementação anterior: uma busca de substring por keyword"""
+    txt = user_input.lower().strip()
+    best_intent, best_score = "general", 0.0
+    for intent_cfg in intents_config:
+        keywords = intent_cfg.get("keywords", [])
+        context_words = intent_cfg.get("context_words", [])
+        kw_matches = sum(1 for kw in keywords if kw.lower() in txt)
+        ctx_matches = sum(1 for cw in context_words if cw.lower() in txt)
+        if kw_matches == 0:
+            continue
+        total = len(keywords) + len(context_words) * 0.5
+        score = ((kw_matches + ctx_matches * 0.5) / total) * intent_cfg.get("priority", 1)
+        if score > best_score:
+            best_intent, best_score = intent_cfg.get("name", ""), score
+    return (best_intent, min(best_score, 1.0))
+
+
+def _word(rng):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyzçãé") for _ in range(rng.randint(4, 9)))
+
+
+def run_benchmark(n_intents=200, kw_per_intent=20, n_queries=2000):
+    rng = random.Random(42)
+    vocab = [_word(rng) for _ in range(n_intents * kw_per_intent)]
+    intents = [{
+        "name": f"intent_{i}",
+        "keywords": vocab[i * kw_per_intent:(i + 1) * kw_per_intent],
+        "context_words": rng.sample(vocab, 3),
+        "priority": rng.choice([1, 1.5, 2])
+    } for i in range(n_intents)]
+    nodes = [{"id": "start", "type": "recv"}, {"id": "nlp", "type": "nlp", "intents": intents}]
+    queries = [" ".join(rng.choice(vocab) if rng.random() < 0.3 else _word(rng)
+                        for _ in range(rng.randint(5, 40))) for _ in range(n_queries)]
+
+    print("=== BENCHMARK DE DETECÇÃO DE INTENÇÃO (FlowEngine) ===")
+    print(f"Intents: {n_intents} | Keywords: {n_intents * kw_per_intent} | Consultas: {n_queries}")
+
+    engine = FlowEngine(nodes, [])
+    start = time.perf_counter()
+    automaton, _ = engine._get_intent_matcher()
+    compile_ms = (time.perf_counter() - start) * 1000
+    print(f"Compilação do automato: {compile_ms:.1f} ms ({automaton.get_stats()})")
+
+    start = time.perf_counter()
+    expected = [_linear_detect(intents, q) for q in queries]
+    linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = [engine.detect_intent(q) for q in queries]
+    compiled = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, got) if a != b)
+    print(f"\n{'Método':<28}{'total':>10}{'por consulta':>16}")
+    print(f"{'Varredura linear (antiga)':<28}{linear * 1000:>8.1f}ms{linear / n_queries * 1e6:>14.1f}µs")
+    print(f"{'Automato Aho-Corasick':<28}{compiled * 1000:>8.1f}ms{compiled / n_queries * 1e6:>14.1f}µs")
+    print(f"\nGanho: {linear / compiled:.1f}x | Resultados divergentes: {mismatches}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:4]]
+    run_benchmark(*args)
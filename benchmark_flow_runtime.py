@@ -0,0 +1,69 @@
+"""
+Benchmark do interpretador de fluxos (FlowRuntime).
+Um único runtime atende N conversas simultâneas, cada uma com seu
+FlowCursor; mede o custo por mensagem (que não deve crescer com N) e o
+tamanho do cursor serializado.
+
+Uso: python benchmark_flow_runtime.py [mensagens] [conversas...]
+"""
+import json
+import random
+import sys
+import time
+
+from src.core.flow_runtime import FlowCursor
+from src.core.json_flow_engine import FlowEngine
+
+
+def _build_engine():
+    """Atendimento: saudação, pedido (pergunta o nome e confirma) e IA como fallback"""
+    nodes = [
+        {"id": "recv", "type": "recv"},
+        {"id": "nlp", "type": "nlp", "out_labels": ["Saudação", "Pedido", "Pergunta Geral"],
+         "intents": [{"name": "greeting", "keywords": ["oi", "olá", "bom dia"]},
+                     {"name": "order", "keywords": ["pedido", "comprar", "encomenda"]},
+                     {"name": "general", "keywords": ["?"]}]},
+        {"id": "hello", "type": "send", "msg": "Olá! Sou o {bot_name}. Em que posso ajudar?"},
+        {"id": "ask", "type": "question", "msg": "Qual o seu nome?", "var": "nome"},
+        {"id": "confirm", "type": "send", "msg": "Pedido registrado para {nome} (turno {turn})."},
+        {"id": "ai", "type": "ai_response"},
+        {"id": "back", "type": "volta"},
+    ]
+    conns = [
+        ("recv", "out", "nlp"), ("nlp", "out_0", "hello"), ("nlp", "out_1", "ask"),
+        ("nlp", "out_2", "ai"), ("hello", "out", "back"), ("ask", "out", "confirm"),
+        ("confirm", "out", "back"), ("ai", "out", "back"),
+    ]
+    return FlowEngine(nodes, [{"source": s, "source_port": p, "target": t} for s, p, t in conns],
+                      {"name": "Bot de Pedidos", "version": "1.0"})
+
+
+def run_benchmark(n_messages=100000, conversations=(100, 1000, 10000, 50000)):
+    engine = _build_engine()
+    runtime = engine.get_runtime()
+    messages = ["oi", "quero fazer um pedido", "Ana", "qual o horário?", "bom dia", "comprar 2 itens", "Bruno"]
+    responder = lambda msg, ctx: "Resposta da IA"
+
+    print("=== BENCHMARK DO INTERPRETADOR DE FLUXOS (FlowRuntime) ===")
+    print(f"Fluxo: {engine} | Mensagens por rodada: {n_messages}")
+    print(f"\n{'Conversas':>10}{'por mensagem':>16}{'cursor (JSON)':>16}")
+    for n_conv in conversations:
+        rng = random.Random(7)
+        cursors = [FlowCursor() for _ in range(n_conv)]
+        start = time.perf_counter()
+        for _ in range(n_messages):
+            runtime.step(cursors[rng.randrange(n_conv)], rng.choice(messages), responder)
+        elapsed = time.perf_counter() - start
+        sample = cursors[:1000]
+        avg_bytes = sum(len(json.dumps(c.to_dict(), ensure_ascii=False)) for c in sample) / len(sample)
+        print(f"{n_conv:>10}{elapsed / n_messages * 1e6:>14.1f}µs{avg_bytes:>14.0f} B")
+
+    print(f"\nRuntime: {runtime.get_stats()}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    if len(args) > 1:
+        run_benchmark(args[0], tuple(args[1:]))
+    else:
+        run_benchmark(*args)
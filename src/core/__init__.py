@@ -5,6 +5,15 @@ Core - Logica central do aplicativo
 from .project_manager import ProjectManager
 from .token_optimizer import TokenOptimizer, TokenStats
 from .response_cache import ResponseCache, CacheEntry
+from .segment_store import SegmentStore
+from .state_journal import StateJournal
+from .chat_history_store import ChatHistoryStore
+from .persistence_worker import PersistenceWorker
+from .keyword_automaton import KeywordAutomaton
+from .semantic_cache import SemanticIndex, normalize_prompt
+from .cache_policies import EvictionPolicy, LRUPolicy, LFUPolicy, TinyLFUPolicy, get_eviction_policy
+from .single_flight import SingleFlight
+from .provider_stats import LatencyWindow, CircuitBreaker, ProviderHealth
 from .ai_manager import AIManager
 from .custom_ai_manager import CustomAIManager, CustomAIModel, AVAILABLE_BASE_MODELS, AI_TEMPLATES
 from .training_manager import TrainingManager, TrainingProject, TrainingSession, AI_SPECIALIZATIONS
@@ -16,6 +25,22 @@ __all__ = [
     'TokenStats',
     'ResponseCache',
     'CacheEntry',
+    'SegmentStore',
+    'StateJournal',
+    'ChatHistoryStore',
+    'PersistenceWorker',
+    'KeywordAutomaton',
+    'EvictionPolicy',
+    'LRUPolicy',
+    'LFUPolicy',
+    'TinyLFUPolicy',
+    'get_eviction_policy',
+    'SemanticIndex',
+    'normalize_prompt',
+    'SingleFlight',
+    'LatencyWindow',
+    'CircuitBreaker',
+    'ProviderHealth',
     'AIManager',
     'CustomAIManager',
     'CustomAIModel',
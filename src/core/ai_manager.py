@@ -3,14 +3,34 @@ AI Manager - Gerenciador central de provedores de IA
 Integra cache, otimizacao de tokens e fallback automatico
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Generator, Tuple, Union
 from pathlib import Path
+import asyncio
+import inspect
+import queue
+import time
 import yaml
 import os
 
 from .token_optimizer import TokenOptimizer
 from .response_cache import ResponseCache
+from .single_flight import SingleFlight
+from .provider_stats import LatencyWindow, ProviderHealth
 from ..providers import get_provider, BaseAIProvider
+from ..providers.http_pool import BackgroundLoop
+from ..providers.rate_limiter import get_all_rate_limiters
+
+
+class ProviderErrorResponse(Exception):
+    """Provider devolveu uma mensagem de erro em vez de resposta"""
+
+
+# Marca o fim do stream na fila do stream com hedging
+_STREAM_END = object()
+
+# Formato das mensagens de erro devolvidas pelos providers
+ERROR_PREFIXES = ("Erro: ", "Erro DeepSeek: ")
+
 
 class AIManager:
     """Gerenciador central de provedores de IA com otimizacao automatica"""
@@ -21,6 +41,12 @@ class AIManager:
         self.optimizer: TokenOptimizer = None
         self.cache: ResponseCache = None
         self.config: Dict = {}
+        self.flight = SingleFlight()
+        self.first_token_latency: Dict[str, LatencyWindow] = {}
+        self.hedge_stats = {"hedged_requests": 0, "hedges_launched": 0, "hedge_wins": 0}
+        self.health: ProviderHealth = None
+        # Loop asyncio dos chamadores sincronos (mantem o pool HTTP entre chamadas)
+        self.background = BackgroundLoop()
 
         # Carregar configuracao
         if config_path:
@@ -51,7 +77,8 @@ class AIManager:
                 'cache': {'enabled': True, 'ttl_hours': 24},
                 'tokens': {'history_limit': 20, 'compress_code': True}
             },
-            'fallback': {'enabled': True, 'order': ['openai', 'anthropic', 'deepseek']}
+            'fallback': {'enabled': True, 'order': ['openai', 'anthropic', 'deepseek']},
+            'concurrency': {'max_parallel_requests': 8}
         }
 
     def _init_components(self):
@@ -61,9 +88,18 @@ class AIManager:
         if cache_config.get('enabled', True):
             self.cache = ResponseCache(
                 ttl_hours=cache_config.get('ttl_hours', 24),
-                max_entries=cache_config.get('max_entries', 1000)
+                max_entries=cache_config.get('max_entries', 1000),
+                max_segment_mb=cache_config.get('max_segment_mb', 16),
+                max_bytes=cache_config.get('max_bytes', 0),
+                eviction_policy=cache_config.get('eviction_policy', 'lru'),
+                semantic_threshold=self._semantic_threshold(cache_config)
             )
 
+        # Circuit breakers por provider (persistidos entre execucoes)
+        breaker_config = dict(self.config.get('fallback', {}).get('circuit_breaker', {}) or {})
+        state_file = breaker_config.pop('state_file', '.cache/provider_health.json')
+        self.health = ProviderHealth(state_file=state_file, **breaker_config)
+
         # Inicializar providers
         providers_config = self.config.get('providers', {})
         for name, pconfig in providers_config.items():
@@ -79,6 +115,7 @@ class AIManager:
                         provider = get_provider(name, {
                             'api_key': api_key,
                             'model': pconfig.get('default_model'),
+                            'rate_limit': pconfig.get('rate_limit'),
                             **pconfig.get('settings', {})
                         })
                         self.providers[name] = provider
@@ -87,6 +124,13 @@ class AIManager:
                     except Exception as e:
                         print(f"Erro ao inicializar provider {name}: {e}")
 
+    def _semantic_threshold(self, cache_config: Dict) -> float:
+        """Threshold do cache semantico (0 desativa)"""
+        semantic = cache_config.get('semantic', {})
+        if not semantic.get('enabled', False):
+            return 0.0
+        return float(semantic.get('threshold', 0.95))
+
     def set_active_provider(self, name: str) -> bool:
         """Define provider ativo"""
         if name in self.providers:
@@ -129,34 +173,585 @@ class AIManager:
             cached = self.cache.get(message, context or "", provider_name)
             if cached:
                 return cached
+            # Prompt quase identico ja respondido (acentos, caixa, pontuacao)
+            cached = self.cache.get_similar(message, context or "", provider_name)
+            if cached:
+                return cached
 
-        # Otimizar contexto de codigo se necessario
-        if context and self.optimizer:
-            token_config = self.config.get('optimization', {}).get('tokens', {})
-            if token_config.get('compress_code', True):
-                max_tokens = token_config.get('max_code_tokens', 2000)
-                context = self.optimizer.optimize_code_context(context, max_tokens)
+        # Requisicoes identicas em voo compartilham uma unica chamada
+        key = ResponseCache.make_key(message, context or "", provider_name)
+        return self.flight.do(
+            key,
+            lambda: self._send_uncached(provider, provider_name, message, context, use_cache)
+        )
+
+    def _send_uncached(
+        self,
+        provider: BaseAIProvider,
+        provider_name: str,
+        message: str,
+        context: str,
+        use_cache: bool
+    ) -> str:
+        """Chamada real ao provider (executada pelo lider do single-flight)"""
+        if self._hedging_config().get('enabled', False) and not self._loop_running():
+            return self._run_async(
+                self._asend_uncached(provider, provider_name, message, context, use_cache)
+            )
+
+        cache_context = context or ""
+        context = self._optimize_context(context)
+        target = self._route(provider_name)
 
         # Enviar mensagem
         try:
-            if context:
-                full_message = f"Contexto:\n```\n{context}\n```\n\n{message}"
+            if target is None:
+                raise ProviderErrorResponse(f"Erro: Circuito aberto para {provider_name}")
+            response = self._call_provider(target, self._build_message(message, context))
+
+            # Salvar no cache (sob o provider que respondeu, nao o pedido)
+            if use_cache and self.cache:
+                self.cache.set(message, cache_context, response, target)
+
+            return response
+
+        except Exception as e:
+            # Tentar fallback
+            if target is not None and self.config.get('fallback', {}).get('enabled', False):
+                return self._try_fallback(message, context, target)
+            return self._error_text(e)
+
+    def _route(self, provider_name: str) -> Optional[str]:
+        """Provider que deve atender: o pedido, ou o proximo de fallback.order com circuito fechado"""
+        if self.health is None or self.health.allow(provider_name):
+            return provider_name
+        if self.config.get('fallback', {}).get('enabled', False):
+            for name in self.config.get('fallback', {}).get('order', []):
+                if name != provider_name and name in self.providers and self.health.allow(name):
+                    return name
+        return None
+
+    def _call_provider(self, name: str, full_message: str) -> str:
+        """Chama o provider registrando sucesso/falha e latencia no circuit breaker"""
+        start = time.monotonic()
+        try:
+            response = self.providers[name].send_message(full_message)
+        except Exception:
+            self._record_health(name, False, time.monotonic() - start)
+            raise
+        return self._check_response(name, response, time.monotonic() - start)
+
+    async def _acall_provider(self, name: str, full_message: str, use_history: bool = True) -> str:
+        """Versao asyncio de _call_provider"""
+        start = time.monotonic()
+        try:
+            response = await self.providers[name].asend_message(full_message, **self._history_kwargs(use_history))
+        except asyncio.CancelledError:
+            self._release_health(name)
+            raise
+        except Exception:
+            self._record_health(name, False, time.monotonic() - start)
+            raise
+        return self._check_response(name, response, time.monotonic() - start)
+
+    @staticmethod
+    def _history_kwargs(use_history: bool) -> Dict[str, Any]:
+        """So repassa use_history quando desligado (providers externos podem nao aceitar)"""
+        return {} if use_history else {"use_history": False}
+
+    def _check_response(self, name: str, response: str, elapsed: float) -> str:
+        if self._is_error_response(response):
+            self._record_health(name, False, elapsed)
+            raise ProviderErrorResponse(response)
+        self._record_health(name, True, elapsed)
+        return response
+
+    def _record_health(self, name: str, ok: bool, elapsed: float = None):
+        if self.health is not None:
+            self.health.record(name, ok, elapsed)
+
+    def _release_health(self, name: str):
+        """Chamada que terminou sem resultado (abandonada/cancelada): devolve o slot do half-open"""
+        if self.health is not None:
+            self.health.release(name)
+
+    @staticmethod
+    def _is_error_response(response: Any) -> bool:
+        """
+        Providers reportam falhas como texto 'Erro: ...' (ou 'Erro DeepSeek: ...');
+        a palavra 'Erro' sozinha e resposta valida ("Erros comuns em Python...")
+        """
+        return isinstance(response, str) and response.startswith(ERROR_PREFIXES)
+
+    @staticmethod
+    def _error_text(error: Exception) -> str:
+        if isinstance(error, ProviderErrorResponse):
+            return str(error)
+        return f"Erro: {str(error)}"
+
+    def stream_message(
+        self,
+        message: str,
+        context: str = None,
+        use_cache: bool = True,
+        provider_name: str = None
+    ) -> Generator[str, None, None]:
+        """
+        Versao streaming de send_message: gera chunks conforme chegam.
+        Streams identicos em voo sao coalescidos e a resposta completa
+        e gravada no cache ao final. Com fallback.hedging habilitado, o
+        primeiro token tem o mesmo orcamento de latencia de send_message.
+        Falhas (sem provider, circuito aberto, erro do provider) levantam
+        ProviderErrorResponse em vez de virar chunk.
+        """
+        provider_name = provider_name or self.active_provider
+        provider = self.providers.get(provider_name)
+
+        if not provider:
+            raise ProviderErrorResponse("Erro: Nenhum provider disponivel")
+
+        if use_cache and self.cache:
+            cached = self.cache.get(message, context or "", provider_name)
+            if not cached:
+                cached = self.cache.get_similar(message, context or "", provider_name)
+            if cached:
+                yield cached
+                return
+
+        key = ResponseCache.make_key(message, context or "", provider_name)
+        yield from self.flight.stream(
+            key,
+            lambda: self._stream_uncached(provider, provider_name, message, context, use_cache)
+        )
+
+    def _stream_uncached(
+        self,
+        provider: BaseAIProvider,
+        provider_name: str,
+        message: str,
+        context: str,
+        use_cache: bool
+    ) -> Generator[str, None, None]:
+        """
+        Abre o stream do provider e grava a resposta completa no cache.
+        Um chunk de erro no meio do stream vira ProviderErrorResponse: a
+        chamada conta como falha e a resposta parcial nao e cacheada.
+        """
+        cache_context = context or ""
+        full_message = self._build_message(message, self._optimize_context(context))
+
+        target = self._route(provider_name)
+        if target is None:
+            raise ProviderErrorResponse(f"Erro: Circuito aberto para {provider_name}")
+
+        if self._hedging_config().get('enabled', False) and not self._loop_running():
+            # Hedging no primeiro token; falhas antes dele ja foram registradas
+            answered: Dict[str, Any] = {}
+            source = self._hedged_stream(target, full_message, answered)
+        else:
+            answered = {"name": target}
+            source = self._open_stream(self.providers[target], full_message)
+
+        chunks = []
+        start = time.monotonic()
+        ok = None  # None: sem resultado (consumidor abandonou o stream)
+        try:
+            for chunk in source:
+                if self._is_error_response(chunk):
+                    raise ProviderErrorResponse(chunk)
+                chunks.append(chunk)
+                yield chunk
+            ok = bool(chunks) and bool("".join(chunks))
+        except Exception:
+            ok = False
+            raise
+        finally:
+            source.close()
+            # pop: o pump do hedge pode ter cancelado e devolvido o slot primeiro
+            name = answered.pop("name", None)
+            if name:
+                if ok is None:
+                    # GeneratorExit: nao e sucesso nem falha, mas o slot volta
+                    self._release_health(name)
+                else:
+                    self._record_health(name, ok, time.monotonic() - start)
+
+        # Resposta de hedge/fallback fica sob o provider que respondeu
+        if use_cache and self.cache and ok:
+            self.cache.set(message, cache_context, "".join(chunks), name)
+
+    def _open_stream(self, provider: BaseAIProvider, full_message: str):
+        """Usa o streaming nativo do provider, se existir; senao gera a resposta inteira"""
+        try:
+            supports_stream = 'stream' in inspect.signature(provider.send_message).parameters
+        except (TypeError, ValueError):
+            supports_stream = False
+
+        if supports_stream:
+            result = provider.send_message(full_message, stream=True)
+            if isinstance(result, str):
+                yield result
             else:
-                full_message = message
+                yield from result
+        else:
+            yield provider.send_message(full_message)
 
-            response = provider.send_message(full_message)
+    async def asend_message(
+        self,
+        message: str,
+        context: str = None,
+        use_cache: bool = True,
+        provider_name: str = None,
+        use_history: bool = True
+    ) -> str:
+        """
+        Versao asyncio de send_message (providers com pool HTTP compartilhado).
+        use_history=False faz uma chamada sem estado: o provider nao le nem
+        grava o historico da conversa.
+        """
+        provider_name = provider_name or self.active_provider
+        provider = self.providers.get(provider_name)
 
-            # Salvar no cache
+        if not provider:
+            return "Erro: Nenhum provider disponivel"
+
+        if use_cache and self.cache:
+            cached = self.cache.get(message, context or "", provider_name)
+            if not cached:
+                cached = self.cache.get_similar(message, context or "", provider_name)
+            if cached:
+                return cached
+
+        key = ResponseCache.make_key(message, context or "", provider_name)
+        if not use_history:
+            # Nao coalescer com uma chamada do chat, que usa o historico
+            key = "stateless:" + key
+        return await self.flight.ado(
+            key,
+            lambda: self._asend_uncached(provider, provider_name, message, context, use_cache, use_history)
+        )
+
+    async def _asend_uncached(
+        self,
+        provider: BaseAIProvider,
+        provider_name: str,
+        message: str,
+        context: str,
+        use_cache: bool,
+        use_history: bool = True
+    ) -> str:
+        """Chamada assincrona real ao provider"""
+        cache_context = context or ""
+        context = self._optimize_context(context)
+        target = self._route(provider_name)
+
+        try:
+            if target is None:
+                raise ProviderErrorResponse(f"Erro: Circuito aberto para {provider_name}")
+            if self._hedging_config().get('enabled', False):
+                answered, response = await self._ahedged_send(
+                    target, self._build_message(message, context), use_history
+                )
+            else:
+                answered = target
+                response = await self._acall_provider(target, self._build_message(message, context), use_history)
+
+            # Resposta de hedge/fallback fica sob o provider que respondeu
             if use_cache and self.cache:
-                self.cache.set(message, context or "", response, provider_name)
+                self.cache.set(message, cache_context, response, answered)
 
             return response
 
         except Exception as e:
-            # Tentar fallback
-            if self.config.get('fallback', {}).get('enabled', False):
-                return self._try_fallback(message, context, provider_name)
-            return f"Erro: {str(e)}"
+            if target is not None and self.config.get('fallback', {}).get('enabled', False):
+                return await self._atry_fallback(message, context, target, use_history)
+            return self._error_text(e)
+
+    async def _ahedged_send(self, primary: str, full_message: str, use_history: bool = True) -> Tuple[str, str]:
+        """Requisicao com hedging; retorna (provider que respondeu, resposta)"""
+        name, first, start, stream = await self._ahedged_open(primary, full_message, use_history)
+        chunks = [first]
+        try:
+            async for chunk in stream:
+                if self._is_error_response(chunk):
+                    raise ProviderErrorResponse(chunk)
+                chunks.append(chunk)
+        except asyncio.CancelledError:
+            self._release_health(name)
+            await self._aclose_stream(stream)
+            raise
+        except Exception:
+            # Stream quebrou depois do primeiro token: falha, nada vai para o cache
+            self._record_health(name, False, time.monotonic() - start)
+            await self._aclose_stream(stream)
+            raise
+        self._record_health(name, True, time.monotonic() - start)
+        return name, "".join(chunks)
+
+    async def _ahedged_open(self, primary: str, full_message: str, use_history: bool = True):
+        """
+        Abre o stream com hedging: se o primary nao produzir o primeiro token
+        dentro do orcamento (p95 observado), dispara o mesmo pedido no proximo
+        provider de fallback.order. O primeiro a responder vence; o outro e cancelado.
+
+        Retorna (provider, primeiro chunk, inicio, stream aberto do vencedor).
+        A saude do vencedor e registrada por quem consome o resto do stream;
+        perdedores cancelados (ou com primeiro token descartado) devolvem o
+        slot do half-open reservado no circuit breaker.
+        """
+        hedging = self._hedging_config()
+        order = self.config.get('fallback', {}).get('order', [])
+        backups = [
+            n for n in order
+            if n != primary and n in self.providers and not (self.health and self.health.get(n).is_open())
+        ]
+        backups = backups[:max(0, int(hedging.get('max_hedges', 1)))]
+        budget = self._hedge_budget(primary)
+
+        streams = {}
+
+        async def first_token(name: str):
+            start = time.monotonic()
+            stream = self.providers[name].astream(full_message, **self._history_kwargs(use_history))
+            streams[name] = stream
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                first = ""
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._record_health(name, False, time.monotonic() - start)
+                raise
+            elapsed = time.monotonic() - start
+            if not first or self._is_error_response(first):
+                self._record_health(name, False, elapsed)
+                raise ProviderErrorResponse(first or "Erro: resposta vazia")
+            self._latency_window(name).add(elapsed)
+            # Saude so e registrada como sucesso quando o stream termina
+            return name, first, start
+
+        self.hedge_stats["hedged_requests"] += 1
+        tasks = {asyncio.ensure_future(first_token(primary)): primary}
+        winner = None
+        last_error = None
+
+        aborted = True
+        try:
+            while tasks and winner is None:
+                timeout = budget if backups else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Orcamento estourado sem primeiro token: dispara hedge
+                    name = backups.pop(0)
+                    if self.health and not self.health.allow(name):
+                        continue
+                    tasks[asyncio.ensure_future(first_token(name))] = name
+                    self.hedge_stats["hedges_launched"] += 1
+                    continue
+
+                for task in done:
+                    tasks.pop(task)
+                    if task.exception() is None:
+                        winner = task.result()
+                        break
+                    last_error = task.exception()
+
+                while winner is None and not tasks and backups:
+                    # Todos em voo falharam: tenta o proximo imediatamente
+                    name = backups.pop(0)
+                    if self.health and not self.health.allow(name):
+                        continue
+                    tasks[asyncio.ensure_future(first_token(name))] = name
+                    self.hedge_stats["hedges_launched"] += 1
+            aborted = False
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            for task, name in tasks.items():
+                # Falhas ja foram registradas; cancelados e vencedores descartados nao
+                if task.cancelled() or task.exception() is None:
+                    self._release_health(name)
+            if aborted and winner is not None:
+                # Cancelado depois de escolher o vencedor: ninguem vai consumir o stream
+                self._release_health(winner[0])
+            for name, stream in streams.items():
+                if winner is None or aborted or name != winner[0]:
+                    await self._aclose_stream(stream)
+
+        if winner is None:
+            raise last_error or RuntimeError("Todos os providers falharam")
+
+        name, first, start = winner
+        if name != primary:
+            self.hedge_stats["hedge_wins"] += 1
+        return name, first, start, streams[name]
+
+    def _hedged_stream(self, primary: str, full_message: str, answered: Dict[str, Any]) -> Generator[str, None, None]:
+        """
+        Versao streaming do hedging para threads sem event loop (ex. QThread):
+        _ahedged_open roda no loop de fundo e os chunks chegam por uma fila.
+        `answered["name"]` recebe o provider vencedor antes do primeiro chunk.
+        """
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                name, first, _, stream = await self._ahedged_open(primary, full_message)
+                answered["name"] = name
+                items.put(first)
+                try:
+                    async for chunk in stream:
+                        items.put(chunk)
+                finally:
+                    await self._aclose_stream(stream)
+                items.put(_STREAM_END)
+            except asyncio.CancelledError:
+                # Consumidor saiu antes de ler o vencedor: o slot volta por aqui
+                name = answered.pop("name", None)
+                if name:
+                    self._release_health(name)
+                raise
+            except Exception as e:
+                items.put(e)
+
+        future = self.background.submit(pump())
+        try:
+            while True:
+                item = items.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Consumidor abandonou ou o stream falhou: cancela o que estiver em voo
+            future.cancel()
+
+    async def _aclose_stream(self, stream):
+        try:
+            await stream.aclose()
+        except Exception:
+            pass
+
+    def _hedging_config(self) -> Dict[str, Any]:
+        return self.config.get('fallback', {}).get('hedging', {}) or {}
+
+    def _hedge_budget(self, provider_name: str) -> float:
+        """Orcamento (s) do primeiro token: percentil observado ou valor fixo"""
+        hedging = self._hedging_config()
+        budget = hedging.get('budget_ms', 2500) / 1000.0
+        window = self.first_token_latency.get(provider_name)
+        if window is not None and len(window) >= hedging.get('min_samples', 20):
+            observed = window.percentile(hedging.get('percentile', 95))
+            if observed is not None:
+                budget = max(observed, hedging.get('min_budget_ms', 200) / 1000.0)
+        return budget
+
+    def _latency_window(self, provider_name: str) -> LatencyWindow:
+        window = self.first_token_latency.get(provider_name)
+        if window is None:
+            window = self.first_token_latency.setdefault(provider_name, LatencyWindow())
+        return window
+
+    async def _atry_fallback(
+        self,
+        message: str,
+        context: str,
+        failed_provider: str,
+        use_history: bool = True
+    ) -> str:
+        """Tenta providers de fallback (asyncio)"""
+        fallback_order = self.config.get('fallback', {}).get('order', [])
+
+        for name in fallback_order:
+            if name != failed_provider and name in self.providers:
+                if self.health is not None and not self.health.allow(name):
+                    continue
+                try:
+                    return await self._acall_provider(name, self._build_message(message, context), use_history)
+                except Exception:
+                    continue
+
+        return "Erro: Todos os providers falharam"
+
+    async def agather(
+        self,
+        prompts: List[Union[str, Dict[str, Any]]],
+        concurrency: int = None,
+        use_cache: bool = True,
+        provider_name: str = None
+    ) -> List[str]:
+        """
+        Executa varios prompts em paralelo, no maximo `concurrency` por vez.
+
+        Cada item pode ser uma string ou um dict com `message`, `context`
+        e opcionalmente `provider`. Respostas voltam na ordem dos prompts.
+        As chamadas sao sem estado: nao leem nem gravam o historico dos
+        providers, entao uma resposta nao depende das outras do lote.
+        """
+        if concurrency is None:
+            concurrency = self.config.get('concurrency', {}).get('max_parallel_requests', 8)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(item):
+            if isinstance(item, dict):
+                message = item.get('message', '')
+                context = item.get('context')
+                name = item.get('provider', provider_name)
+            else:
+                message, context, name = item, None, provider_name
+            async with semaphore:
+                try:
+                    return await self.asend_message(message, context, use_cache, name, use_history=False)
+                except Exception as e:
+                    return f"Erro: {str(e)}"
+
+        return list(await asyncio.gather(*(run(item) for item in prompts)))
+
+    def gather(
+        self,
+        prompts: List[Union[str, Dict[str, Any]]],
+        concurrency: int = None,
+        use_cache: bool = True,
+        provider_name: str = None
+    ) -> List[str]:
+        """Versao bloqueante de agather (para threads sem event loop, ex. QThread)"""
+        return self._run_async(self.agather(prompts, concurrency, use_cache, provider_name))
+
+    def _run_async(self, coro):
+        """Executa uma corrotina no loop de fundo (o pool HTTP continua aberto)"""
+        return self.background.run(coro)
+
+    def close(self):
+        """Fecha o pool HTTP e o loop de fundo (chamar no encerramento do app)"""
+        self.background.close()
+
+    @staticmethod
+    def _loop_running() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    def _optimize_context(self, context: Optional[str]) -> Optional[str]:
+        """Otimiza contexto de codigo se necessario"""
+        if context and self.optimizer:
+            token_config = self.config.get('optimization', {}).get('tokens', {})
+            if token_config.get('compress_code', True):
+                max_tokens = token_config.get('max_code_tokens', 2000)
+                context = self.optimizer.optimize_code_context(context, max_tokens)
+        return context
+
+    def _build_message(self, message: str, context: Optional[str]) -> str:
+        """Monta a mensagem final com o contexto de codigo"""
+        if context:
+            return f"Contexto:\n```\n{context}\n```\n\n{message}"
+        return message
 
     def _try_fallback(self, message: str, context: str, failed_provider: str) -> str:
         """Tenta providers de fallback"""
@@ -164,13 +759,11 @@ class AIManager:
 
         for name in fallback_order:
             if name != failed_provider and name in self.providers:
+                # Circuito aberto: pula sem pagar o timeout
+                if self.health is not None and not self.health.allow(name):
+                    continue
                 try:
-                    provider = self.providers[name]
-                    if context:
-                        full_message = f"Contexto:\n```\n{context}\n```\n\n{message}"
-                    else:
-                        full_message = message
-                    return provider.send_message(full_message)
+                    return self._call_provider(name, self._build_message(message, context))
                 except:
                     continue
 
@@ -225,6 +818,20 @@ class AIManager:
         if self.cache:
             stats["cache"] = self.cache.get_stats()
 
+        stats["single_flight"] = self.flight.get_stats()
+        if self.health is not None:
+            stats["health"] = self.health.summary()
+
+        stats["rate_limits"] = {
+            name: limiter.get_stats() for name, limiter in get_all_rate_limiters().items()
+        }
+        stats["hedging"] = {
+            **self.hedge_stats,
+            "first_token_latency": {
+                name: window.summary() for name, window in self.first_token_latency.items()
+            }
+        }
+
         return stats
 
     def clear_history(self, provider_name: str = None):
@@ -0,0 +1,198 @@
+"""
+Cache Policies - Politicas de evicao O(1) para o ResponseCache
+LRU, LFU (buckets de frequencia) e TinyLFU (admissao por count-min sketch)
+"""
+
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+import hashlib
+
+
+class EvictionPolicy:
+    """Interface base: todas as operacoes sao O(1)"""
+
+    name = "base"
+
+    def insert(self, key: Hashable):
+        """Registra uma chave nova"""
+        raise NotImplementedError
+
+    def touch(self, key: Hashable):
+        """Registra um acesso (hit) a uma chave existente"""
+        raise NotImplementedError
+
+    def remove(self, key: Hashable):
+        """Esquece uma chave (evicao, expiracao ou invalidacao)"""
+        raise NotImplementedError
+
+    def victim(self) -> Optional[Hashable]:
+        """Retorna a proxima chave a ser removida, sem remove-la"""
+        raise NotImplementedError
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        """Decide se `candidate` merece entrar no lugar de `victim`"""
+        return True
+
+    def record_miss(self, key: Hashable):
+        """Registra um miss (usado por politicas com historico)"""
+        pass
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """Least Recently Used via OrderedDict"""
+
+    name = "lru"
+
+    def __init__(self):
+        self._order: "OrderedDict[Hashable, None]" = OrderedDict()
+
+    def insert(self, key: Hashable):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def touch(self, key: Hashable):
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def remove(self, key: Hashable):
+        self._order.pop(key, None)
+
+    def victim(self) -> Optional[Hashable]:
+        return next(iter(self._order), None)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Least Frequently Used O(1): buckets frequencia -> chaves (em ordem LRU),
+    com desempate pela chave menos recente dentro do menor bucket.
+    """
+
+    name = "lfu"
+
+    def __init__(self):
+        self._freq: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, "OrderedDict[Hashable, None]"] = {}
+        self._min_freq = 0
+
+    def insert(self, key: Hashable):
+        if key in self._freq:
+            self.touch(key)
+            return
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+
+    def touch(self, key: Hashable):
+        freq = self._freq.get(key)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def remove(self, key: Hashable):
+        freq = self._freq.pop(key, None)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            # Se era o menor bucket, victim() recalcula o minimo sob demanda
+            del self._buckets[freq]
+
+    def victim(self) -> Optional[Hashable]:
+        bucket = self._buckets.get(self._min_freq)
+        if not bucket:
+            if not self._buckets:
+                return None
+            self._min_freq = min(self._buckets)
+            bucket = self._buckets[self._min_freq]
+        return next(iter(bucket))
+
+    def frequency(self, key: Hashable) -> int:
+        return self._freq.get(key, 0)
+
+    def __len__(self) -> int:
+        return len(self._freq)
+
+
+class CountMinSketch:
+    """Sketch de frequencia com envelhecimento (reset pela metade)"""
+
+    def __init__(self, width: int = 4096, depth: int = 4, sample_size: int = None):
+        self.width = width
+        self.depth = depth
+        self.table = [[0] * width for _ in range(depth)]
+        self.sample_size = sample_size or width * 10
+        self.additions = 0
+
+    def _indexes(self, key: Hashable):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=4 * self.depth).digest()
+        for row in range(self.depth):
+            yield row, int.from_bytes(digest[row * 4:row * 4 + 4], "little") % self.width
+
+    def add(self, key: Hashable):
+        for row, col in self._indexes(key):
+            if self.table[row][col] < 15:
+                self.table[row][col] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: Hashable) -> int:
+        return min(self.table[row][col] for row, col in self._indexes(key))
+
+    def _age(self):
+        for row in self.table:
+            for i in range(self.width):
+                row[i] >>= 1
+        self.additions //= 2
+
+
+class TinyLFUPolicy(LRUPolicy):
+    """
+    LRU com filtro de admissao TinyLFU: uma chave nova so substitui a
+    vitima se sua frequencia estimada (hits + misses) nao for menor.
+    """
+
+    name = "tinylfu"
+
+    def __init__(self, sketch_width: int = 4096):
+        super().__init__()
+        self.sketch = CountMinSketch(width=sketch_width)
+
+    def touch(self, key: Hashable):
+        self.sketch.add(key)
+        super().touch(key)
+
+    def record_miss(self, key: Hashable):
+        self.sketch.add(key)
+
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return self.sketch.estimate(candidate) >= self.sketch.estimate(victim)
+
+
+EVICTION_POLICIES = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "tinylfu": TinyLFUPolicy,
+}
+
+
+def get_eviction_policy(name: str = "lru") -> EvictionPolicy:
+    """Factory para obter politica por nome"""
+    policy_class = EVICTION_POLICIES.get((name or "lru").lower())
+    if policy_class:
+        return policy_class()
+    raise ValueError(f"Politica de evicao '{name}' nao encontrada")
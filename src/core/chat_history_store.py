@@ -0,0 +1,367 @@
+"""
+Chat History Store - Historico de conversas em SQLite com busca full-text
+Sessoes e mensagens em tabelas proprias (uma linha por mensagem), indice
+FTS5 sobre o texto das mensagens e gravacao incremental: salvar uma sessao
+so escreve as mensagens novas ou alteradas.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SCHEMA_VERSION = 1
+
+# Campos com coluna propria; qualquer outra chave da mensagem vai em `extra`
+MESSAGE_FIELDS = ("sender", "text", "is_user", "timestamp")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated_at DESC);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    sender TEXT,
+    text TEXT NOT NULL DEFAULT '',
+    is_user INTEGER NOT NULL DEFAULT 0,
+    timestamp TEXT,
+    extra TEXT,
+    UNIQUE (session_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Indice externo (content=messages): o texto nao e duplicado, os triggers
+# mantem o indice em sincronia com insert/update/delete
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='{tokenizer}'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+# remove_diacritics 2 (SQLite >= 3.27) faz "funcao" encontrar "função"
+_FTS_TOKENIZERS = ("unicode61 remove_diacritics 2", "unicode61")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _signature(message: Dict[str, Any]) -> int:
+    """Hash dos campos da mensagem (o hash de str fica em cache no objeto)"""
+    return hash((
+        message.get("sender"),
+        message.get("text", ""),
+        bool(message.get("is_user")),
+        message.get("timestamp"),
+        len(message)
+    ))
+
+
+class ChatHistoryStore:
+    """
+    Historico de chat em um banco SQLite (modo WAL).
+
+    - `save_session`: upsert da sessao e so das mensagens novas/alteradas
+      (comparadas pela assinatura da ultima gravacao, mantida em memoria).
+    - `list_sessions(offset, limit)`: paginas ordenadas por atualizacao.
+    - `search(query)`: FTS5 com prefixo por palavra, uma linha por sessao,
+      com trecho destacado. Sem FTS5, cai para LIKE.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        # Assinaturas gravadas por sessao: evita reler o banco a cada save
+        self._signatures: Dict[str, List[int]] = {}
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self.conn.executescript(_SCHEMA)
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self.fts_enabled = self._create_fts()
+
+    def _create_fts(self) -> bool:
+        for tokenizer in _FTS_TOKENIZERS:
+            try:
+                with self.conn:
+                    self.conn.executescript(_FTS_SCHEMA.format(tokenizer=tokenizer))
+                return True
+            except sqlite3.OperationalError:
+                continue
+        return False
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def save_session(self, session_id: str, title: str, messages: List[Dict[str, Any]],
+                     updated_at: str = None) -> Dict[str, Any]:
+        """Grava a sessao de forma incremental e retorna sua linha de indice"""
+        now = updated_at or datetime.now().isoformat()
+        # Copia rasa: a lista pode continuar crescendo em outra thread
+        messages = [dict(m) for m in messages]
+        signatures = [_signature(m) for m in messages]
+
+        with self.lock, self.conn:
+            previous = self._signatures.get(session_id)
+            if previous is None:
+                previous = self._stored_signatures(session_id)
+
+            self.conn.execute(
+                "INSERT INTO sessions (id, title, created_at, updated_at, message_count) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET title=excluded.title, "
+                "updated_at=excluded.updated_at, message_count=excluded.message_count",
+                (session_id, title, now, now, len(messages))
+            )
+
+            changed = [
+                self._message_row(session_id, seq, messages[seq])
+                for seq in range(len(messages))
+                if seq >= len(previous) or previous[seq] != signatures[seq]
+            ]
+            if changed:
+                self.conn.executemany(
+                    "INSERT INTO messages (session_id, seq, sender, text, is_user, timestamp, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(session_id, seq) DO UPDATE SET sender=excluded.sender, "
+                    "text=excluded.text, is_user=excluded.is_user, "
+                    "timestamp=excluded.timestamp, extra=excluded.extra",
+                    changed
+                )
+            if len(previous) > len(messages):
+                self.conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND seq >= ?",
+                    (session_id, len(messages))
+                )
+            self._signatures[session_id] = signatures
+
+        return {"id": session_id, "title": title, "updated_at": now, "message_count": len(messages)}
+
+    def rename_session(self, session_id: str, title: str) -> bool:
+        with self.lock, self.conn:
+            cursor = self.conn.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+            return cursor.rowcount > 0
+
+    def delete_session(self, session_id: str) -> bool:
+        with self.lock, self.conn:
+            # Mensagens saem em cascata (e do indice FTS pelo trigger)
+            cursor = self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._signatures.pop(session_id, None)
+            return cursor.rowcount > 0
+
+    @staticmethod
+    def _message_row(session_id: str, seq: int, message: Dict[str, Any]) -> tuple:
+        extra = {k: v for k, v in message.items() if k not in MESSAGE_FIELDS}
+        return (
+            session_id,
+            seq,
+            message.get("sender"),
+            message.get("text", ""),
+            1 if message.get("is_user") else 0,
+            message.get("timestamp"),
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+
+    def _stored_signatures(self, session_id: str) -> List[int]:
+        return [
+            _signature(self._message_from_row(row))
+            for row in self.conn.execute(
+                "SELECT sender, text, is_user, timestamp, extra FROM messages "
+                "WHERE session_id = ? ORDER BY seq", (session_id,)
+            )
+        ]
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _message_from_row(row) -> Dict[str, Any]:
+        message = {
+            "sender": row["sender"],
+            "text": row["text"],
+            "is_user": bool(row["is_user"]),
+            "timestamp": row["timestamp"]
+        }
+        if row["extra"]:
+            message.update(json.loads(row["extra"]))
+        return message
+
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Sessao completa no mesmo formato dos antigos arquivos JSON"""
+        with self.lock:
+            session = self.conn.execute(
+                "SELECT id, title, updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if session is None:
+                return None
+            messages = [
+                self._message_from_row(row)
+                for row in self.conn.execute(
+                    "SELECT sender, text, is_user, timestamp, extra FROM messages "
+                    "WHERE session_id = ? ORDER BY seq", (session_id,)
+                )
+            ]
+            self._signatures[session_id] = [_signature(m) for m in messages]
+        return {
+            "id": session["id"],
+            "title": session["title"],
+            "messages": messages,
+            "updated_at": session["updated_at"]
+        }
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Linha de indice de uma sessao (sem as mensagens)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, title, updated_at, message_count FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list_sessions(self, offset: int = 0, limit: Optional[int] = 50) -> List[Dict[str, Any]]:
+        """Pagina de sessoes, mais recentes primeiro"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, title, updated_at, message_count FROM sessions "
+                "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_sessions(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Busca em todas as conversas (titulo e texto das mensagens).
+        Cada palavra casa por prefixo; todas precisam aparecer na mensagem.
+        Retorna uma linha por sessao com `snippet` do melhor trecho.
+        """
+        words = _WORD_RE.findall(query or "")
+        if not words:
+            return []
+
+        results: Dict[str, Dict[str, Any]] = {}
+        with self.lock:
+            like = "%" + " ".join(words) + "%"
+            for row in self.conn.execute(
+                "SELECT id, title, updated_at, message_count FROM sessions "
+                "WHERE title LIKE ? ORDER BY updated_at DESC LIMIT ?", (like, limit)
+            ):
+                results[row["id"]] = dict(row, snippet="")
+
+            for row in self._search_messages(words, limit * 4):
+                if len(results) >= limit:
+                    break
+                if row["id"] not in results:
+                    results[row["id"]] = dict(row)
+        return list(results.values())[:limit]
+
+    def _search_messages(self, words: List[str], limit: int):
+        if self.fts_enabled:
+            match = " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+            try:
+                return self.conn.execute(
+                    "SELECT s.id, s.title, s.updated_at, s.message_count, "
+                    "snippet(messages_fts, 0, '[', ']', '...', 12) AS snippet "
+                    "FROM messages_fts "
+                    "JOIN messages m ON m.id = messages_fts.rowid "
+                    "JOIN sessions s ON s.id = m.session_id "
+                    "WHERE messages_fts MATCH ? ORDER BY bm25(messages_fts) LIMIT ?",
+                    (match, limit)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                pass
+        clauses = " AND ".join("m.text LIKE ?" for _ in words)
+        return self.conn.execute(
+            "SELECT s.id, s.title, s.updated_at, s.message_count, substr(m.text, 1, 80) AS snippet "
+            "FROM messages m JOIN sessions s ON s.id = m.session_id "
+            f"WHERE {clauses} ORDER BY s.updated_at DESC LIMIT ?",
+            [f"%{w}%" for w in words] + [limit]
+        ).fetchall()
+
+    # ------------------------------------------------------------------
+    # Migracao dos arquivos JSON antigos
+    # ------------------------------------------------------------------
+
+    def import_json_sessions(self, sessions_dir: str) -> int:
+        """
+        Importa (uma unica vez) as sessoes do formato antigo: um JSON por
+        sessao + sessions_index.json. Os arquivos originais nao sao apagados.
+        """
+        with self.lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_import'").fetchone()
+        if done or not os.path.isdir(sessions_dir):
+            return 0
+
+        imported = 0
+        for name in sorted(os.listdir(sessions_dir)):
+            if not name.endswith(".json") or name == "sessions_index.json":
+                continue
+            try:
+                with open(os.path.join(sessions_dir, name), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                session_id = data.get("id") or name[:-5]
+                self.save_session(
+                    session_id,
+                    data.get("title", "Conversa sem titulo"),
+                    data.get("messages", []),
+                    updated_at=data.get("updated_at")
+                )
+                imported += 1
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"Erro ao importar sessao {name}: {e}")
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_import', ?)",
+                (datetime.now().isoformat(),)
+            )
+        return imported
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            sessions = self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            messages = self.conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {
+            "sessions": sessions,
+            "messages": messages,
+            "fts_enabled": self.fts_enabled,
+            "db_bytes": self.db_path.stat().st_size if self.db_path.exists() else 0
+        }
@@ -7,11 +7,22 @@ import json
 import os
 import uuid
 import shutil
+from bisect import bisect_left, insort
+from contextlib import contextmanager
 from pathlib import Path
-from dataclasses import dataclass, asdict, field
-from typing import Dict, List, Optional, Any
+from dataclasses import dataclass, asdict, field, fields
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
+from .cache_policies import LRUPolicy
+from .state_journal import StateJournal
+
+# Campos pesados: ficam fora do index.json (em payloads/<id>.json) e só são
+# lidos do disco no primeiro acesso ao atributo
+PAYLOAD_FIELDS = ("training_data", "knowledge_base", "_flow_nodes", "_flow_conns", "_flow_groups", "_card_types")
+# Campos que mudam o grupo de versões (ou a versão ativa) de um modelo
+GROUP_FIELDS = ("name", "repo_group", "is_active")
+
 
 @dataclass
 class CustomAIModel:
@@ -73,6 +84,149 @@ class CustomAIModel:
         if not self.repo_group:
             self.repo_group = self.name.lower().strip()
 
+    def __getattr__(self, name):
+        # Só é chamado quando o atributo não existe: payload ainda não carregado
+        if name in PAYLOAD_FIELDS:
+            loader = self.__dict__.get("_payload_loader")
+            if loader is not None:
+                loader(self)
+                if name in self.__dict__:
+                    return self.__dict__[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in GROUP_FIELDS:
+            # Mantém o índice de grupos do ModelRegistry em dia (inclusive
+            # quando a interface altera o atributo diretamente)
+            listener = self.__dict__.get("_group_listener")
+            if listener is not None:
+                listener(self)
+
+    def payload_loaded(self) -> bool:
+        """True se os campos pesados estão em memória"""
+        return all(name in self.__dict__ for name in PAYLOAD_FIELDS)
+
+
+HEADER_FIELDS = tuple(f.name for f in fields(CustomAIModel) if f.name not in PAYLOAD_FIELDS)
+
+
+def group_key(model: CustomAIModel) -> str:
+    """Chave do repositório de versões de um modelo"""
+    return model.repo_group or model.name.lower().strip()
+
+
+class ModelRegistry(dict):
+    """
+    Dicionário id -> modelo com índice secundário dos grupos de versões.
+
+    Cada grupo guarda seus ids na ordem de inserção no dicionário (a mesma
+    ordem de `values()`) e o conjunto dos ids ativos. O índice é atualizado
+    na inserção/remoção e, via `CustomAIModel.__setattr__`, quando `name`,
+    `repo_group` ou `is_active` mudam; consultas por grupo custam O(k) nas
+    versões do grupo, não O(n) em todos os modelos.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        self._group_of: Dict[str, str] = {}
+        self._groups: Dict[str, List[Tuple[int, str]]] = {}
+        self._active: Dict[str, set] = {}
+
+    # --- mutações do dicionário ---
+
+    def __setitem__(self, key: str, model: CustomAIModel):
+        old = dict.get(self, key)
+        if old is not None and old is not model:
+            old.__dict__.pop("_group_listener", None)
+        dict.__setitem__(self, key, model)
+        if key not in self._order:
+            self._order[key] = self._next_order
+            self._next_order += 1
+        model.__dict__["_group_listener"] = lambda m, key=key: self._reindex(key, m)
+        self._reindex(key, model)
+
+    def __delitem__(self, key: str):
+        model = dict.__getitem__(self, key)
+        dict.__delitem__(self, key)
+        model.__dict__.pop("_group_listener", None)
+        self._unindex(key)
+        del self._order[key]
+
+    def pop(self, key: str, *default):
+        if key in self:
+            model = dict.__getitem__(self, key)
+            del self[key]
+            return model
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key: str, default: CustomAIModel = None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, model in dict(*args, **kwargs).items():
+            self[key] = model
+
+    def clear(self):
+        for model in dict.values(self):
+            model.__dict__.pop("_group_listener", None)
+        dict.clear(self)
+        self._order.clear()
+        self._group_of.clear()
+        self._groups.clear()
+        self._active.clear()
+
+    # --- índice ---
+
+    def _reindex(self, key: str, model: CustomAIModel):
+        if dict.get(self, key) is not model:
+            return  # cópia do modelo ou objeto já substituído
+        grp = group_key(model)
+        old = self._group_of.get(key)
+        if old != grp:
+            if old is not None:
+                self._unindex(key)
+            insort(self._groups.setdefault(grp, []), (self._order[key], key))
+            self._group_of[key] = grp
+        active = self._active.setdefault(grp, set())
+        if model.is_active:
+            active.add(key)
+        else:
+            active.discard(key)
+
+    def _unindex(self, key: str):
+        grp = self._group_of.pop(key, None)
+        if grp is None:
+            return
+        members = self._groups[grp]
+        del members[bisect_left(members, (self._order[key], key))]
+        self._active[grp].discard(key)
+        if not members:
+            del self._groups[grp]
+            del self._active[grp]
+
+    # --- consultas ---
+
+    def group_names(self) -> List[str]:
+        return list(self._groups)
+
+    def versions(self, grp: str) -> List[CustomAIModel]:
+        """Modelos do grupo, na ordem de inserção"""
+        return [dict.__getitem__(self, key) for _, key in self._groups.get(grp, ())]
+
+    def active_versions(self, grp: str) -> List[CustomAIModel]:
+        """Modelos ativos do grupo, na ordem de inserção"""
+        active = sorted((self._order[key], key) for key in self._active.get(grp, ()))
+        return [dict.__getitem__(self, key) for _, key in active]
+
 
 # Modelos base disponiveis
 AVAILABLE_BASE_MODELS = {
@@ -175,7 +329,10 @@ class CustomAIManager:
             # Modo desenvolvimento: usar raiz do projeto (src/../..)
             return Path(__file__).parent.parent.parent
 
-    def __init__(self, storage_dir: str = None):
+    # Quantos modelos podem manter o payload em memória ao mesmo tempo
+    MAX_LOADED_PAYLOADS = 16
+
+    def __init__(self, storage_dir: str = None, max_loaded_payloads: int = None):
         app_dir = self._get_app_dir()
         
         if storage_dir:
@@ -184,49 +341,273 @@ class CustomAIManager:
             self.storage_dir = app_dir / "models" / "custom"
 
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.payloads_dir = self.storage_dir / "payloads"
+        self.manifest_file = self.storage_dir / "templates_manifest.json"
         
         # === Pasta templates-modelos (ao lado do executável/projeto) ===
         self.templates_dir = app_dir / "templates-modelos"
         self.templates_dir.mkdir(parents=True, exist_ok=True)
         
-        self.models: Dict[str, CustomAIModel] = {}
+        self.models: Dict[str, CustomAIModel] = ModelRegistry()
+        # Payloads em memória (LRU) e hash do que está gravado de cada um
+        self.max_loaded_payloads = max_loaded_payloads or self.MAX_LOADED_PAYLOADS
+        self._payload_lru = LRUPolicy()
+        self._payload_hashes: Dict[str, int] = {}
+        self._saved_headers: Dict[str, Dict] = {}
+        # id -> template interno do modelo; id -> todos os arquivos que citam o id
+        self._template_files: Dict[str, Path] = {}
+        self._files_by_id: Dict[str, set] = {}
+        self._manifest: Dict[str, Dict] = {}
+        self._manifest_dirty = False
+        self.payload_stats = {"loads": 0, "evictions": 0, "templates_parsed": 0, "templates_cached": 0}
+        # index.json = snapshot dos headers; alterações entram no journal ao lado
+        self._index = StateJournal(self.storage_dir / "index.json")
+        # Gravação em lote: dentro de batch() os saves só acumulam
+        self._batch_depth = 0
+        self._pending_ids: set = set()
+        self._pending_full = False
+        self.write_stats = {"flushes": 0, "files_written": 0, "bytes_written": 0, "last_flush_bytes": 0}
         self._load_models()
         self._preload_richie_model()
 
+    # ==========================================
+    # === HEADERS E PAYLOADS (carga sob demanda) ===
+    # ==========================================
+
+    @staticmethod
+    def _model_header(model: CustomAIModel) -> Dict:
+        """Campos leves do modelo (sem carregar o payload)"""
+        return {name: model.__dict__[name] for name in HEADER_FIELDS}
+
+    @staticmethod
+    def _payload_text(payload: Dict) -> str:
+        return json.dumps(payload, ensure_ascii=False)
+
+    def _lazy_model(self, header: Dict) -> CustomAIModel:
+        """Cria o modelo só com o header; o payload é lido no primeiro acesso"""
+        model = CustomAIModel(**header)
+        for name in PAYLOAD_FIELDS:
+            del model.__dict__[name]
+        model.__dict__["_payload_loader"] = self._load_payload
+        return model
+
+    def _adopt(self, model: CustomAIModel):
+        """Registra um modelo com payload já em memória (novo, importado ou legado)"""
+        model.__dict__["_payload_loader"] = self._load_payload
+        self.models[model.id] = model
+
+    def _read_payload(self, model_id: str) -> Optional[Dict]:
+        """Payload gravado: payloads/<id>.json ou, na falta dele, o template"""
+        payload_file = self.payloads_dir / f"{model_id}.json"
+        if payload_file.exists():
+            return json.loads(payload_file.read_text(encoding='utf-8'))
+        tpl_file = self._template_files.get(model_id)
+        if tpl_file is not None and tpl_file.exists():
+            raw = json.loads(tpl_file.read_text(encoding='utf-8-sig'))
+            data = raw.get("_model_data", {}) if isinstance(raw, dict) else {}
+            return {name: data[name] for name in PAYLOAD_FIELDS if name in data}
+        return None
+
+    def _load_payload(self, model: CustomAIModel):
+        """Chamado por CustomAIModel.__getattr__ no primeiro acesso a um campo pesado"""
+        try:
+            payload = self._read_payload(model.id) or {}
+        except Exception as e:
+            print(f"Erro ao carregar payload do modelo {model.id}: {e}")
+            payload = {}
+        for name in PAYLOAD_FIELDS:
+            if name not in model.__dict__:
+                model.__dict__[name] = payload.get(name, [])
+        self._payload_hashes[model.id] = hash(self._payload_text(self._model_payload(model)))
+        self.payload_stats["loads"] += 1
+        self._payload_lru.insert(model.id)
+        self._evict_payloads(keep=model.id)
+
+    @staticmethod
+    def _model_payload(model: CustomAIModel) -> Dict:
+        return {name: getattr(model, name) for name in PAYLOAD_FIELDS}
+
+    def _forget_payload(self, model_id: str):
+        """Descarta caches e o payload gravado de um modelo removido"""
+        self._payload_lru.remove(model_id)
+        self._payload_hashes.pop(model_id, None)
+        try:
+            (self.payloads_dir / f"{model_id}.json").unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Erro ao remover payload {model_id}: {e}")
+
+    def _evict_payloads(self, keep: str = None):
+        """Descarrega os payloads menos usados; só os iguais ao que está no disco"""
+        attempts = len(self._payload_lru)
+        while len(self._payload_lru) > self.max_loaded_payloads and attempts > 0:
+            attempts -= 1
+            victim = self._payload_lru.victim()
+            model = self.models.get(victim)
+            if model is None or not model.payload_loaded():
+                self._payload_lru.remove(victim)
+                continue
+            clean = victim in self._payload_hashes and \
+                hash(self._payload_text(self._model_payload(model))) == self._payload_hashes[victim]
+            if victim == keep or not clean:
+                # Alterado e ainda não salvo: fica em memória
+                self._payload_lru.touch(victim)
+                continue
+            # Objeto que substituiu outro de mesmo id em self.models pode não ter loader
+            model.__dict__.setdefault("_payload_loader", self._load_payload)
+            for name in PAYLOAD_FIELDS:
+                del model.__dict__[name]
+            self._payload_lru.remove(victim)
+            self.payload_stats["evictions"] += 1
+
+    # ==========================================
+    # === CARGA DO DISCO ===
+    # ==========================================
+
     def _load_models(self):
         """Carrega modelos salvos do disco (index.json + templates-modelos/)"""
-        # 1. Carregar do index.json clássico
-        index_file = self.storage_dir / "index.json"
-        if index_file.exists():
+        legacy = False
+        # 1. Carregar do index.json (v2: headers + journal; v1: modelos completos)
+        try:
+            snapshot, events = self._index.load()
+        except Exception as e:
+            print(f"Erro ao carregar index.json: {e}")
+            snapshot, events = None, []
+        entries = {}
+        for model_data in (snapshot or {}).get("models", []):
+            entries[model_data.get("id")] = model_data
+        for event in events:
+            if event.get("type") == "header":
+                entries[event["header"].get("id")] = event["header"]
+            elif event.get("type") == "delete":
+                entries.pop(event.get("id"), None)
+        for model_data in entries.values():
             try:
-                data = json.loads(index_file.read_text(encoding='utf-8-sig'))
-                for model_data in data.get("models", []):
-                    try:
-                        model = CustomAIModel(**model_data)
-                        self.models[model.id] = model
-                    except Exception as me:
-                        print(f"Erro ao carregar modelo do index: {me}")
-            except Exception as e:
-                print(f"Erro ao carregar index.json: {e}")
+                if any(name in model_data for name in PAYLOAD_FIELDS):
+                    model = CustomAIModel(**model_data)
+                    self._adopt(model)
+                    legacy = True
+                else:
+                    model = self._lazy_model(model_data)
+                    self.models[model.id] = model
+                    self._saved_headers[model.id] = self._model_header(model)
+            except Exception as me:
+                print(f"Erro ao carregar modelo do index: {me}")
         
-        # 2. Escanear pasta templates-modelos/ para JSONs individuais
-        if self.templates_dir.exists():
-            for json_file in self.templates_dir.glob("*.json"):
-                try:
-                    raw = json.loads(json_file.read_text(encoding='utf-8-sig'))
-                    # Formato interno (gravado por nós): tem "_model_id"
-                    if isinstance(raw, dict) and "_model_id" in raw:
-                        mid = raw["_model_id"]
-                        if mid not in self.models:
-                            model_payload = raw.get("_model_data", {})
-                            if model_payload:
-                                try:
-                                    model = CustomAIModel(**model_payload)
-                                    self.models[model.id] = model
-                                except Exception:
-                                    pass
-                except Exception as e:
-                    print(f"Erro ao ler template {json_file.name}: {e}")
+        # 2. Escanear pasta templates-modelos/ para JSONs individuais.
+        # O manifest (nome -> mtime/tamanho/header) evita reler arquivos inalterados.
+        self._load_templates()
+
+        # Index no formato antigo: migra para headers + payloads/
+        if legacy:
+            self._save_models()
+            self._write_index_snapshot()
+
+    def _load_manifest(self):
+        try:
+            self._manifest = json.loads(self.manifest_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            self._manifest = {}
+
+    def _save_manifest(self):
+        self._manifest_dirty = False
+        try:
+            self.manifest_file.write_text(json.dumps(self._manifest, ensure_ascii=False), encoding='utf-8')
+        except OSError as e:
+            print(f"Erro ao gravar manifest de templates: {e}")
+
+    @staticmethod
+    def _stat_key(stat: os.stat_result) -> List[int]:
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _scan_template(self, path: Path, stat: os.stat_result) -> Dict:
+        """Lê um template e retorna a entrada do manifest (ids + header)"""
+        entry = {"stat": self._stat_key(stat), "model_id": None, "header": None, "ids": []}
+        raw = json.loads(path.read_text(encoding='utf-8-sig'))
+        # Formato interno (gravado por nós): tem "_model_id"
+        if isinstance(raw, dict) and "_model_id" in raw:
+            payload = raw.get("_model_data", {})
+            entry["model_id"] = raw["_model_id"]
+            entry["ids"] = [raw["_model_id"]]
+            if payload:
+                entry["header"] = {k: v for k, v in payload.items() if k not in PAYLOAD_FIELDS}
+        # JSONs copiados com "id" no topo (objeto ou lista de objetos)
+        elif isinstance(raw, dict) and isinstance(raw.get("id"), str):
+            entry["ids"] = [raw["id"]]
+        elif isinstance(raw, list):
+            entry["ids"] = [item["id"] for item in raw if isinstance(item, dict) and isinstance(item.get("id"), str)]
+        return entry
+
+    def _index_file(self, name: str, entry: Dict):
+        """Registra o arquivo `name` no manifest e no índice id -> arquivos"""
+        old = self._manifest.get(name)
+        if old is not None:
+            for mid in old.get("ids", []):
+                self._files_by_id.get(mid, set()).discard(name)
+        self._manifest[name] = entry
+        for mid in entry.get("ids", []):
+            self._files_by_id.setdefault(mid, set()).add(name)
+        self._manifest_dirty = True
+
+    def _delete_model_files(self, model_id: str):
+        """Apaga os arquivos de templates-modelos/ que citam o modelo (sem varrer a pasta)"""
+        for name in self._files_by_id.pop(model_id, set()):
+            entry = self._manifest.pop(name, None) or {}
+            for other in entry.get("ids", []):
+                self._files_by_id.get(other, set()).discard(name)
+            try:
+                (self.templates_dir / name).unlink()
+                print(f"[AIManager] Arquivo físico deletado: {name}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[AIManager] Erro ao deletar arquivo físico {name}: {e}")
+        self._template_files.pop(model_id, None)
+        self._manifest_dirty = True
+
+    def _load_templates(self):
+        if not self.templates_dir.exists():
+            return
+        self._load_manifest()
+        manifest = {}
+        changed = False
+        with os.scandir(self.templates_dir) as entries:
+            for item in entries:
+                if not item.name.endswith(".json") or not item.is_file():
+                    continue
+                path = Path(item.path)
+                stat = item.stat()
+                entry = self._manifest.get(item.name)
+                if entry is not None and entry.get("stat") == self._stat_key(stat) and "ids" in entry:
+                    self.payload_stats["templates_cached"] += 1
+                else:
+                    try:
+                        entry = self._scan_template(path, stat)
+                    except Exception as e:
+                        print(f"Erro ao ler template {item.name}: {e}")
+                        continue
+                    self.payload_stats["templates_parsed"] += 1
+                    changed = True
+                manifest[item.name] = entry
+                for ref in entry.get("ids", []):
+                    self._files_by_id.setdefault(ref, set()).add(item.name)
+
+                mid = entry.get("model_id")
+                if not mid:
+                    continue
+                self._template_files.setdefault(mid, path)
+                if mid not in self.models and entry.get("header"):
+                    try:
+                        self.models[mid] = self._lazy_model(entry["header"])
+                        self._template_files[mid] = path
+                    except Exception:
+                        pass
+        if changed or len(manifest) != len(self._manifest):
+            self._manifest = manifest
+            self._save_manifest()
+        else:
+            self._manifest = manifest
 
     def _preload_richie_model(self):
         """Carrega automaticamente o Richie AI como modelo base se não existir no index"""
@@ -245,7 +626,7 @@ class CustomAIManager:
             model = self._import_botforge_json(raw)
             if model:
                 self.models[model.id] = model
-                self._save_models()
+                self._save_models(model.id)
                 print(f"[Richie] Modelo Richie AI carregado automaticamente: {model.id}")
         except Exception as e:
             print(f"[Richie] Erro ao carregar Richie_AI_Assistant.json: {e}")
@@ -264,9 +645,11 @@ class CustomAIManager:
                 to_remove = [k for k, v in self.models.items() if "richie" in v.name.lower() or k == "richie-01"]
                 for k in to_remove:
                     del self.models[k]
+                    self._forget_payload(k)
+                    self._delete_model_files(k)
                     
                 self.models[model.id] = model
-                self._save_models()
+                self._save_models(model.id)
                 return True, f"Richie resetado para a versão de fábrica: {model.version}"
         except Exception as e:
             return False, f"Erro ao resetar: {e}"
@@ -321,35 +704,142 @@ class CustomAIManager:
         )
         return model
 
-    def _save_models(self):
-        """Salva modelos no disco (index.json + JSONs individuais em templates-modelos/)"""
-        # 1. Salvar index.json consolidado
-        index_file = self.storage_dir / "index.json"
-        data = {
-            "version": "1.0",
-            "updated_at": datetime.now().isoformat(),
-            "models": [asdict(m) for m in self.models.values()]
-        }
-        index_file.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
-        
-        # 2. Gravar cada modelo como JSON individual em templates-modelos/
-        for model in self.models.values():
-            safe_name = model.name.replace(' ', '_').replace('/', '-').replace('\\', '-')
-            tpl_file = self.templates_dir / f"{safe_name}_{model.id}.json"
-            tpl_data = {
-                "_model_id": model.id,
-                "_saved_at": datetime.now().isoformat(),
-                "_model_data": asdict(model)
-            }
+    @staticmethod
+    def _atomic_write(path: Path, text: str) -> int:
+        """Grava tmp + os.replace (nunca deixa arquivo pela metade); retorna os bytes"""
+        data = text.encode('utf-8')
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return len(data)
+
+    @contextmanager
+    def batch(self):
+        """Agrupa vários saves em uma única gravação no fim do bloco"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and (self._pending_full or self._pending_ids):
+                self._save_models()
+
+    def _save_models(self, *changed_ids: str):
+        """
+        Grava só o que mudou desde a última gravação.
+        `changed_ids` diz quais payloads foram alterados; sem ids, todos os
+        payloads em memória são verificados (mudanças feitas direto nos
+        atributos). Headers são sempre comparados (barato, sem I/O).
+        """
+        if changed_ids:
+            self._pending_ids.update(changed_ids)
+        else:
+            self._pending_full = True
+        if self._batch_depth:
+            return
+        check_all, self._pending_full = self._pending_full, False
+        payload_ids, self._pending_ids = self._pending_ids, set()
+
+        stats = self.write_stats
+        written = 0
+        events = []
+        self.payloads_dir.mkdir(parents=True, exist_ok=True)
+        for model in list(self.models.values()):
+            header = self._model_header(model)
+            header_changed = self._saved_headers.get(model.id) != header
+            payload_text = None
+            if model.payload_loaded() and (check_all or model.id in payload_ids
+                                           or model.id not in self._payload_hashes):
+                text = self._payload_text(self._model_payload(model))
+                if hash(text) != self._payload_hashes.get(model.id):
+                    payload_text = text
+            if not header_changed and payload_text is None:
+                continue
+
             try:
-                tpl_file.write_text(json.dumps(tpl_data, indent=2, ensure_ascii=False), encoding='utf-8')
+                if payload_text is not None:
+                    written += self._atomic_write(self.payloads_dir / f"{model.id}.json", payload_text)
+                    stats["files_written"] += 1
+                    if model.id not in self._payload_hashes:
+                        model.__dict__.setdefault("_payload_loader", self._load_payload)
+                        self._payload_lru.insert(model.id)
+                    self._payload_hashes[model.id] = hash(payload_text)
+                written += self._write_template(model, header)
+                stats["files_written"] += 1
             except Exception as e:
-                print(f"Erro ao gravar template {tpl_file.name}: {e}")
+                print(f"Erro ao gravar modelo {model.id}: {e}")
+                continue
+            if header_changed:
+                events.append({"type": "header", "header": header})
+                self._saved_headers[model.id] = header
+
+        for model_id in [mid for mid in self._saved_headers if mid not in self.models]:
+            events.append({"type": "delete", "id": model_id})
+            del self._saved_headers[model_id]
+
+        if events:
+            before = self._index.journal_bytes
+            self._index.append_many(events)
+            written += self._index.journal_bytes - before
+            if self._index.needs_compaction():
+                written += self._write_index_snapshot()
+
+        stats["flushes"] += 1
+        stats["bytes_written"] += written
+        stats["last_flush_bytes"] = written
+        self._evict_payloads()
+
+    def _write_template(self, model: CustomAIModel, header: Dict) -> int:
+        """Regrava o JSON do modelo em templates-modelos/ (carrega o payload se preciso)"""
+        safe_name = model.name.replace(' ', '_').replace('/', '-').replace('\\', '-')
+        tpl_file = self.templates_dir / f"{safe_name}_{model.id}.json"
+        tpl_data = {
+            "_model_id": model.id,
+            "_saved_at": datetime.now().isoformat(),
+            "_model_data": dict(header, **self._model_payload(model))
+        }
+        size = self._atomic_write(tpl_file, json.dumps(tpl_data, indent=2, ensure_ascii=False))
+        # Modelo renomeado: o template com o nome antigo fica obsoleto
+        previous = self._template_files.get(model.id)
+        if previous is not None and previous.name != tpl_file.name:
+            self._files_by_id.get(model.id, set()).discard(previous.name)
+            self._manifest.pop(previous.name, None)
+            try:
+                previous.unlink()
+            except OSError:
+                pass
+        self._template_files[model.id] = tpl_file
+        # Manifest só em memória: é regravado junto com o snapshot do index
+        self._index_file(tpl_file.name, {
+            "stat": self._stat_key(tpl_file.stat()),
+            "model_id": model.id,
+            "header": header,
+            "ids": [model.id]
+        })
+        return size
+
+    def _write_index_snapshot(self) -> int:
+        """Compacta o index: todos os headers em index.json e journal zerado"""
+        self._index.write_snapshot({
+            "version": "2.0",
+            "updated_at": datetime.now().isoformat(),
+            "models": [self._model_header(m) for m in self.models.values()]
+        }, indent=2)
+        self._save_manifest()
+        self.write_stats["files_written"] += 2
+        return self._index.snapshot_bytes
 
     def save_models(self):
         """Interface pública para flush de memória"""
         self._save_models()
 
+    def flush(self):
+        """Grava pendências e compacta o index (ex.: ao fechar o app)"""
+        self._save_models()
+        if self._index.events_since_snapshot or self._manifest_dirty:
+            self._write_index_snapshot()
+
     def import_json_file(self, source_path: str) -> str:
         """Copia um JSON importado para a pasta templates-modelos/ e retorna o caminho destino"""
         src = Path(source_path)
@@ -362,6 +852,10 @@ class CustomAIManager:
             dest = self.templates_dir / f"{src.stem}_{counter}{src.suffix}"
             counter += 1
         shutil.copy2(str(src), str(dest))
+        try:
+            self._index_file(dest.name, self._scan_template(dest, dest.stat()))
+        except Exception as e:
+            print(f"Erro ao indexar template {dest.name}: {e}")
         return str(dest)
 
     def create_model(
@@ -402,7 +896,7 @@ class CustomAIManager:
         )
 
         self.models[model_id] = model
-        self._save_models()
+        self._save_models(model_id)
 
         return model
 
@@ -442,16 +936,17 @@ class CustomAIManager:
 
     def list_models(self, active_only: bool = True, unique_per_group: bool = False) -> List[CustomAIModel]:
         """Lista todos os modelos. unique_per_group=True retorna apenas a versão ativa de cada grupo."""
-        models = list(self.models.values())
-        if active_only:
-            models = [m for m in models if m.is_active]
         if unique_per_group:
-            seen_groups = {}
-            for m in models:
-                grp = m.repo_group or m.name.lower().strip()
-                if grp not in seen_groups:
-                    seen_groups[grp] = m
-            models = list(seen_groups.values())
+            # Primeiro modelo (ativo) de cada grupo, direto do índice de grupos
+            models = []
+            for grp in self.models.group_names():
+                members = self.models.active_versions(grp) if active_only else self.models.versions(grp)
+                if members:
+                    models.append(members[0])
+        else:
+            models = list(self.models.values())
+            if active_only:
+                models = [m for m in models if m.is_active]
         return sorted(models, key=lambda m: m.name)
 
     def update_model(self, model_id: str, **kwargs) -> bool:
@@ -465,7 +960,7 @@ class CustomAIManager:
                 setattr(model, key, value)
 
         model.updated_at = datetime.now().isoformat()
-        self._save_models()
+        self._save_models(model_id)
         return True
 
     def delete_model(self, model_id: str) -> bool:
@@ -473,36 +968,14 @@ class CustomAIManager:
         if model_id in self.models:
             # Apagar da memória
             del self.models[model_id]
+            self._forget_payload(model_id)
+            # Deletar arquivos físicos pelo índice id -> arquivos (templates-modelos)
+            self._delete_model_files(model_id)
             # Salvar o index.json sem o modelo
-            self._save_models()
-
-            # Deletar arquivo físico se existir na pasta templates-modelos
-            if self.templates_dir.exists():
-                for json_file in self.templates_dir.glob("*.json"):
-                    try:
-                        import json
-                        with open(json_file, 'r', encoding='utf-8-sig') as f:
-                            data = json.load(f)
-                        
-                        to_delete = False
-                        if isinstance(data, dict):
-                            if data.get("id") == model_id:
-                                to_delete = True
-                        elif isinstance(data, list):
-                            for item in data:
-                                if isinstance(item, dict) and item.get("id") == model_id:
-                                    to_delete = True
-                                    break
-                        
-                        if to_delete:
-                            import os
-                            os.remove(json_file)
-                            print(f"[AIManager] Arquivo físico deletado: {json_file.name}")
-                    except Exception as e:
-                        print(f"[AIManager] Erro ao deletar arquivo físico {json_file}: {e}")
-
+            self._save_models(model_id)
             return True
         return False
+
     def add_training_data(self, model_id: str, user_input: str, expected_output: str) -> bool:
         """Adiciona dados de treinamento ao modelo"""
         model = self.models.get(model_id)
@@ -516,7 +989,7 @@ class CustomAIManager:
         })
 
         model.updated_at = datetime.now().isoformat()
-        self._save_models()
+        self._save_models(model_id)
         return True
 
     def add_knowledge(self, model_id: str, knowledge: str) -> bool:
@@ -527,7 +1000,7 @@ class CustomAIManager:
 
         model.knowledge_base.append(knowledge)
         model.updated_at = datetime.now().isoformat()
-        self._save_models()
+        self._save_models(model_id)
         return True
 
     def export_model(self, model_id: str, output_path: str = None) -> Optional[str]:
@@ -565,7 +1038,7 @@ class CustomAIManager:
 
             model = CustomAIModel(**model_data)
             self.models[model.id] = model
-            self._save_models()
+            self._save_models(model.id)
 
             return model
         except Exception as e:
@@ -578,8 +1051,7 @@ class CustomAIManager:
 
     def get_version_group(self, bot_name: str) -> List['CustomAIModel']:
         """Retorna todas as versões de um bot agrupadas por nome normalizado."""
-        key = bot_name.lower().strip()
-        versions = [m for m in self.models.values() if (m.repo_group or m.name.lower().strip()) == key]
+        versions = self.models.versions(bot_name.lower().strip())
         return sorted(versions, key=lambda m: m.version_label, reverse=True)
 
     def get_active_version(self, bot_name: str) -> 'Optional[CustomAIModel]':
@@ -595,11 +1067,9 @@ class CustomAIManager:
         target = self.models.get(model_id)
         if not target:
             return False
-        grp = target.repo_group or target.name.lower().strip()
-        for m in self.models.values():
-            if (m.repo_group or m.name.lower().strip()) == grp:
-                m.is_active = (m.id == model_id)
-        self._save_models()
+        for m in self.models.versions(group_key(target)):
+            m.is_active = (m.id == model_id)
+        self._save_models(model_id)
         return True
 
     def save_current_as_version(self, model_id: str, label: str = None) -> 'Optional[CustomAIModel]':
@@ -607,7 +1077,7 @@ class CustomAIManager:
         source = self.models.get(model_id)
         if not source:
             return None
-        grp = source.repo_group or source.name.lower().strip()
+        grp = group_key(source)
         existing = self.get_version_group(source.name)
         next_num = len(existing) + 1
         new_label = label or f"v{next_num}"
@@ -623,7 +1093,7 @@ class CustomAIManager:
         
         clone = CustomAIModel(**clone_data)
         self.models[clone.id] = clone
-        self._save_models()
+        self._save_models(clone.id)
         return clone
 
     def import_as_version(self, target_bot_name: str, file_path: str) -> 'Optional[CustomAIModel]':
@@ -649,6 +1119,9 @@ class CustomAIManager:
         
         if not model:
             return None
+        # O id vem do JSON: importar o mesmo bot de novo não pode sobrescrever uma versão
+        if model.id in self.models:
+            model.id = str(uuid.uuid4())[:8]
         
         grp = target_bot_name.lower().strip()
         existing = self.get_version_group(target_bot_name)
@@ -660,34 +1133,26 @@ class CustomAIManager:
         model.updated_at = datetime.now().isoformat()
         
         # Desativar as outras versões
-        for m in self.models.values():
-            if (m.repo_group or m.name.lower().strip()) == grp:
-                if m.id != model.id:
-                    m.is_active = False
+        for m in self.models.versions(grp):
+            if m.id != model.id:
+                m.is_active = False
         
         self.models[model.id] = model
-        self._save_models()
+        self._save_models(model.id)
         return model
 
     def get_unique_bots(self) -> List[Dict]:
         """Retorna lista de bots únicos (agrupados) com contagem de versões."""
-        groups = {}
-        for m in self.models.values():
-            grp = m.repo_group or m.name.lower().strip()
-            if grp not in groups:
-                groups[grp] = {'name': m.name, 'versions': [], 'active_model': None}
-            groups[grp]['versions'].append(m)
-            if m.is_active:
-                groups[grp]['active_model'] = m
-        
         result = []
-        for grp, data in groups.items():
-            active = data['active_model'] or data['versions'][0]
+        for grp in self.models.group_names():
+            versions = self.models.versions(grp)
+            active_versions = self.models.active_versions(grp)
+            active = active_versions[-1] if active_versions else versions[0]
             result.append({
                 'name': active.name,
                 'repo_group': grp,
                 'active_model': active,
-                'version_count': len(data['versions'])
+                'version_count': len(versions)
             })
         return sorted(result, key=lambda x: x['name'])
 
@@ -696,18 +1161,20 @@ class CustomAIManager:
         target = self.models.get(model_id)
         if not target:
             return False
-        grp = target.repo_group or target.name.lower().strip()
+        grp = group_key(target)
         was_active = target.is_active
         
         del self.models[model_id]
+        self._forget_payload(model_id)
+        self._delete_model_files(model_id)
         
         # Se era ativa, ativar a próxima versão disponível
         if was_active:
-            remaining = [m for m in self.models.values() if (m.repo_group or m.name.lower().strip()) == grp]
+            remaining = self.models.versions(grp)
             if remaining:
                 remaining[0].is_active = True
         
-        self._save_models()
+        self._save_models(model_id)
         return True
 
     @staticmethod
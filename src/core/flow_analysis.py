@@ -0,0 +1,346 @@
+"""
+Flow Analysis - Validacao completa de um fluxo BotForge em tempo linear
+Roda sobre o FlowIR de um FlowEngine e devolve diagnosticos estruturados
+(FlowDiagnostic): ciclos (Tarjan), alcancabilidade a partir do inicio (BFS),
+intents inalcancaveis, portas out_N sem uso e keywords sombreadas entre
+intents (Aho-Corasick).
+
+O FlowAnalyzer guarda a analise de keywords de cada no NLP, chaveada pela
+assinatura das suas intents: ao reanalisar o fluxo depois de uma edicao, so
+os NLPs que mudaram sao refeitos. As passadas de grafo sao O(nodes + conexoes).
+"""
+
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .keyword_automaton import KeywordAutomaton
+
+SEVERITY_ICONS = {"error": "❌", "warning": "⚠️", "info": "ℹ️"}
+
+# Tipos de node que esperam nova mensagem do usuario (um ciclo que passa
+# por um deles e um loop de conversa, nao um loop infinito)
+WAIT_TYPE_PREFIXES = ("recv", "input_", "volta")
+
+
+@dataclass
+class FlowDiagnostic:
+    """Um problema encontrado no fluxo"""
+    code: str       # no_start, disconnected, unreachable, cycle, port_unused, keyword_shadowed, ...
+    severity: str   # error, warning, info
+    message: str
+    node_id: Optional[str] = None
+    port: Optional[str] = None
+    detail: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    def __str__(self) -> str:
+        return f"{SEVERITY_ICONS.get(self.severity, '')} {self.message}"
+
+
+def _port_number(port: Any) -> Optional[int]:
+    """'out_3' -> 3 (None para 'out' e portas fora do padrao)"""
+    if isinstance(port, str) and port.startswith("out_"):
+        try:
+            return int(port[4:])
+        except ValueError:
+            return None
+    return None
+
+
+def _ids_preview(ids: List[Any], limit: int = 5) -> str:
+    shown = ", ".join(str(i) for i in ids[:limit])
+    return shown + (f" … (+{len(ids) - limit})" if len(ids) > limit else "")
+
+
+class FlowAnalyzer:
+    """
+    Analisador reutilizavel: `analyze(engine)` devolve a lista de
+    FlowDiagnostic do fluxo do engine. Manter a mesma instancia entre
+    edicoes reaproveita a analise de keywords dos NLPs nao alterados.
+    """
+
+    def __init__(self):
+        # node_id do NLP -> (assinatura das intents, diagnosticos)
+        self._keyword_cache: Dict[Any, Tuple[Tuple, List[FlowDiagnostic]]] = {}
+        self.stats = {"runs": 0, "keyword_cache_hits": 0, "keyword_cache_misses": 0}
+
+    def analyze(self, engine) -> List[FlowDiagnostic]:
+        """Roda todas as verificacoes; ordem: estrutura, grafo, portas, intents, keywords"""
+        self.stats["runs"] += 1
+        ir = engine.ir
+        diagnostics: List[FlowDiagnostic] = []
+        start = engine.find_start_node()
+        start_idx = ir.index.get(start)
+
+        # --- Estrutura (os checks do validate_flow original) ---
+        if not start:
+            diagnostics.append(FlowDiagnostic(
+                "no_start", "warning", "Nenhum nó de início encontrado (recv/api_entry)"))
+
+        connected = bytearray(len(ir.ids))
+        for src, dst in zip(ir.edge_src, ir.edge_dst):
+            connected[src] = 1
+            connected[dst] = 1
+        for rec in ir.nodes:
+            if not connected[rec.index] and rec.index != start_idx:
+                diagnostics.append(FlowDiagnostic(
+                    "disconnected", "warning", f"Nó '{rec.id}' ({rec.label}) está desconectado", rec.id))
+
+        for src, dst in zip(ir.edge_src, ir.edge_dst):
+            if src >= ir.node_count:
+                diagnostics.append(FlowDiagnostic(
+                    "dangling_source", "warning", f"Conexão referencia nó source '{ir.ids[src]}' inexistente",
+                    detail={"source": ir.ids[src], "target": ir.ids[dst]}))
+            if dst >= ir.node_count:
+                diagnostics.append(FlowDiagnostic(
+                    "dangling_target", "warning", f"Conexão referencia nó target '{ir.ids[dst]}' inexistente",
+                    ir.ids[src] if src < ir.node_count else None,
+                    detail={"source": ir.ids[src], "target": ir.ids[dst]}))
+
+        nlp_nodes = ir.type_index.get("nlp", [])
+        if nlp_nodes and not engine.nodes[ir.ids[nlp_nodes[0]]].get("intents"):
+            diagnostics.append(FlowDiagnostic(
+                "nlp_without_intents", "info",
+                "Nó NLP não tem 'intents' configuradas — detecção via JSON desabilitada", ir.ids[nlp_nodes[0]]))
+
+        # --- Grafo ---
+        reachable = self._reachable(ir, start_idx)
+        for rec in ir.nodes:
+            if connected[rec.index] and not reachable[rec.index]:
+                diagnostics.append(FlowDiagnostic(
+                    "unreachable", "warning", f"Nó '{rec.id}' ({rec.label}) não é alcançável a partir do início",
+                    rec.id))
+
+        for component in self._cycles(ir):
+            diagnostics.append(self._cycle_diagnostic(ir, component))
+
+        # --- Portas e intents ---
+        # node -> portas com conexao (dict como conjunto ordenado: diagnosticos estaveis)
+        used_ports: Dict[int, Dict[Any, None]] = {}
+        for src, port_id in zip(ir.edge_src, ir.edge_port):
+            used_ports.setdefault(src, {})[ir.ports[port_id]] = None
+
+        intent_ports: Dict[int, Dict[str, str]] = {}
+        nlp_configs: Dict[int, List[Dict]] = {}
+        for idx in nlp_nodes:
+            config = engine._intents_config(engine.nodes[ir.ids[idx]])
+            nlp_configs[idx] = config
+            intent_ports[idx] = {
+                intent_cfg.get("port") or f"out_{pos}": intent_cfg.get("name", "")
+                for pos, intent_cfg in enumerate(config)
+            }
+
+        for rec in ir.nodes:
+            used = used_ports.get(rec.index, ())
+            declared = len(rec.out_labels or ())
+            routed = intent_ports.get(rec.index, {})
+            for i in range(declared):
+                port = f"out_{i}"
+                if port not in used and port not in routed:
+                    diagnostics.append(FlowDiagnostic(
+                        "port_unused", "warning",
+                        f"Saída '{rec.out_labels[i]}' ({port}) do nó '{rec.id}' não está conectada", rec.id, port))
+            if declared:
+                for port in used:
+                    number = _port_number(port)
+                    if number is not None and number >= declared and port not in routed:
+                        diagnostics.append(FlowDiagnostic(
+                            "port_undeclared", "warning",
+                            f"Conexão sai da porta '{port}' do nó '{rec.id}', que só tem {declared} saída(s)",
+                            rec.id, port))
+
+        for idx in nlp_nodes:
+            nlp_id = ir.ids[idx]
+            used = used_ports.get(idx, ())
+            for port, intent_name in intent_ports[idx].items():
+                if not reachable[idx]:
+                    diagnostics.append(FlowDiagnostic(
+                        "intent_unreachable", "warning",
+                        f"Intenção '{intent_name}' nunca é avaliada: o NLP '{nlp_id}' não é alcançável",
+                        nlp_id, port, {"intent": intent_name}))
+                elif port not in used:
+                    diagnostics.append(FlowDiagnostic(
+                        "intent_unrouted", "warning",
+                        f"Intenção '{intent_name}' do NLP '{nlp_id}' não tem rota ({port} sem conexão)",
+                        nlp_id, port, {"intent": intent_name}))
+
+        # --- Keywords (incremental por NLP) ---
+        seen = set()
+        for idx in nlp_nodes:
+            nlp_id = ir.ids[idx]
+            seen.add(nlp_id)
+            diagnostics.extend(self._keyword_diagnostics(nlp_id, nlp_configs[idx]))
+        for stale in [nid for nid in self._keyword_cache if nid not in seen]:
+            del self._keyword_cache[stale]
+
+        return diagnostics
+
+    # ------------------------------------------------------------------
+    # Grafo
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _reachable(ir, start_idx: Optional[int]) -> bytearray:
+        """BFS a partir do inicio sobre todas as arestas"""
+        seen = bytearray(len(ir.ids))
+        if start_idx is None:
+            return seen
+        offsets, out_edges, edge_dst = ir.out_offsets, ir.out_edges, ir.edge_dst
+        seen[start_idx] = 1
+        queue = deque([start_idx])
+        while queue:
+            v = queue.popleft()
+            for k in range(offsets[v], offsets[v + 1]):
+                w = edge_dst[out_edges[k]]
+                if not seen[w]:
+                    seen[w] = 1
+                    queue.append(w)
+        return seen
+
+    @staticmethod
+    def _cycles(ir) -> List[List[int]]:
+        """
+        Componentes fortemente conexas com ciclo (mais de um node, ou laco
+        no proprio node), pelo algoritmo de Tarjan em versao iterativa.
+        """
+        n = len(ir.ids)
+        offsets, out_edges, edge_dst = ir.out_offsets, ir.out_edges, ir.edge_dst
+        self_loop = bytearray(n)
+        for src, dst in zip(ir.edge_src, ir.edge_dst):
+            if src == dst:
+                self_loop[src] = 1
+
+        order = [-1] * n
+        low = [0] * n
+        on_stack = bytearray(n)
+        stack: List[int] = []
+        counter = 0
+        components = []
+        for root in range(n):
+            if order[root] != -1:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [[root, offsets[root]]]
+            while work:
+                frame = work[-1]
+                v, k = frame
+                if k < offsets[v + 1]:
+                    frame[1] = k + 1
+                    w = edge_dst[out_edges[k]]
+                    if order[w] == -1:
+                        order[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        work.append([w, offsets[w]])
+                    elif on_stack[w] and order[w] < low[v]:
+                        low[v] = order[w]
+                    continue
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+                if low[v] == order[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component.append(w)
+                        if w == v:
+                            break
+                    if len(component) > 1 or self_loop[v]:
+                        component.sort()
+                        components.append(component)
+        components.sort(key=lambda c: c[0])
+        return components
+
+    @staticmethod
+    def _cycle_diagnostic(ir, component: List[int]) -> FlowDiagnostic:
+        ids = [ir.ids[i] for i in component]
+        waits = any(
+            (ir.nodes[i].type or "").startswith(WAIT_TYPE_PREFIXES)
+            for i in component if i < ir.node_count
+        )
+        if waits:
+            return FlowDiagnostic(
+                "cycle", "info", f"Loop de conversa entre {len(ids)} nó(s): {_ids_preview(ids)}",
+                ids[0], detail={"nodes": ids, "waits_for_input": True})
+        return FlowDiagnostic(
+            "cycle", "warning",
+            f"Ciclo sem ponto de espera entre {len(ids)} nó(s): {_ids_preview(ids)} — o trace para no primeiro nó repetido",
+            ids[0], detail={"nodes": ids, "waits_for_input": False})
+
+    # ------------------------------------------------------------------
+    # Keywords
+    # ------------------------------------------------------------------
+
+    def _keyword_diagnostics(self, nlp_id: Any, config: List[Dict]) -> List[FlowDiagnostic]:
+        """Diagnosticos de keywords do NLP, refeitos so se as intents mudaram"""
+        signature = tuple(
+            (intent_cfg.get("name", ""), intent_cfg.get("port"), tuple(kw.lower() for kw in intent_cfg.get("keywords", [])))
+            for intent_cfg in config
+        )
+        cached = self._keyword_cache.get(nlp_id)
+        if cached is not None and cached[0] == signature:
+            self.stats["keyword_cache_hits"] += 1
+            return cached[1]
+        self.stats["keyword_cache_misses"] += 1
+        diagnostics = self._analyze_keywords(nlp_id, signature)
+        self._keyword_cache[nlp_id] = (signature, diagnostics)
+        return diagnostics
+
+    @staticmethod
+    def _analyze_keywords(nlp_id: Any, signature: Tuple) -> List[FlowDiagnostic]:
+        """
+        Intents sem keywords, keywords repetidas em mais de uma intent e
+        keywords que contem a keyword de outra intent (sempre que a maior
+        casa, a menor tambem casa). Cada keyword e buscada uma vez num
+        automato com todas as outras: O(tamanho total das keywords + pares).
+        """
+        diagnostics = []
+        automaton = KeywordAutomaton()
+        owners: Dict[str, List[int]] = {}
+        for pos, (name, port, keywords) in enumerate(signature):
+            port = port or f"out_{pos}"
+            if not keywords:
+                diagnostics.append(FlowDiagnostic(
+                    "intent_no_keywords", "warning",
+                    f"Intenção '{name}' do NLP '{nlp_id}' não tem keywords e nunca é detectada",
+                    nlp_id, port, {"intent": name}))
+            for kw in keywords:
+                intents = owners.setdefault(kw, [])
+                if pos not in intents:
+                    intents.append(pos)
+        for kw in owners:
+            automaton.add(kw, kw)
+
+        for kw, intents in owners.items():
+            if len(intents) > 1:
+                names = [signature[pos][0] for pos in intents]
+                diagnostics.append(FlowDiagnostic(
+                    "keyword_duplicate", "warning",
+                    f"Keyword '{kw}' aparece em {len(names)} intenções do NLP '{nlp_id}': {', '.join(names)}",
+                    nlp_id, detail={"keyword": kw, "intents": names}))
+
+        for kw, intents in owners.items():
+            for inner in automaton.search(kw):
+                if inner == kw:
+                    continue
+                shadowing = [pos for pos in owners[inner] if pos not in intents]
+                if not shadowing:
+                    continue
+                names = [signature[pos][0] for pos in intents]
+                others = [signature[pos][0] for pos in shadowing]
+                diagnostics.append(FlowDiagnostic(
+                    "keyword_shadowed", "info",
+                    f"Keyword '{kw}' ({', '.join(names)}) contém '{inner}' ({', '.join(others)}) no NLP '{nlp_id}': "
+                    f"sempre que casa, a outra intenção também pontua",
+                    nlp_id, detail={"keyword": kw, "intents": names, "shadowed_by": inner, "other_intents": others}))
+        return diagnostics
@@ -0,0 +1,169 @@
+"""
+Flow IR - Representacao compilada de um fluxo BotForge
+Nodes viram inteiros, conexoes viram arrays (CSR) e cada node vira um
+registro com __slots__. O FlowEngine percorre/valida o fluxo sobre o IR,
+sem `.get()` em dicts nem ids string no caminho quente.
+"""
+
+from array import array
+from typing import Any, Dict, List, Optional
+
+# Campos de FlowNode (alem de index e id)
+NODE_FIELDS = ("type", "label", "trace_type", "trace_label", "msg", "color", "out_labels", "template")
+
+_NO_PORT = object()
+
+
+class FlowNode:
+    """Registro compacto de um node (so o que trace/rotas/validacao usam)"""
+
+    __slots__ = ("index", "id") + NODE_FIELDS
+
+    def __init__(self, index, node_id, type, label, trace_type, trace_label, msg, color, out_labels, template):
+        self.index = index
+        self.id = node_id
+        self.type = type
+        self.label = label
+        self.trace_type = trace_type
+        self.trace_label = trace_label
+        self.msg = msg
+        self.color = color
+        self.out_labels = out_labels
+        self.template = template
+
+    @classmethod
+    def from_raw(cls, index: int, node_id: str, node: Dict) -> "FlowNode":
+        return cls(
+            index, node_id,
+            node.get("type"),
+            node.get("label"),
+            node.get("type", "unknown"),
+            node.get("label", ""),
+            node.get("msg", node.get("message", "")),
+            node.get("color", "#58a6ff"),
+            node.get("out_labels", []),
+            node.get("response_template", node.get("msg", ""))
+        )
+
+
+class FlowIR:
+    """
+    Fluxo compilado.
+
+    - `ids[i]`: id original do node i. Os `node_count` primeiros sao os
+      nodes reais (ordem do JSON); depois vem ids citados so por conexoes
+      (fantasmas: nao tem registro, mas podem ter arestas de saida).
+    - Arestas na ordem original: `edge_src`, `edge_dst`, `edge_port`
+      (porta = indice em `ports`, tabela com os valores de source_port).
+    - CSR: as arestas de saida do node i sao
+      `out_edges[out_offsets[i]:out_offsets[i + 1]]`, na ordem original.
+    """
+
+    __slots__ = ("ids", "index", "nodes", "node_count", "ports", "port_index",
+                 "edge_src", "edge_dst", "edge_port", "out_offsets", "out_edges",
+                 "type_index")
+
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.index: Dict[Any, int] = {}
+        self.nodes: List[FlowNode] = []
+        self.node_count = 0
+        self.ports: List[Any] = []
+        self.port_index: Dict[Any, int] = {}
+        self.edge_src = array("l")
+        self.edge_dst = array("l")
+        self.edge_port = array("l")
+        self.out_offsets = array("l", [0])
+        self.out_edges = array("l")
+        self.type_index: Dict[Any, List[int]] = {}
+
+    # ------------------------------------------------------------------
+    # Compilacao
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def compile(cls, nodes: Dict[str, Dict], connections: List[Dict]) -> "FlowIR":
+        """Compila os nodes (id -> dict, ordem do JSON) e as conexoes"""
+        ir = cls()
+        for nid, node in nodes.items():
+            ir._intern(nid)
+            ir.nodes.append(FlowNode.from_raw(len(ir.nodes), nid, node))
+        ir.node_count = len(ir.nodes)
+        for conn in connections:
+            ir.edge_src.append(ir._intern(conn.get("source")))
+            ir.edge_dst.append(ir._intern(conn.get("target")))
+            port = conn.get("source_port")
+            port_id = ir.port_index.get(port)
+            if port_id is None:
+                port_id = ir.port_index[port] = len(ir.ports)
+                ir.ports.append(port)
+            ir.edge_port.append(port_id)
+        ir._finish()
+        return ir
+
+    def _intern(self, node_id: Any) -> int:
+        idx = self.index.get(node_id)
+        if idx is None:
+            idx = self.index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+        return idx
+
+    def _finish(self):
+        """Monta o CSR (counting sort estavel por source) e o indice de tipos"""
+        counts = [0] * (len(self.ids) + 1)
+        for src in self.edge_src:
+            counts[src + 1] += 1
+        for i in range(len(self.ids)):
+            counts[i + 1] += counts[i]
+        self.out_offsets = array("l", counts)
+        fill = counts[:-1]
+        out_edges = [0] * len(self.edge_src)
+        for edge, src in enumerate(self.edge_src):
+            out_edges[fill[src]] = edge
+            fill[src] += 1
+        self.out_edges = array("l", out_edges)
+
+        self.type_index = {}
+        for rec in self.nodes:
+            self.type_index.setdefault(rec.type, []).append(rec.index)
+
+    # ------------------------------------------------------------------
+    # Navegacao
+    # ------------------------------------------------------------------
+
+    def next_nodes(self, idx: int, port: Any = _NO_PORT) -> List[int]:
+        """Destinos (com id verdadeiro) das arestas de saida, opcionalmente de uma porta"""
+        if port is _NO_PORT:
+            port_id = None
+        else:
+            port_id = self.port_index.get(port)
+            if port_id is None:
+                return []
+        ids, edge_dst, edge_port, out_edges = self.ids, self.edge_dst, self.edge_port, self.out_edges
+        targets = []
+        for k in range(self.out_offsets[idx], self.out_offsets[idx + 1]):
+            edge = out_edges[k]
+            if port_id is not None and edge_port[edge] != port_id:
+                continue
+            target = edge_dst[edge]
+            if ids[target]:
+                targets.append(target)
+        return targets
+
+    def first_next(self, idx: int) -> Optional[int]:
+        """Primeiro destino valido (fluxo principal)"""
+        ids, edge_dst, out_edges = self.ids, self.edge_dst, self.out_edges
+        for k in range(self.out_offsets[idx], self.out_offsets[idx + 1]):
+            target = edge_dst[out_edges[k]]
+            if ids[target]:
+                return target
+        return None
+
+    def node(self, idx: Optional[int]) -> Optional[FlowNode]:
+        """Registro do node (None para fantasmas)"""
+        if idx is None or idx >= self.node_count:
+            return None
+        return self.nodes[idx]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"nodes": self.node_count, "ids": len(self.ids), "edges": len(self.edge_src), "ports": len(self.ports)}
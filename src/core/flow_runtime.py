@@ -0,0 +1,288 @@
+"""
+Flow Runtime - Interpretador de fluxos BotForge por conversa
+Executa o fluxo de um FlowEngine mensagem a mensagem. O estado de cada
+conversa fica num FlowCursor (no atual + variaveis de contexto + turno),
+pequeno e serializavel; o FlowRuntime e compartilhado e nao guarda nada
+por conversa, entao um processo atende milhares de conversas com o
+mesmo runtime. Cada mensagem custa so os nodes percorridos no turno.
+
+Semantica dos nodes (pelo tipo):
+  - recv*, input_*, question, menu: entrada. Consome a mensagem do turno
+    (gravada em context["input"] e, se o node tiver "var", nessa variavel).
+    Alcancado de novo no mesmo turno, o turno para e a conversa espera ali
+    (question/menu enviam antes o proprio texto como pergunta).
+  - send*, greeting, ai_response: saida. Renderiza o template do node com
+    as variaveis {nome} do contexto (ai_response sem template chama o
+    `responder` passado em step(), se houver).
+  - volta: fim do turno; a proxima mensagem recomeca do inicio do fluxo.
+  - end: encerra a conversa (limpa o contexto) e volta ao inicio.
+  - demais tipos: passagem (api_connector, reg, dados, ...).
+
+Conexoes para ids inexistentes encerram o turno (como no trace_flow). Um
+node que nao e de entrada visitado duas vezes no mesmo turno e um ciclo
+sem ponto de espera: o turno para ali (FlowTurn.truncated), sem repetir
+as saidas ja emitidas.
+
+Roteamento da saida de cada node:
+  - nodes NLP ou com intents/out_keywords: detecta a intencao (automato do
+    FlowEngine) e segue a porta dela (ou a de label correspondente);
+  - nodes com varias saidas: porta cujo label (ou numero) e o valor da
+    variavel "var" do node (padrao: context["route"]);
+  - senao (ou sem porta conectada): a primeira conexao de saida.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+_TEMPLATE_VAR = re.compile(r"\{(\w+)\}")
+
+INPUT_TYPE_PREFIXES = ("recv", "input_", "question", "menu")
+PROMPT_TYPES = ("question", "menu")
+OUTPUT_TYPE_PREFIXES = ("send", "greeting", "ai_response")
+
+
+class FlowCursor:
+    """
+    Estado de uma conversa: node onde ela espera (None = inicio do fluxo),
+    variaveis de contexto e numero de turnos. `to_dict()`/`from_dict()`
+    produzem um dict JSON puro (ids de node, nao indices do IR).
+    """
+
+    __slots__ = ("node", "context", "turn")
+
+    def __init__(self, node: Optional[str] = None, context: Dict[str, Any] = None, turn: int = 0):
+        self.node = node
+        self.context = context if context is not None else {}
+        self.turn = turn
+
+    def to_dict(self) -> Dict:
+        return {"node": self.node, "context": dict(self.context), "turn": self.turn}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "FlowCursor":
+        if not data:
+            return cls()
+        return cls(data.get("node"), dict(data.get("context") or {}), data.get("turn", 0))
+
+    def __repr__(self) -> str:
+        return f"FlowCursor(node={self.node!r}, turn={self.turn}, vars={len(self.context)})"
+
+
+@dataclass
+class FlowTurn:
+    """Resultado de um turno: mensagens geradas e por onde o fluxo passou"""
+    outputs: List[str] = field(default_factory=list)
+    path: List[str] = field(default_factory=list)
+    intent: Optional[str] = None
+    waiting_on: Optional[str] = None  # Node de entrada onde a conversa espera
+    ended: bool = False               # Passou por um node "end"
+    truncated: bool = False           # Parou num ciclo sem ponto de espera
+
+
+class _Op:
+    """Node compilado para o interpretador (montado uma vez por node)"""
+
+    __slots__ = ("kind", "id", "var", "template", "prompt", "route_var", "intent_ports",
+                 "detects", "out_labels", "assignments")
+
+
+def _compile_template(text: Any) -> List[str]:
+    """'Ola {nome}!' -> ['Ola ', 'nome', '!'] (indices impares sao variaveis)"""
+    return _TEMPLATE_VAR.split(text) if isinstance(text, str) else [""]
+
+
+class FlowRuntime:
+    """
+    Interpretador de um fluxo (um por FlowEngine; ver FlowEngine.get_runtime).
+
+    Uso:
+        cursor = FlowCursor()                    # ou FlowCursor.from_dict(salvo)
+        turn = runtime.step(cursor, "oi")        # avanca a conversa
+        turn.outputs                             # respostas do bot
+        salvo = cursor.to_dict()
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.ir = engine.ir
+        self._ops: Dict[int, _Op] = {}
+        info = engine.get_model_info()
+        # Variaveis globais dos templates (o contexto da conversa tem prioridade)
+        self.globals: Dict[str, Any] = {
+            "bot_name": info.get("name", ""),
+            "version": info.get("version", ""),
+            "creator": info.get("creator", ""),
+        }
+
+    # ------------------------------------------------------------------
+    # Execucao
+    # ------------------------------------------------------------------
+
+    def step(self, cursor: FlowCursor, message: str,
+             responder: Callable[[str, Dict[str, Any]], str] = None) -> FlowTurn:
+        """
+        Processa uma mensagem do usuario e avanca o cursor ate o proximo
+        ponto de espera (ou fim do fluxo).
+
+        Args:
+            cursor: Estado da conversa (alterado no lugar)
+            message: Texto do usuario
+            responder: Para nodes ai_response sem template:
+                responder(mensagem, contexto) -> texto
+        """
+        ir = self.ir
+        turn = FlowTurn()
+        context = cursor.context
+        context["input"] = message
+        cursor.turn += 1
+        context["turn"] = cursor.turn
+
+        idx = ir.index.get(cursor.node) if cursor.node is not None else None
+        if idx is None or idx >= ir.node_count:
+            idx = ir.index.get(self.engine.find_start_node())
+        pending = True  # Mensagem ainda nao consumida por um node de entrada
+        cursor.node = None
+
+        node_count = ir.node_count
+        seen = set()
+        # idx >= node_count: conexao para um id que nao existe (fim do fluxo)
+        while idx is not None and idx < node_count:
+            op = self._ops.get(idx) or self._compile(idx)
+            if idx in seen and op.kind != "input":
+                turn.truncated = True
+                break
+            seen.add(idx)
+            turn.path.append(op.id)
+
+            if op.kind == "input":
+                if not pending:
+                    if op.prompt:
+                        self._emit(turn, self._render(op.template, context))
+                    cursor.node = op.id
+                    turn.waiting_on = op.id
+                    break
+                pending = False
+                if op.var:
+                    context[op.var] = message
+            elif op.kind == "output":
+                text = self._render(op.template, context)
+                if op.prompt and not text.strip() and responder is not None:
+                    text = responder(message, context)
+                self._emit(turn, text)
+            elif op.kind == "volta":
+                break
+            elif op.kind == "end":
+                turn.ended = True
+                context.clear()
+                break
+
+            for var, template in op.assignments:
+                context[var] = self._render(template, context)
+            idx = self._route(op, idx, message, context, turn)
+
+        return turn
+
+    def _route(self, op: _Op, idx: int, message: str, context: Dict[str, Any], turn: FlowTurn) -> Optional[int]:
+        """Proximo node a partir da porta escolhida para o node"""
+        ir = self.ir
+        port = None
+        if op.detects:
+            intent, score = self.engine.detect_intent(message, op.id)
+            context["intent"] = intent
+            context["intent_score"] = score
+            turn.intent = intent
+            port = op.intent_ports.get(intent)
+            if port is None:
+                port = self.engine._label_port(op.out_labels, intent)
+        elif len(op.out_labels) > 1:
+            value = context.get(op.route_var)
+            if value is not None:
+                port = self._value_port(op.out_labels, value)
+
+        if port is not None:
+            targets = ir.next_nodes(idx, port)
+            if targets:
+                return targets[0]
+        return ir.first_next(idx)
+
+    @staticmethod
+    def _value_port(out_labels: List[str], value: Any) -> Optional[str]:
+        """Porta pelo valor da variavel: label (sem caixa), numero ou 'out_N'"""
+        text = str(value).strip()
+        if text.startswith("out_"):
+            return text
+        if text.isdigit() and int(text) < len(out_labels):
+            return f"out_{int(text)}"
+        folded = text.casefold()
+        for i, label in enumerate(out_labels):
+            if isinstance(label, str) and label.casefold() == folded:
+                return f"out_{i}"
+        return None
+
+    @staticmethod
+    def _emit(turn: FlowTurn, text: str):
+        if text and text.strip():
+            turn.outputs.append(text)
+
+    def _render(self, parts: List[str], context: Dict[str, Any]) -> str:
+        if len(parts) == 1:
+            return parts[0]
+        out = []
+        for i, part in enumerate(parts):
+            if i % 2 == 0:
+                out.append(part)
+                continue
+            value = context.get(part)
+            if value is None:
+                value = self.globals.get(part)
+            out.append("{" + part + "}" if value is None else str(value))
+        return "".join(out)
+
+    # ------------------------------------------------------------------
+    # Compilacao dos nodes (sob demanda, uma vez por node)
+    # ------------------------------------------------------------------
+
+    def _compile(self, idx: int) -> _Op:
+        engine = self.engine
+        rec = self.ir.nodes[idx]
+        node = engine.nodes[rec.id]
+        ntype = rec.type if isinstance(rec.type, str) else ""
+
+        op = _Op()
+        op.id = rec.id
+        op.var = node.get("var")
+        op.route_var = node.get("var") or "route"
+        op.out_labels = rec.out_labels or []
+        op.template = _compile_template(rec.template or rec.msg)
+        op.prompt = False
+        if ntype == "volta":
+            op.kind = "volta"
+        elif ntype == "end":
+            op.kind = "end"
+        elif ntype.startswith(INPUT_TYPE_PREFIXES):
+            op.kind = "input"
+            op.prompt = ntype.startswith(PROMPT_TYPES)
+        elif ntype.startswith(OUTPUT_TYPE_PREFIXES):
+            op.kind = "output"
+            # ai_response sem template delega ao responder
+            op.prompt = ntype == "ai_response"
+        else:
+            op.kind = "pass"
+
+        intents = engine._intents_config(node)
+        op.detects = ntype == "nlp" or bool(intents)
+        op.intent_ports = {}
+        for pos, intent_cfg in enumerate(intents):
+            op.intent_ports.setdefault(intent_cfg.get("name"), intent_cfg.get("port") or f"out_{pos}")
+
+        assignments = node.get("set")
+        op.assignments = [
+            (var, _compile_template(value)) for var, value in assignments.items()
+        ] if isinstance(assignments, dict) else []
+
+        self._ops[idx] = op
+        return op
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"nodes": self.ir.node_count, "compiled_nodes": len(self._ops)}
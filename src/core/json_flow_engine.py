@@ -14,15 +14,32 @@ Funcionalidades:
   - Detectar intenções via keywords definidas nos cards NLP
   - Resolver templates de resposta dos cards send/ai_response
   - Navegar conexões com suporte a múltiplas saídas (out_0, out_1, ...)
+  - Validar o grafo do fluxo com diagnósticos estruturados (analyze)
+  - Executar o fluxo por conversa (get_runtime + FlowCursor)
 
 Versão: v0.4.11-rev1.2.5-280426
 Developer: @S.V.S - Try Technology
 """
 
+import json
 import re
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
+from .flow_analysis import FlowAnalyzer, FlowDiagnostic
+from .flow_ir import FlowIR
+from .flow_runtime import FlowRuntime
+from .keyword_automaton import KeywordAutomaton
+
+# Intenção -> label da saída do NLP (rota quando o nó não tem "intents")
+INTENT_LABELS = {
+    "greeting": "Saudação", "analyze_code": "Análise de Código",
+    "create_file": "Gerar Código", "explain": "Explicar",
+    "debug": "Debug/Erro", "run_code": "Executar Script",
+    "botforge": "BotForge", "config": "Configuração",
+    "general": "Pergunta Geral",
+}
+
 
 class FlowEngine:
     """
@@ -54,14 +71,54 @@ class FlowEngine:
         self.connections: List[Dict] = flow_conns or []
         self.model_data: Dict = model_data or {}
         self.context: Dict[str, Any] = {}  # Estado compartilhado entre nodes
+        self._analyzer: Optional[FlowAnalyzer] = None
+
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """
+        Compila o fluxo (FlowIR: ids inteiros, adjacência CSR, registros
+        com __slots__) e monta os índices derivados: nó de início, nó de
+        API e porta de cada intent do NLP. Trace, rotas e validação rodam
+        sobre o IR; rotas e templates são memorizados por intenção no uso.
+        """
+        self.ir = FlowIR.compile(self.nodes, self.connections)
+        ir = self.ir
 
-        # Cache de conexões indexado por source para performance
-        self._conn_index: Dict[str, List[Dict]] = {}
-        for conn in self.connections:
-            src = conn.get("source", "")
-            if src not in self._conn_index:
-                self._conn_index[src] = []
-            self._conn_index[src].append(conn)
+        # Nó de API: o primeiro (na ordem do JSON) entre api_connector/api_entry
+        api_nodes = [ir.type_index[t][0] for t in ("api_connector", "api_entry") if t in ir.type_index]
+        self._api_node_id: Optional[str] = ir.ids[min(api_nodes)] if api_nodes else None
+
+        self._start_node_id: Optional[str] = next(iter(self.nodes), None)
+        for ptype in ("api_connector", "api_entry", "recv"):
+            if ptype in ir.type_index:
+                self._start_node_id = ir.ids[ir.type_index[ptype][0]]
+                break
+
+        # intenção -> porta de saída do NLP (match direto via "intents";
+        # os nomes resolvidos por out_labels entram sob demanda)
+        self._intent_ports: Dict[str, Optional[str]] = {}
+        nlp_node = self.get_node_by_type("nlp")
+        if nlp_node:
+            for i, intent_cfg in enumerate(nlp_node.get("intents", [])):
+                self._intent_ports.setdefault(intent_cfg.get("name"), f"out_{i}")
+
+        self._main_route: Optional[List[Dict]] = None
+        self._routes: Dict[str, List[Dict]] = {}
+        self._templates: Dict[str, str] = {}
+
+        # Detecção de intenção compilada (automato + pesos) por nó NLP, montada no primeiro uso
+        self._intent_matchers: Dict[Optional[str], Tuple[KeywordAutomaton, List[Tuple[str, float, float]]]] = {}
+
+        # Interpretador (FlowRuntime) compilado sobre este IR, criado sob demanda
+        self._runtime = None
+
+    def invalidate(self):
+        """
+        Refaz os índices e descarta rotas, templates e o automato de
+        intenções (chamar após editar self.nodes ou self.connections).
+        """
+        self._build_indexes()
 
     # =========================================================
     # === NAVEGAÇÃO DO FLUXO ===
@@ -72,13 +129,7 @@ class FlowEngine:
         Encontra o primeiro nó do fluxo.
         Prioridade: api_connector > api_entry > recv > primeiro nó qualquer.
         """
-        priority_types = ["api_connector", "api_entry", "recv"]
-        for ptype in priority_types:
-            for nid, node in self.nodes.items():
-                if node.get("type") == ptype:
-                    return nid
-        # Fallback: retorna o primeiro nó
-        return next(iter(self.nodes), None)
+        return self._start_node_id
 
     def get_next_nodes(self, current_id: str, port: str = None) -> List[str]:
         """
@@ -91,25 +142,20 @@ class FlowEngine:
         Returns:
             Lista de IDs dos nós destino
         """
-        conns = self._conn_index.get(current_id, [])
-        targets = []
-        for conn in conns:
-            if port is None or conn.get("source_port") == port:
-                target = conn.get("target")
-                if target:
-                    targets.append(target)
-        return targets
+        idx = self.ir.index.get(current_id)
+        if idx is None:
+            return []
+        targets = self.ir.next_nodes(idx) if port is None else self.ir.next_nodes(idx, port)
+        return [self.ir.ids[t] for t in targets]
 
     def get_node_by_type(self, node_type: str) -> Optional[Dict]:
         """Retorna o primeiro nó de um tipo específico."""
-        for node in self.nodes.values():
-            if node.get("type") == node_type:
-                return node
-        return None
+        ids = self.ir.type_index.get(node_type)
+        return self.nodes[self.ir.ids[ids[0]]] if ids else None
 
     def get_nodes_by_type(self, node_type: str) -> List[Dict]:
         """Retorna todos os nós de um tipo específico."""
-        return [n for n in self.nodes.values() if n.get("type") == node_type]
+        return [self.nodes[self.ir.ids[idx]] for idx in self.ir.type_index.get(node_type, [])]
 
     # =========================================================
     # === TRACE DO FLUXO (VISUALIZAÇÃO) ===
@@ -129,31 +175,38 @@ class FlowEngine:
         Returns:
             Lista de dicts com node_id, type, label, msg, status
         """
+        return [dict(step) for step in self._trace_main()]
+
+    def _trace_main(self) -> List[Dict]:
+        """Rota principal (memorizada; os chamadores públicos recebem cópias)"""
+        if self._main_route is not None:
+            return self._main_route
+
+        ir = self.ir
         results = []
-        current_id = self.find_start_node()
+        current = ir.index.get(self.find_start_node())
         visited = set()
 
-        while current_id and current_id not in visited:
-            visited.add(current_id)
-            node = self.nodes.get(current_id)
-            if not node:
+        while current is not None and current not in visited:
+            visited.add(current)
+            rec = ir.node(current)
+            if rec is None:
                 break
 
-            result = {
-                "node_id": current_id,
-                "type": node.get("type", "unknown"),
-                "label": node.get("label", ""),
-                "msg": node.get("msg", node.get("message", "")),
-                "color": node.get("color", "#58a6ff"),
+            results.append({
+                "node_id": rec.id,
+                "type": rec.trace_type,
+                "label": rec.trace_label,
+                "msg": rec.msg,
+                "color": rec.color,
                 "status": "ok",
-                "out_labels": node.get("out_labels", []),
-            }
-            results.append(result)
+                "out_labels": rec.out_labels,
+            })
 
             # Próximo nó: primeira conexão disponível
-            next_nodes = self.get_next_nodes(current_id)
-            current_id = next_nodes[0] if next_nodes else None
+            current = ir.first_next(current)
 
+        self._main_route = results
         return results
 
     def trace_flow_for_intent(self, intent_name: str) -> List[Dict]:
@@ -168,57 +221,64 @@ class FlowEngine:
         Returns:
             Lista de nós percorridos na rota dessa intenção
         """
-        nlp_node = self.get_node_by_type("nlp")
-        if not nlp_node:
-            return self.trace_flow()
+        return [dict(step) for step in self._route_for_intent(intent_name)]
 
-        # Mapear intenção para porta de saída do NLP
-        out_labels = nlp_node.get("out_labels", [])
-        intent_port = None
+    def _intent_port(self, intent_name: str) -> Optional[str]:
+        """Porta de saída do NLP para a intenção (None = sem rota própria)"""
+        if intent_name in self._intent_ports:
+            return self._intent_ports[intent_name]
 
-        # Primeiro tentar match direto via intents config
-        intents_config = nlp_node.get("intents", [])
-        for i, intent_cfg in enumerate(intents_config):
-            if intent_cfg.get("name") == intent_name:
-                intent_port = f"out_{i}"
-                break
+        # Sem match direto via intents config: tentar match via out_labels
+        nlp_node = self.get_node_by_type("nlp")
+        out_labels = nlp_node.get("out_labels", []) if nlp_node else []
+        intent_port = self._label_port(out_labels, intent_name)
+        self._intent_ports[intent_name] = intent_port
+        return intent_port
+
+    @staticmethod
+    def _label_port(out_labels: List[str], intent_name: str) -> Optional[str]:
+        """Porta cujo label é o da intenção (INTENT_LABELS) ou contém o nome dela"""
+        target_label = INTENT_LABELS.get(intent_name, "")
+        for i, label in enumerate(out_labels):
+            if label == target_label or intent_name.lower() in label.lower():
+                return f"out_{i}"
+        return None
 
-        # Fallback: tentar match via out_labels
-        if not intent_port:
-            intent_label_map = {
-                "greeting": "Saudação", "analyze_code": "Análise de Código",
-                "create_file": "Gerar Código", "explain": "Explicar",
-                "debug": "Debug/Erro", "run_code": "Executar Script",
-                "botforge": "BotForge", "config": "Configuração",
-                "general": "Pergunta Geral",
-            }
-            target_label = intent_label_map.get(intent_name, "")
-            for i, label in enumerate(out_labels):
-                if label == target_label or intent_name.lower() in label.lower():
-                    intent_port = f"out_{i}"
-                    break
+    def _route_for_intent(self, intent_name: str) -> List[Dict]:
+        """Rota da intenção, calculada uma vez por nome"""
+        route = self._routes.get(intent_name)
+        if route is not None:
+            return route
 
+        nlp_node = self.get_node_by_type("nlp")
+        intent_port = self._intent_port(intent_name) if nlp_node else None
         if not intent_port:
-            return self.trace_flow()
-
-        # Percorrer: start → NLP → porta da intenção → até o fim
+            route = self._trace_main()
+        else:
+            route = self._trace_intent_route(nlp_node, intent_name, intent_port)
+        self._routes[intent_name] = route
+        return route
+
+    def _trace_intent_route(self, nlp_node: Dict, intent_name: str, intent_port: str) -> List[Dict]:
+        """Percorre: start → NLP → porta da intenção → até o fim"""
+        ir = self.ir
         results = []
-        start_id = self.find_start_node()
+        start = ir.index.get(self.find_start_node())
         nlp_id = nlp_node["id"]
+        nlp_idx = ir.index[nlp_id]
 
         # Adicionar nós antes do NLP
-        current = start_id
+        current = start
         visited = set()
-        while current and current != nlp_id and current not in visited:
+        while current is not None and current != nlp_idx and current not in visited:
             visited.add(current)
-            node = self.nodes.get(current)
-            if node:
+            rec = ir.node(current)
+            if rec is not None:
                 results.append({
-                    "node_id": current, "type": node.get("type"),
-                    "label": node.get("label"), "status": "ok"
+                    "node_id": rec.id, "type": rec.type,
+                    "label": rec.label, "status": "ok"
                 })
-            nexts = self.get_next_nodes(current)
-            current = nexts[0] if nexts else None
+            current = ir.first_next(current)
 
         # Adicionar NLP
         results.append({
@@ -228,21 +288,18 @@ class FlowEngine:
         })
 
         # Seguir pela porta da intenção
-        current = None
-        intent_targets = self.get_next_nodes(nlp_id, intent_port)
-        if intent_targets:
-            current = intent_targets[0]
+        intent_targets = ir.next_nodes(nlp_idx, intent_port)
+        current = intent_targets[0] if intent_targets else None
 
-        while current and current not in visited:
+        while current is not None and current not in visited:
             visited.add(current)
-            node = self.nodes.get(current)
-            if node:
+            rec = ir.node(current)
+            if rec is not None:
                 results.append({
-                    "node_id": current, "type": node.get("type"),
-                    "label": node.get("label"), "status": "ok"
+                    "node_id": rec.id, "type": rec.type,
+                    "label": rec.label, "status": "ok"
                 })
-            nexts = self.get_next_nodes(current)
-            current = nexts[0] if nexts else None
+            current = ir.first_next(current)
 
         return results
 
@@ -250,7 +307,7 @@ class FlowEngine:
     # === DETECÇÃO DE INTENÇÃO VIA KEYWORDS DO JSON ===
     # =========================================================
 
-    def detect_intent(self, user_input: str) -> Tuple[str, float]:
+    def detect_intent(self, user_input: str, nlp_id: str = None) -> Tuple[str, float]:
         """
         Detecta intenção do usuário usando keywords definidas nos cards NLP.
         
@@ -260,8 +317,13 @@ class FlowEngine:
         Esta é a parte "Motor + Config" — o motor (este loop) é genérico,
         as keywords (no JSON) são específicas de cada bot.
         
+        As keywords de todas as intents são compiladas uma vez num automato
+        Aho-Corasick: cada chamada percorre o input uma única vez, sem
+        depender de quantas keywords o fluxo tem.
+        
         Args:
             user_input: Texto do usuário
+            nlp_id: Nó cujas intents são usadas (padrão: o primeiro NLP)
         
         Returns:
             Tuple (nome_da_intencao, confianca 0.0-1.0)
@@ -270,72 +332,98 @@ class FlowEngine:
             return ("general", 0.0)
 
         txt = user_input.lower().strip()
-        nlp_node = self.get_node_by_type("nlp")
-        if not nlp_node:
-            return ("general", 0.0)
+        automaton, intents = self._get_intent_matcher(nlp_id)
 
-        intents_config = nlp_node.get("intents", [])
-        if not intents_config:
-            # Fallback Dinâmico: Construir intents a partir de out_keywords (Multi-Language Support)
-            out_keywords = nlp_node.get("out_keywords", [])
-            out_labels = nlp_node.get("out_labels", [])
-            
-            if not out_keywords:
-                return ("general", 0.0)
-                
-            import json
-            for i, kw_str in enumerate(out_keywords):
-                if not kw_str or not kw_str.strip():
-                    continue
-                    
-                name = out_labels[i] if i < len(out_labels) else f"route_{i}"
-                keywords = []
-                
-                # Tentar parsear como dicionário multilingue
-                try:
-                    kw_dict = json.loads(kw_str)
-                    if isinstance(kw_dict, dict):
-                        for lang_kws in kw_dict.values():
-                            if isinstance(lang_kws, str):
-                                keywords.extend([k.strip() for k in lang_kws.split(",") if k.strip()])
-                    else:
-                        keywords = [k.strip() for k in str(kw_dict).split(",") if k.strip()]
-                except:
-                    # String normal
-                    keywords = [k.strip() for k in str(kw_str).split(",") if k.strip()]
-                    
-                intents_config.append({
-                    "name": name,
-                    "keywords": keywords,
-                    "priority": 1
-                })
+        # Soma por intenção: keywords valem 1, palavras de contexto 0.5
+        kw_matches: Dict[int, int] = {}
+        weighted: Dict[int, float] = {}
+        for idx, weight in automaton.search(txt):
+            if weight == 1:
+                kw_matches[idx] = kw_matches.get(idx, 0) + 1
+            weighted[idx] = weighted.get(idx, 0) + weight
 
         best_intent = "general"
         best_score = 0.0
 
-        for intent_cfg in intents_config:
-            intent_name = intent_cfg.get("name", "")
-            keywords = intent_cfg.get("keywords", [])
-            context_words = intent_cfg.get("context_words", [])
-            priority = intent_cfg.get("priority", 1)
-
-            # Calcular score: quantas keywords batem
-            kw_matches = sum(1 for kw in keywords if kw.lower() in txt)
-            ctx_matches = sum(1 for cw in context_words if cw.lower() in txt)
-
-            if kw_matches == 0:
-                continue
-
+        # Ordem das intents no JSON: em empate, vence a primeira
+        for idx in sorted(kw_matches):
+            intent_name, total, priority = intents[idx]
             # Score = (keywords + contexto * 0.5) * prioridade / total de keywords
-            total = len(keywords) + len(context_words) * 0.5
-            score = ((kw_matches + ctx_matches * 0.5) / total) * priority if total > 0 else 0
-
+            score = (weighted[idx] / total) * priority
             if score > best_score:
                 best_score = score
                 best_intent = intent_name
 
         return (best_intent, min(best_score, 1.0))
 
+    def _get_intent_matcher(self, nlp_id: str = None) -> Tuple[KeywordAutomaton, List[Tuple[str, float, float]]]:
+        """Automato keyword -> (intenção, peso) e tabela (nome, total, prioridade) do nó"""
+        if nlp_id is None:
+            nlp_node = self.get_node_by_type("nlp")
+            nlp_id = nlp_node["id"] if nlp_node else None
+        matcher = self._intent_matchers.get(nlp_id)
+        if matcher is None:
+            automaton = KeywordAutomaton()
+            intents = []
+            nlp_node = self.nodes.get(nlp_id)
+            for idx, intent_cfg in enumerate(self._intents_config(nlp_node) if nlp_node else []):
+                keywords = intent_cfg.get("keywords", [])
+                context_words = intent_cfg.get("context_words", [])
+                for kw in keywords:
+                    automaton.add(kw.lower(), (idx, 1))
+                for cw in context_words:
+                    automaton.add(cw.lower(), (idx, 0.5))
+                intents.append((
+                    intent_cfg.get("name", ""),
+                    len(keywords) + len(context_words) * 0.5,
+                    intent_cfg.get("priority", 1)
+                ))
+            automaton.build()
+            matcher = self._intent_matchers[nlp_id] = (automaton, intents)
+        return matcher
+
+    @staticmethod
+    def _intents_config(nlp_node: Dict) -> List[Dict]:
+        """
+        Intents do nó NLP. Sem o campo "intents", monta a lista a partir de
+        out_keywords/out_labels (sem gravar nada de volta no nó).
+        """
+        intents_config = nlp_node.get("intents", [])
+        if intents_config:
+            return intents_config
+
+        # Fallback Dinâmico: Construir intents a partir de out_keywords (Multi-Language Support)
+        out_keywords = nlp_node.get("out_keywords", [])
+        out_labels = nlp_node.get("out_labels", [])
+        intents_config = []
+        for i, kw_str in enumerate(out_keywords):
+            if not kw_str or not kw_str.strip():
+                continue
+
+            name = out_labels[i] if i < len(out_labels) else f"route_{i}"
+            keywords = []
+
+            # Tentar parsear como dicionário multilingue
+            try:
+                kw_dict = json.loads(kw_str)
+                if isinstance(kw_dict, dict):
+                    for lang_kws in kw_dict.values():
+                        if isinstance(lang_kws, str):
+                            keywords.extend([k.strip() for k in lang_kws.split(",") if k.strip()])
+                else:
+                    keywords = [k.strip() for k in str(kw_dict).split(",") if k.strip()]
+            except:
+                # String normal
+                keywords = [k.strip() for k in str(kw_str).split(",") if k.strip()]
+
+            intents_config.append({
+                "name": name,
+                "keywords": keywords,
+                "priority": 1,
+                "port": f"out_{i}"
+            })
+        return intents_config
+
     # =========================================================
     # === CONFIGURAÇÃO DE API (api_connector) ===
     # =========================================================
@@ -352,10 +440,9 @@ class FlowEngine:
         Returns:
             Dict de configuração do API connector, ou {} se não existir.
         """
-        for node in self.nodes.values():
-            if node.get("type") in ("api_connector", "api_entry"):
-                return node.get("api_config", {})
-        return {}
+        if self._api_node_id is None:
+            return {}
+        return self.nodes[self._api_node_id].get("api_config", {})
 
     def get_chat_settings(self) -> Dict:
         """Atalho para get_api_config()['chat_settings']."""
@@ -404,15 +491,21 @@ class FlowEngine:
         
         Returns:
             String de template com variáveis {var}, ou "" se não encontrado.
+        
+        A rota é percorrida só na primeira vez; depois é uma consulta ao
+        dicionário de templates (refeito por invalidate()).
         """
+        if intent_name in self._templates:
+            return self._templates[intent_name]
+
         # Percorrer a rota da intenção e pegar a msg do nó send/ai_response
-        trace = self.trace_flow_for_intent(intent_name)
-        for step in trace:
+        template = ""
+        for step in self._route_for_intent(intent_name):
             if step.get("type") in ("send", "ai_response"):
-                node = self.nodes.get(step["node_id"], {})
-                template = node.get("response_template", node.get("msg", ""))
-                return template
-        return ""
+                template = self.ir.nodes[self.ir.index[step["node_id"]]].template
+                break
+        self._templates[intent_name] = template
+        return template
 
     # =========================================================
     # === SELF-AWARENESS (DADOS DO MODELO) ===
@@ -482,56 +575,49 @@ class FlowEngine:
         Usado pelo BotForge canvas para mostrar estatísticas.
         """
         type_counts = {}
-        for node in self.nodes.values():
-            ntype = node.get("type", "unknown")
-            type_counts[ntype] = type_counts.get(ntype, 0) + 1
+        for ntype, ids in self.ir.type_index.items():
+            key = "unknown" if ntype is None else ntype
+            type_counts[key] = type_counts.get(key, 0) + len(ids)
 
         return {
             "total_nodes": len(self.nodes),
             "total_connections": len(self.connections),
             "node_types": type_counts,
-            "has_api_connector": any(
-                n.get("type") in ("api_connector", "api_entry")
-                for n in self.nodes.values()
-            ),
-            "has_nlp": any(n.get("type") == "nlp" for n in self.nodes.values()),
+            "has_api_connector": self._api_node_id is not None,
+            "has_nlp": "nlp" in self.ir.type_index,
             "start_node": self.find_start_node(),
         }
 
     def validate_flow(self) -> List[str]:
         """
         Valida a integridade do fluxo e retorna lista de warnings.
-        Útil para QA e debugging.
-        """
-        warnings = []
-
-        # Check: tem nó de início?
-        start = self.find_start_node()
-        if not start:
-            warnings.append("⚠️ Nenhum nó de início encontrado (recv/api_entry)")
-
-        # Check: nós desconectados (sem entrada nem saída)
-        connected = set()
-        for conn in self.connections:
-            connected.add(conn.get("source"))
-            connected.add(conn.get("target"))
-        for nid in self.nodes:
-            if nid not in connected and nid != start:
-                warnings.append(f"⚠️ Nó '{nid}' ({self.nodes[nid].get('label')}) está desconectado")
-
-        # Check: conexões referenciando nós inexistentes
-        for conn in self.connections:
-            if conn.get("source") not in self.nodes:
-                warnings.append(f"⚠️ Conexão referencia nó source '{conn.get('source')}' inexistente")
-            if conn.get("target") not in self.nodes:
-                warnings.append(f"⚠️ Conexão referencia nó target '{conn.get('target')}' inexistente")
-
-        # Check: NLP sem intents configuradas
-        nlp_node = self.get_node_by_type("nlp")
-        if nlp_node and not nlp_node.get("intents"):
-            warnings.append("ℹ️ Nó NLP não tem 'intents' configuradas — detecção via JSON desabilitada")
+        Útil para QA e debugging. Versão em texto de analyze().
+        """
+        return [str(diagnostic) for diagnostic in self.analyze()]
 
-        return warnings
+    def analyze(self) -> List[FlowDiagnostic]:
+        """
+        Análise completa do fluxo em tempo linear, com diagnósticos
+        estruturados (código, severidade, nó, porta): início ausente, nós
+        desconectados ou inalcançáveis, referências pendentes, ciclos,
+        portas out_N sem uso, intenções sem rota e keywords sombreadas.
+        
+        O analisador é mantido entre chamadas: após invalidate(), só os
+        NLPs com intents alteradas têm as keywords reanalisadas.
+        """
+        if self._analyzer is None:
+            self._analyzer = FlowAnalyzer()
+        return self._analyzer.analyze(self)
+
+    def get_runtime(self) -> FlowRuntime:
+        """
+        Interpretador do fluxo (FlowRuntime). É compartilhado por todas as
+        conversas — o estado de cada uma fica no seu FlowCursor — e é
+        refeito por invalidate().
+        """
+        if self._runtime is None:
+            self._runtime = FlowRuntime(self)
+        return self._runtime
 
     def __repr__(self) -> str:
         summary = self.get_flow_summary()
@@ -0,0 +1,108 @@
+"""
+Keyword Automaton - Busca de muitas keywords em uma unica passada (Aho-Corasick)
+Compilado uma vez; cada consulta percorre o texto uma vez, em
+O(len(texto) + keywords encontradas), independente de quantas keywords existem.
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Set
+
+
+class KeywordAutomaton:
+    """
+    Automato Aho-Corasick sobre keywords literais (casamento por substring,
+    igual a `keyword in texto`).
+
+    - `add(keyword, valor)`: registra a keyword; a mesma keyword pode ter
+      varios valores (e o mesmo valor pode ser adicionado mais de uma vez).
+    - `build()`: monta os links de falha; chamado sozinho na primeira busca.
+    - `search(texto)`: valores de todas as keywords DISTINTAS presentes no
+      texto (cada keyword conta uma vez, mesmo com varias ocorrencias).
+    - Keyword vazia casa com qualquer texto (como `"" in texto`).
+    """
+
+    def __init__(self, keywords: Iterable = ()):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.values: List[List[Any]] = [[]]
+        # Estado com saida mais proximo na cadeia de falhas (-1 = nenhum)
+        self.output_link: List[int] = [-1]
+        self.keyword_count = 0
+        self.built = False
+        for keyword, value in keywords:
+            self.add(keyword, value)
+
+    def add(self, keyword: str, value: Any):
+        state = 0
+        for ch in keyword:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.values.append([])
+                self.output_link.append(-1)
+            state = nxt
+        if not self.values[state]:
+            self.keyword_count += 1
+        self.values[state].append(value)
+        self.built = False
+
+    def build(self):
+        """Calcula links de falha e de saida por BFS (nivel a nivel)"""
+        queue = deque()
+        for state in self.goto[0].values():
+            self.fail[state] = 0
+            self.output_link[state] = -1
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target
+                self.output_link[nxt] = target if self.values[target] and target else self.output_link[target]
+        self.built = True
+
+    def matched_states(self, text: str) -> Set[int]:
+        """Estados finais (uma keyword cada) encontrados no texto"""
+        if not self.built:
+            self.build()
+        goto, fail, values, output_link = self.goto, self.fail, self.values, self.output_link
+        found: Set[int] = set()
+        if values[0]:
+            found.add(0)
+        visited: Set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if state in visited:
+                continue
+            # Primeira visita ao estado: emite ele e a cadeia de saidas
+            # (ate o primeiro estado ja emitido, cuja cadeia ja foi percorrida)
+            visited.add(state)
+            out = state if values[state] else output_link[state]
+            while out > 0 and out not in found:
+                found.add(out)
+                out = output_link[out]
+        return found
+
+    def search(self, text: str) -> List[Any]:
+        """Valores das keywords presentes no texto"""
+        values = self.values
+        result: List[Any] = []
+        for state in self.matched_states(text):
+            result.extend(values[state])
+        return result
+
+    def __len__(self) -> int:
+        return self.keyword_count
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"keywords": self.keyword_count, "states": len(self.goto)}
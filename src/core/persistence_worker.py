@@ -0,0 +1,157 @@
+"""
+Persistence Worker - Gravacoes em disco fora da thread da interface
+Fila de tarefas por chave com janela de debounce: varias gravacoes da mesma
+chave em sequencia viram uma so (vale a ultima). `flush()` executa tudo o
+que estiver pendente e espera terminar (usado ao fechar o app).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .provider_stats import LatencyWindow
+
+
+class _Job:
+    """Gravacao pendente de uma chave"""
+
+    __slots__ = ("fn", "first_at", "due")
+
+    def __init__(self, fn: Callable[[], Any], first_at: float, due: float):
+        self.fn = fn
+        self.first_at = first_at
+        self.due = due
+
+
+class PersistenceWorker:
+    """
+    Thread unica de persistencia.
+
+    - `submit(chave, fn)`: agenda `fn` para daqui a `debounce_seconds`;
+      se a chave ja estiver na fila, substitui a funcao e adia o prazo,
+      sem passar de `max_delay_seconds` desde o primeiro pedido (rajadas
+      continuas ainda gravam periodicamente).
+    - Tarefas rodam uma por vez, na ordem do prazo; erros sao contados e
+      impressos, sem derrubar a thread.
+    """
+
+    def __init__(self, debounce_seconds: float = 0.5, max_delay_seconds: float = 2.0, name: str = "persistence"):
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max(debounce_seconds, max_delay_seconds)
+        self.name = name
+
+        self.cond = threading.Condition()
+        self.pending: "OrderedDict[str, _Job]" = OrderedDict()
+        self.running: Optional[str] = None
+        self.closed = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.latency = LatencyWindow(size=200)
+        self.stats = {"submitted": 0, "coalesced": 0, "writes": 0, "errors": 0, "max_queue_depth": 0}
+
+    def submit(self, key: str, fn: Callable[[], Any], delay: float = None):
+        """Agenda (ou reagenda) a gravacao da chave `key`"""
+        now = time.monotonic()
+        delay = self.debounce_seconds if delay is None else delay
+        with self.cond:
+            if self.closed:
+                raise RuntimeError(f"{self.name}: worker encerrado")
+            self.stats["submitted"] += 1
+            job = self.pending.get(key)
+            if job is None:
+                self.pending[key] = _Job(fn, now, now + delay)
+            else:
+                self.stats["coalesced"] += 1
+                job.fn = fn
+                job.due = min(max(job.due, now + delay), job.first_at + self.max_delay_seconds)
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self.pending))
+            self._ensure_thread()
+            self.cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Antecipa tudo o que esta na fila e espera; False se estourar `timeout`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            now = time.monotonic()
+            for job in self.pending.values():
+                job.due = now
+            self.cond.notify_all()
+            while self.pending or self.running is not None:
+                if self._thread is None or not self._thread.is_alive():
+                    # Sem thread (ou ja encerrada): grava na propria chamada
+                    self._run_due_locked(now=float("inf"))
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            return True
+
+    def close(self, timeout: float = None) -> bool:
+        """Grava o que estiver pendente e encerra a thread"""
+        done = self.flush(timeout)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        return done
+
+    # ------------------------------------------------------------------
+    # Thread
+    # ------------------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            # Daemon: nunca segura o processo; o fechamento chama flush()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        with self.cond:
+            while not self.closed:
+                if not self.pending:
+                    self.cond.wait()
+                    continue
+                now = time.monotonic()
+                due = min(job.due for job in self.pending.values())
+                if due > now:
+                    self.cond.wait(due - now)
+                    continue
+                self._run_due_locked(now)
+
+    def _run_due_locked(self, now: float):
+        """Executa (fora do lock) a tarefa vencida mais antiga"""
+        key = min(self.pending, key=lambda k: self.pending[k].due)
+        job = self.pending[key]
+        if job.due > now:
+            return
+        del self.pending[key]
+        self.running = key
+        self.cond.release()
+        started = time.perf_counter()
+        ok = True
+        try:
+            job.fn()
+        except Exception as e:
+            ok = False
+            print(f"Erro na gravacao em background ({key}): {e}")
+        finally:
+            elapsed = time.perf_counter() - started
+            self.cond.acquire()
+            self.running = None
+            self.latency.add(elapsed)
+            self.stats["writes"] += 1
+            if not ok:
+                self.stats["errors"] += 1
+            self.cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.cond:
+            stats = dict(self.stats)
+            stats["queue_depth"] = len(self.pending)
+            stats["in_progress"] = self.running
+        stats["write_latency"] = self.latency.summary()
+        return stats
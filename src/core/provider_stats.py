@@ -0,0 +1,298 @@
+"""
+Provider Stats - Metricas de latencia e saude por provider
+Janela deslizante de amostras para percentis (p50/p95/p99) e circuit
+breakers persistidos entre execucoes.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+class LatencyWindow:
+    """Janela deslizante de latencias (em segundos) com calculo de percentil"""
+
+    def __init__(self, size: int = 200, samples: Iterable[float] = ()):
+        self.samples = deque(samples, maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentil `p` (0-100) pelo metodo nearest-rank; None sem amostras"""
+        with self.lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        rank = max(1, math.ceil(p / 100.0 * len(ordered)))
+        return ordered[min(rank, len(ordered)) - 1]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "samples": len(self),
+            "p50_ms": self._ms(self.percentile(50)),
+            "p95_ms": self._ms(self.percentile(95)),
+            "p99_ms": self._ms(self.percentile(99))
+        }
+
+    @staticmethod
+    def _ms(seconds: Optional[float]) -> Optional[float]:
+        return round(seconds * 1000, 1) if seconds is not None else None
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+# Limites superiores (ms) dos buckets do histograma de latencia
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de um provider (closed -> open -> half_open -> closed).
+
+    Abre quando, na janela de resultados recentes, a taxa de erro ou o p95
+    de latencia passam dos limites. Depois de `open_seconds` deixa passar
+    `half_open_max_calls` chamadas de teste: sucesso fecha, falha reabre com
+    o tempo de espera dobrado (ate `max_open_seconds`).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 50,
+        min_requests: int = 10,
+        error_rate_threshold: float = 0.5,
+        latency_p95_threshold_ms: float = 0,
+        open_seconds: float = 30.0,
+        max_open_seconds: float = 600.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.min_requests = min_requests
+        self.error_rate_threshold = error_rate_threshold
+        self.latency_p95_threshold_ms = latency_p95_threshold_ms
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.outcomes = deque(maxlen=window)
+        self.latency = LatencyWindow(size=window * 4)
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_seconds = open_seconds
+        self.half_open_calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """True se a chamada pode seguir (reserva um slot de teste em half_open)"""
+        with self.lock:
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self.half_open_calls = 0
+            if self.state == HALF_OPEN:
+                if self.half_open_calls >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self.half_open_calls += 1
+            return True
+
+    def release(self):
+        """Devolve o slot de teste reservado por allow_request sem registrar resultado
+        (chamada abandonada ou cancelada antes de ter sucesso ou falha)"""
+        with self.lock:
+            if self.state == HALF_OPEN and self.half_open_calls > 0:
+                self.half_open_calls -= 1
+
+    def is_open(self) -> bool:
+        """Consulta sem efeitos colaterais (open e ainda dentro do cooldown)"""
+        with self.lock:
+            return self.state == OPEN and time.time() - self.opened_at < self.open_seconds
+
+    def record_success(self, seconds: float):
+        with self.lock:
+            self.successes += 1
+            self._observe(True, seconds)
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.open_seconds = self.base_open_seconds
+                self.outcomes.clear()
+            elif self._should_open():
+                self._open()
+
+    def record_failure(self, seconds: float = None):
+        with self.lock:
+            self.failures += 1
+            self._observe(False, seconds)
+            if self.state == HALF_OPEN:
+                self.open_seconds = min(self.max_open_seconds, self.open_seconds * 2)
+                self._open()
+            elif self._should_open():
+                self._open()
+
+    def _observe(self, ok: bool, seconds: Optional[float]):
+        self.outcomes.append(ok)
+        if seconds is None:
+            return
+        self.latency.add(seconds)
+        ms = seconds * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def _should_open(self) -> bool:
+        if self.state != CLOSED or len(self.outcomes) < self.min_requests:
+            return False
+        if self.error_rate() >= self.error_rate_threshold:
+            return True
+        if self.latency_p95_threshold_ms:
+            p95 = self.latency.percentile(95)
+            return p95 is not None and p95 * 1000 >= self.latency_p95_threshold_ms
+        return False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        self.half_open_calls = 0
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def summary(self) -> Dict:
+        with self.lock:
+            labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+            return {
+                "state": self.state,
+                "error_rate": round(self.error_rate(), 3),
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "open_seconds": self.open_seconds,
+                "latency": self.latency.summary(),
+                "histogram": dict(zip(labels, self.histogram))
+            }
+
+    def to_dict(self) -> Dict:
+        with self.lock:
+            return {
+                "state": self.state,
+                "opened_at": self.opened_at,
+                "open_seconds": self.open_seconds,
+                "outcomes": [1 if ok else 0 for ok in self.outcomes],
+                "latency": list(self.latency.samples),
+                "histogram": list(self.histogram),
+                "successes": self.successes,
+                "failures": self.failures
+            }
+
+    def load_dict(self, data: Dict):
+        with self.lock:
+            self.state = data.get("state", CLOSED)
+            if self.state == HALF_OPEN:
+                # Slots de teste nao sobrevivem ao restart: volta a open
+                self.state = OPEN
+            self.opened_at = data.get("opened_at", 0.0)
+            self.open_seconds = data.get("open_seconds", self.base_open_seconds)
+            self.outcomes.extend(bool(v) for v in data.get("outcomes", []))
+            for sample in data.get("latency", []):
+                self.latency.add(sample)
+            histogram = data.get("histogram", [])
+            if len(histogram) == len(self.histogram):
+                self.histogram = list(histogram)
+            self.successes = data.get("successes", 0)
+            self.failures = data.get("failures", 0)
+
+
+class ProviderHealth:
+    """Breakers de todos os providers, persistidos em JSON entre execucoes"""
+
+    def __init__(self, state_file: str = None, save_every: int = 20, **breaker_config):
+        self.state_file = Path(state_file) if state_file else None
+        self.save_every = save_every
+        self.breaker_config = breaker_config
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+        self._dirty = 0
+        self._saved: Dict[str, Dict] = {}
+        self._load()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self.lock:
+            breaker = self.breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **self.breaker_config)
+                if name in self._saved:
+                    breaker.load_dict(self._saved.pop(name))
+                self.breakers[name] = breaker
+            return breaker
+
+    def allow(self, name: str) -> bool:
+        return self.get(name).allow_request()
+
+    def release(self, name: str):
+        self.get(name).release()
+
+    def record(self, name: str, ok: bool, seconds: float = None):
+        breaker = self.get(name)
+        before = breaker.state
+        if ok:
+            breaker.record_success(seconds)
+        else:
+            breaker.record_failure(seconds)
+        with self.lock:
+            self._dirty += 1
+            flush = breaker.state != before or self._dirty >= self.save_every
+        if flush:
+            self.save()
+
+    def summary(self) -> Dict[str, Dict]:
+        with self.lock:
+            breakers = dict(self.breakers)
+        return {name: breaker.summary() for name, breaker in breakers.items()}
+
+    def save(self):
+        """Grava o estado de forma atomica (tmp + rename)"""
+        if not self.state_file:
+            return
+        with self.lock:
+            data = {name: b.to_dict() for name, b in self.breakers.items()}
+            data.update({k: v for k, v in self._saved.items() if k not in data})
+            self._dirty = 0
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            print(f"Erro ao salvar saude dos providers: {e}")
+
+    def _load(self):
+        if not self.state_file or not self.state_file.exists():
+            return
+        try:
+            self._saved = json.loads(self.state_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._saved = {}
@@ -11,6 +11,10 @@ from typing import Optional, Dict, Any
 from dataclasses import dataclass, asdict
 import threading
 
+from .segment_store import SegmentStore
+from .cache_policies import EvictionPolicy, get_eviction_policy
+from .semantic_cache import SemanticIndex
+
 @dataclass
 class CacheEntry:
     prompt_hash: str
@@ -22,60 +26,112 @@ class CacheEntry:
     hit_count: int = 0
 
 class ResponseCache:
-    """Cache de respostas de IA com TTL"""
+    """
+    Cache de respostas de IA com TTL (persistido em segmentos append-only).
+
+    A evicao e delegada a uma EvictionPolicy O(1) ("lru", "lfu", "tinylfu")
+    e respeita tanto `max_entries` quanto o orcamento `max_bytes`
+    (tamanho serializado das entradas; 0 = sem limite).
+
+    Com `semantic_threshold` > 0, um segundo nivel (SemanticIndex) encontra
+    prompts quase identicos via `get_similar()`.
+    """
 
     def __init__(
         self,
         cache_dir: str = ".cache/ai_responses",
         ttl_hours: int = 24,
-        max_entries: int = 1000
+        max_entries: int = 1000,
+        max_segment_mb: int = 16,
+        max_bytes: int = 0,
+        eviction_policy: str = "lru",
+        semantic_threshold: float = 0.0
     ):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.ttl_seconds = ttl_hours * 3600
         self.max_entries = max_entries
+        self.max_bytes = max_bytes
         self.memory_cache: Dict[str, CacheEntry] = {}
         self.lock = threading.Lock()
+        self.policy: EvictionPolicy = get_eviction_policy(eviction_policy)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+        self.semantic_hits = 0
+        self.store = SegmentStore(
+            str(self.cache_dir),
+            max_segment_bytes=max_segment_mb * 1024 * 1024
+        )
+        self.semantic: Optional[SemanticIndex] = None
+        if semantic_threshold > 0:
+            self.semantic = SemanticIndex(
+                str(self.cache_dir / "semantic"),
+                threshold=semantic_threshold
+            )
         self._load_cache()
 
-    def _get_hash(self, text: str) -> str:
+    @staticmethod
+    def _get_hash(text: str) -> str:
         """Gera hash do texto"""
         return hashlib.sha256(text.encode()).hexdigest()[:16]
 
+    @staticmethod
+    def make_key(prompt: str, context: str, model: str) -> str:
+        """Gera chave unica (tambem usada para coalescer requisicoes em voo)"""
+        combined = f"{model}:{prompt}:{context}"
+        return ResponseCache._get_hash(combined)
+
     def _get_cache_key(self, prompt: str, context: str, model: str) -> str:
         """Gera chave unica"""
-        combined = f"{model}:{prompt}:{context}"
-        return self._get_hash(combined)
+        return self.make_key(prompt, context, model)
 
     def get(self, prompt: str, context: str = "", model: str = "default") -> Optional[str]:
         """Busca resposta no cache"""
         key = self._get_cache_key(prompt, context, model)
 
         with self.lock:
-            if key in self.memory_cache:
-                entry = self.memory_cache[key]
-                if time.time() - entry.timestamp < self.ttl_seconds:
-                    entry.hit_count += 1
-                    return entry.response
-                else:
-                    del self.memory_cache[key]
-                    self._delete_file(key)
-                    return None
-
-            cache_file = self.cache_dir / f"{key}.json"
-            if cache_file.exists():
-                try:
-                    data = json.loads(cache_file.read_text())
-                    entry = CacheEntry(**data)
-                    if time.time() - entry.timestamp < self.ttl_seconds:
-                        entry.hit_count += 1
-                        self.memory_cache[key] = entry
-                        return entry.response
-                    else:
-                        cache_file.unlink()
-                except:
-                    pass
-        return None
+            return self._lookup(key)
+
+    def get_similar(self, prompt: str, context: str = "", model: str = "default") -> Optional[str]:
+        """Busca resposta de um prompt quase identico (mesmo modelo e contexto)"""
+        if self.semantic is None:
+            return None
+
+        match = self.semantic.lookup(prompt, model, self._get_hash(context))
+        if match is None:
+            return None
+
+        with self.lock:
+            response = self._lookup(match[0])
+            if response is not None:
+                self.semantic_hits += 1
+            return response
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Busca uma chave na memoria e nos segmentos (chamar com lock)"""
+        if key in self.memory_cache:
+            entry = self.memory_cache[key]
+            if time.time() - entry.timestamp < self.ttl_seconds:
+                return self._record_hit(key, entry)
+            else:
+                self._remove(key)
+                return self._record_miss(key)
+
+        meta = self.store.get_meta(key)
+        if meta is None:
+            return self._record_miss(key)
+        if time.time() - meta.get("ts", 0) >= self.ttl_seconds:
+            self._remove(key)
+            return self._record_miss(key)
+
+        entry = self._read_entry(key)
+        if entry is None:
+            return self._record_miss(key)
+        self.memory_cache[key] = entry
+        return self._record_hit(key, entry)
 
     def set(
         self,
@@ -98,68 +154,176 @@ class ResponseCache:
             hit_count=0
         )
 
+        payload = json.dumps(asdict(entry)).encode("utf-8")
+
         with self.lock:
-            if len(self.memory_cache) >= self.max_entries:
-                self._evict_oldest()
+            if key in self.store:
+                # Atualizacao: o payload novo pode ser maior que o antigo
+                self._remove(key)
+            if not self._make_room(key, len(payload)):
+                self.rejections += 1
+                return
 
             self.memory_cache[key] = entry
-            cache_file = self.cache_dir / f"{key}.json"
-            cache_file.write_text(json.dumps(asdict(entry)))
+            self._write_entry(key, entry, payload)
+            self.policy.insert(key)
+            self.total_bytes += len(payload)
+
+        if self.semantic is not None:
+            self.semantic.add(key, prompt, model, entry.context_hash)
 
     def invalidate(self, prompt: str = None, model: str = None):
         """Invalida entradas do cache"""
         with self.lock:
             if prompt is None and model is None:
                 self.memory_cache.clear()
-                for f in self.cache_dir.glob("*.json"):
-                    f.unlink()
+                self.store.clear()
+                self.policy = get_eviction_policy(self.policy.name)
+                self.total_bytes = 0
+                if self.semantic is not None:
+                    self.semantic.clear()
             else:
+                prompt_hash = self._get_hash(prompt) if prompt else None
                 to_remove = []
-                for key, entry in self.memory_cache.items():
-                    if prompt and self._get_hash(prompt) == entry.prompt_hash:
+                for key, meta in self.store.items_meta():
+                    if prompt_hash and meta.get("ph") == prompt_hash:
                         to_remove.append(key)
-                    elif model and entry.model == model:
+                    elif model and meta.get("m") == model:
                         to_remove.append(key)
 
                 for key in to_remove:
-                    del self.memory_cache[key]
-                    self._delete_file(key)
+                    self._remove(key)
 
     def get_stats(self) -> Dict[str, Any]:
         """Retorna estatisticas do cache"""
         total_hits = sum(e.hit_count for e in self.memory_cache.values())
         total_tokens_saved = sum(e.tokens_saved * e.hit_count for e in self.memory_cache.values())
 
+        lookups = self.hits + self.misses
+
         return {
-            "entries": len(self.memory_cache),
+            "entries": len(self.store),
+            "memory_entries": len(self.memory_cache),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "policy": self.policy.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+            "semantic_entries": len(self.semantic) if self.semantic is not None else 0,
+            "semantic_hits": self.semantic_hits,
             "total_hits": total_hits,
             "tokens_saved": total_tokens_saved,
-            "estimated_savings_usd": total_tokens_saved * 0.00003
+            "estimated_savings_usd": total_tokens_saved * 0.00003,
+            "storage": self.store.get_stats()
         }
 
+    def flush(self):
+        """Persiste o indice dos segmentos"""
+        with self.lock:
+            self.store.flush()
+            if self.semantic is not None:
+                self.semantic.flush()
+
+    def close(self):
+        """Fecha os arquivos de segmento"""
+        with self.lock:
+            self.store.close()
+            if self.semantic is not None:
+                self.semantic.close()
+
     def _load_cache(self):
-        """Carrega cache do disco"""
-        for cache_file in self.cache_dir.glob("*.json"):
+        """Carrega indice do disco (sem ler os corpos das respostas)"""
+        self._migrate_legacy_files()
+
+        now = time.time()
+        live = []
+        for key, meta in self.store.items_meta():
+            if now - meta.get("ts", 0) >= self.ttl_seconds:
+                self.store.delete(key)
+            else:
+                live.append((meta.get("ts", 0), key))
+
+        # Ordem de insercao = ordem temporal, para LRU/LFU comecarem coerentes
+        for _, key in sorted(live):
+            self.policy.insert(key)
+            self.total_bytes += self.store.value_size(key)
+
+        if self.semantic is not None:
+            for key in self.semantic.store.keys():
+                if key not in self.store:
+                    self.semantic.remove(key)
+
+    def _migrate_legacy_files(self):
+        """Importa o formato antigo ({key}.json por entrada) para os segmentos"""
+        legacy = [f for f in self.cache_dir.glob("*.json") if f.name != "index.json"]
+        if not legacy:
+            return
+        for cache_file in legacy:
             try:
                 data = json.loads(cache_file.read_text())
                 entry = CacheEntry(**data)
                 if time.time() - entry.timestamp < self.ttl_seconds:
-                    self.memory_cache[cache_file.stem] = entry
-                else:
-                    cache_file.unlink()
+                    self._write_entry(cache_file.stem, entry)
             except:
-                continue
+                pass
+            cache_file.unlink(missing_ok=True)
+        self.store.flush()
 
-    def _evict_oldest(self):
-        """Remove entrada mais antiga"""
-        if not self.memory_cache:
-            return
-        oldest_key = min(self.memory_cache.keys(), key=lambda k: self.memory_cache[k].timestamp)
-        del self.memory_cache[oldest_key]
-        self._delete_file(oldest_key)
-
-    def _delete_file(self, key: str):
-        """Remove arquivo de cache"""
-        cache_file = self.cache_dir / f"{key}.json"
-        if cache_file.exists():
-            cache_file.unlink()
+    def _read_entry(self, key: str) -> Optional[CacheEntry]:
+        """Le uma entrada dos segmentos"""
+        raw = self.store.get(key)
+        if raw is None:
+            return None
+        try:
+            return CacheEntry(**json.loads(raw.decode("utf-8")))
+        except:
+            self._remove(key)
+            return None
+
+    def _write_entry(self, key: str, entry: CacheEntry, payload: bytes = None):
+        """Anexa uma entrada ao segmento ativo"""
+        meta = {"ts": entry.timestamp, "ph": entry.prompt_hash, "m": entry.model}
+        if payload is None:
+            payload = json.dumps(asdict(entry)).encode("utf-8")
+        self.store.put(key, payload, meta)
+
+    def _record_hit(self, key: str, entry: CacheEntry) -> str:
+        entry.hit_count += 1
+        self.hits += 1
+        self.policy.touch(key)
+        return entry.response
+
+    def _record_miss(self, key: str) -> None:
+        self.misses += 1
+        self.policy.record_miss(key)
+        return None
+
+    def _make_room(self, key: str, size: int) -> bool:
+        """Evita vitimas da politica ate caber a nova entrada; False se nao admitida"""
+        if self.max_bytes and size > self.max_bytes:
+            return False
+
+        while len(self.policy) and (
+            len(self.policy) >= self.max_entries
+            or (self.max_bytes and self.total_bytes + size > self.max_bytes)
+        ):
+            victim = self.policy.victim()
+            if victim is None:
+                break
+            if not self.policy.admit(key, victim):
+                return False
+            self._remove(victim)
+            self.evictions += 1
+        return True
+
+    def _remove(self, key: str):
+        """Remove uma chave da memoria, da politica e dos segmentos"""
+        self.memory_cache.pop(key, None)
+        self.policy.remove(key)
+        self.total_bytes -= self.store.value_size(key)
+        self.store.delete(key)
+        if self.semantic is not None:
+            self.semantic.remove(key)
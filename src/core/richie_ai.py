@@ -22,12 +22,15 @@ import json
 import os
 import sys
 import re
+import threading
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
 
+from .state_journal import StateJournal
+
 
 # ============================================================================
 # DATA CLASSES
@@ -1114,6 +1117,7 @@ class RichieAI:
         # FlowEngine (complemento — lê config do JSON do modelo)
         # Instanciado via load_flow_from_model() quando um modelo é ativado
         self._flow_engine = None
+        self._flow_model_id = None  # Modelo dono do fluxo (cursores de outro modelo são descartados)
         self._model_info = {}  # Dados do modelo ativo para self-awareness
 
         # Modo de operação: "offline" (padrão) ou "online"
@@ -1126,6 +1130,15 @@ class RichieAI:
         self.pending_permissions: List[PermissionRequest] = []
         self.learned_context: Dict[str, Any] = {}
 
+        # Persistência: snapshot + journal de eventos (um append por alteração)
+        self._journal = StateJournal(self.data_dir / "richie_state.json")
+        # Com um PersistenceWorker, as escritas vão para uma fila e são
+        # gravadas em lote fora da thread da interface (ver set_persistence)
+        self._persistence = None
+        self._pending_writes: List[Tuple[str, Dict]] = []
+        self._pending_lock = threading.Lock()
+        self._snapshot_queued = False
+
         # Carregar dados persistidos
         self._load_state()
 
@@ -1143,7 +1156,8 @@ class RichieAI:
         )
         self.sessions[session.id] = session
         self.active_session_id = session.id
-        self._save_state()
+        self._record({"type": "session", "session": asdict(session)})
+        self._record({"type": "active", "id": session.id})
         return session
 
     def get_active_session(self) -> Optional[ChatSession]:
@@ -1156,7 +1170,7 @@ class RichieAI:
         """Troca para outra sessão"""
         if session_id in self.sessions:
             self.active_session_id = session_id
-            self._save_state()
+            self._record({"type": "active", "id": session_id})
             return True
         return False
 
@@ -1172,12 +1186,13 @@ class RichieAI:
         """Deleta uma sessão"""
         if session_id in self.sessions:
             del self.sessions[session_id]
+            self._record({"type": "delete_session", "id": session_id})
             if self.active_session_id == session_id:
                 if self.sessions:
                     self.active_session_id = list(self.sessions.keys())[0]
+                    self._record({"type": "active", "id": self.active_session_id})
                 else:
                     self.create_new_session()
-            self._save_state()
             return True
         return False
 
@@ -1203,7 +1218,7 @@ class RichieAI:
         if len(user_msgs) == 1:
             session.title = content[:50] + ("..." if len(content) > 50 else "")
 
-        self._save_state()
+        self._record_message(session, message)
         return message
 
     def add_assistant_message(self, content: str, metadata: Dict = None) -> Dict:
@@ -1220,7 +1235,7 @@ class RichieAI:
         }
         session.messages.append(message)
         session.updated_at = datetime.now().isoformat()
-        self._save_state()
+        self._record_message(session, message)
         return message
 
     # =========================================================
@@ -1261,6 +1276,7 @@ class RichieAI:
                 if cfg.get('version'):
                     model_data['version'] = cfg['version']
             
+            self._flow_model_id = getattr(model, 'id', None)
             if nodes:
                 self._flow_engine = FlowEngine(nodes, conns, model_data)
                 self._model_info = model_data
@@ -1326,9 +1342,46 @@ class RichieAI:
             if intent_name == "self_info":
                 return self.get_self_info()
         
-        # 2. O motor offline é sempre o padrão
+        # 2. Executar o fluxo do modelo na conversa ativa (cards send/ai_response)
+        flow_reply = self.run_flow_turn(message, editor_code, file_extension)
+        if flow_reply:
+            return flow_reply
+
+        # 3. O motor offline é o padrão quando o fluxo não responde
         return self.offline_engine.generate_response(message, editor_code, file_extension, active_model_info=self._model_info)
 
+    def run_flow_turn(self, message: str, editor_code: str = None,
+                      file_extension: str = None) -> Optional[str]:
+        """
+        Avança o fluxo do modelo ativo na sessão ativa (FlowRuntime).
+        
+        O cursor da conversa (nó onde ela espera + variáveis de contexto)
+        fica em session.context["flow"] e vai para o journal a cada turno.
+        Cards ai_response sem template respondem pelo motor offline.
+        
+        Returns:
+            Respostas do turno unidas, ou None se o fluxo não gerou nenhuma.
+        """
+        session = self.get_active_session()
+        if not self._flow_engine or session is None:
+            return None
+        try:
+            from src.core.flow_runtime import FlowCursor
+            saved = session.context.get("flow") or {}
+            cursor = FlowCursor.from_dict(saved.get("cursor") if saved.get("model") == self._flow_model_id else None)
+            turn = self._flow_engine.get_runtime().step(
+                cursor, message,
+                responder=lambda msg, ctx: self.offline_engine.generate_response(
+                    msg, editor_code, file_extension, active_model_info=self._model_info)
+            )
+        except Exception as e:
+            print(f"[Richie] Erro ao executar fluxo: {e}")
+            return None
+
+        session.context["flow"] = {"model": self._flow_model_id, "cursor": cursor.to_dict()}
+        self._record({"type": "flow", "session_id": session.id, "flow": session.context["flow"]})
+        return "\n\n".join(turn.outputs) if turn.outputs else None
+
     def build_context_for_api(self, max_messages: int = 20) -> List[Dict]:
         """
         Constrói contexto de mensagens para enviar à API EXTERNA (modo online).
@@ -1380,7 +1433,7 @@ class RichieAI:
             steps=steps
         )
         self.action_plans[plan.id] = plan
-        self._save_state()
+        self._record({"type": "plan", "plan": asdict(plan)})
         return plan
 
     def approve_plan(self, plan_id: str) -> bool:
@@ -1389,7 +1442,7 @@ class RichieAI:
         if plan and plan.status == "pending":
             plan.status = "approved"
             plan.approved_at = datetime.now().isoformat()
-            self._save_state()
+            self._record({"type": "plan", "plan": asdict(plan)})
             return True
         return False
 
@@ -1398,7 +1451,7 @@ class RichieAI:
         plan = self.action_plans.get(plan_id)
         if plan and plan.status == "pending":
             plan.status = "rejected"
-            self._save_state()
+            self._record({"type": "plan", "plan": asdict(plan)})
             return True
         return False
 
@@ -1415,7 +1468,6 @@ class RichieAI:
             risk_level=risk
         )
         self.pending_permissions.append(perm)
-        self._save_state()
         return perm
 
     def grant_permission(self, perm_id: str) -> bool:
@@ -1423,7 +1475,6 @@ class RichieAI:
         for perm in self.pending_permissions:
             if perm.id == perm_id:
                 perm.status = "granted"
-                self._save_state()
                 return True
         return False
 
@@ -1432,7 +1483,6 @@ class RichieAI:
         for perm in self.pending_permissions:
             if perm.id == perm_id:
                 perm.status = "denied"
-                self._save_state()
                 return True
         return False
 
@@ -1444,7 +1494,8 @@ class RichieAI:
         session = self.get_active_session()
         if session:
             session.learned_items.append(f"{key}: {value}")
-        self._save_state()
+        self._record({"type": "learn", "key": key, "value": value,
+                      "session_id": session.id if session else None})
 
     def get_learned(self, key: str) -> Any:
         """Recupera algo aprendido"""
@@ -1463,36 +1514,91 @@ class RichieAI:
 
     # === Persistência ===
 
-    def _save_state(self):
-        """Salva estado completo no disco"""
+    def set_persistence(self, worker):
+        """Passa a gravar o estado em background pelo `worker` (PersistenceWorker)"""
+        self._persistence = worker
+
+    def _record(self, event: Dict):
+        """Anexa um evento ao journal; compacta quando o journal cresce demais"""
+        if self._persistence is not None:
+            with self._pending_lock:
+                self._pending_writes.append(("event", event))
+                compact = not self._snapshot_queued and self._journal.needs_compaction()
+            if compact:
+                self._save_state()
+            else:
+                self._persistence.submit("richie_state", self._write_pending)
+            return
         try:
-            state = {
-                "version": "1.0",
-                "mode": self.mode,
-                "active_session_id": self.active_session_id,
-                "sessions": {sid: asdict(s) for sid, s in self.sessions.items()},
-                "action_plans": {pid: asdict(p) for pid, p in self.action_plans.items()},
-                "learned_context": self.learned_context,
-                "saved_at": datetime.now().isoformat()
-            }
-
-            state_file = self.data_dir / "richie_state.json"
-            state_file.write_text(
-                json.dumps(state, indent=2, ensure_ascii=False),
-                encoding='utf-8'
-            )
+            self._journal.append(event)
+            if self._journal.needs_compaction():
+                self._save_state()
         except Exception as e:
             print(f"Erro ao salvar estado Richie: {e}")
 
-    def _load_state(self):
-        """Carrega estado do disco"""
+    def _record_message(self, session: ChatSession, message: Dict):
+        self._record({
+            "type": "message",
+            "session_id": session.id,
+            "message": message,
+            "title": session.title,
+            "updated_at": session.updated_at
+        })
+
+    def _state_dict(self) -> Dict:
+        return {
+            "version": "1.0",
+            "mode": self.mode,
+            "active_session_id": self.active_session_id,
+            "sessions": {sid: asdict(s) for sid, s in self.sessions.items()},
+            "action_plans": {pid: asdict(p) for pid, p in self.action_plans.items()},
+            "learned_context": dict(self.learned_context),
+            "saved_at": datetime.now().isoformat()
+        }
+
+    def _save_state(self):
+        """Salva estado completo no disco (snapshot atômico) e zera o journal"""
         try:
-            state_file = self.data_dir / "richie_state.json"
-            if not state_file.exists():
+            # A cópia é feita aqui, na ordem dos eventos; só a gravação vai para o worker
+            state = self._state_dict()
+            if self._persistence is None:
+                self._journal.write_snapshot(state, indent=2)
                 return
+            with self._pending_lock:
+                self._pending_writes.append(("snapshot", state))
+                self._snapshot_queued = True
+            self._persistence.submit("richie_state", self._write_pending)
+        except Exception as e:
+            print(f"Erro ao salvar estado Richie: {e}")
 
-            state = json.loads(state_file.read_text(encoding='utf-8-sig'))
+    def _write_pending(self):
+        """Grava (na thread do worker) os eventos e snapshots enfileirados, em ordem"""
+        with self._pending_lock:
+            batch, self._pending_writes = self._pending_writes, []
+        events = []
+        try:
+            for kind, payload in batch:
+                if kind == "event":
+                    events.append(payload)
+                    continue
+                # Eventos anteriores ao snapshot entram no journal_seq dele
+                self._journal.append_many(events)
+                events = []
+                self._journal.write_snapshot(payload, indent=2)
+            self._journal.append_many(events)
+        finally:
+            with self._pending_lock:
+                self._snapshot_queued = any(kind == "snapshot" for kind, _ in self._pending_writes)
+
+    def _load_state(self):
+        """Carrega o snapshot e reaplica os eventos do journal"""
+        try:
+            state, events = self._journal.load()
+        except Exception as e:
+            print(f"Erro ao carregar estado Richie: {e}")
+            return
 
+        if state:
             self.mode = state.get("mode", "offline")
             self.active_session_id = state.get("active_session_id")
 
@@ -1510,8 +1616,40 @@ class RichieAI:
 
             self.learned_context = state.get("learned_context", {})
 
-        except Exception as e:
-            print(f"Erro ao carregar estado Richie: {e}")
+        for event in events:
+            try:
+                self._apply_event(event)
+            except Exception:
+                pass
+
+    def _apply_event(self, event: Dict):
+        """Reaplica um evento do journal sobre o estado em memória"""
+        kind = event.get("type")
+        if kind == "session":
+            data = event["session"]
+            self.sessions[data["id"]] = ChatSession(**data)
+        elif kind == "active":
+            self.active_session_id = event["id"]
+        elif kind == "delete_session":
+            self.sessions.pop(event["id"], None)
+        elif kind == "message":
+            session = self.sessions.get(event["session_id"])
+            if session:
+                session.messages.append(event["message"])
+                session.title = event.get("title", session.title)
+                session.updated_at = event.get("updated_at", session.updated_at)
+        elif kind == "plan":
+            data = event["plan"]
+            self.action_plans[data["id"]] = ActionPlan(**data)
+        elif kind == "flow":
+            session = self.sessions.get(event["session_id"])
+            if session:
+                session.context["flow"] = event["flow"]
+        elif kind == "learn":
+            self.learned_context[event["key"]] = event["value"]
+            session = self.sessions.get(event.get("session_id"))
+            if session:
+                session.learned_items.append(f"{event['key']}: {event['value']}")
 
     # === Utilitários ===
 
@@ -0,0 +1,466 @@
+"""
+Segment Store - Armazenamento log-structured para o cache de respostas
+Registros sao apenas anexados a arquivos de segmento; um indice em memoria
+guarda (segmento, offset, tamanho) de cada chave, entao uma leitura custa um seek.
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Cabecalho de cada registro: crc32(meta + body), tamanho do meta, tamanho do body
+_HEADER = struct.Struct(">III")
+_SEGMENT_PREFIX = "seg-"
+_SEGMENT_SUFFIX = ".log"
+_INDEX_FILE = "index.json"
+_INDEX_VERSION = 1
+
+
+class _Location:
+    """Posicao de um registro vivo dentro de um segmento"""
+
+    __slots__ = ("segment", "offset", "meta_len", "body_len", "meta")
+
+    def __init__(self, segment: int, offset: int, meta_len: int, body_len: int, meta: Dict[str, Any]):
+        self.segment = segment
+        self.offset = offset
+        self.meta_len = meta_len
+        self.body_len = body_len
+        self.meta = meta
+
+    @property
+    def size(self) -> int:
+        return _HEADER.size + self.meta_len + self.body_len
+
+    def to_list(self) -> List[Any]:
+        return [self.segment, self.offset, self.meta_len, self.body_len, self.meta]
+
+    @classmethod
+    def from_list(cls, data: List[Any]) -> "_Location":
+        return cls(int(data[0]), int(data[1]), int(data[2]), int(data[3]), data[4] or {})
+
+
+class SegmentStore:
+    """
+    Key-value store append-only em arquivos de segmento.
+
+    - Escritas: um unico write() por registro no segmento ativo (com CRC).
+    - Leituras: um seek + read a partir do indice em memoria.
+    - Cold start: carrega o snapshot do indice e so varre a cauda dos
+      segmentos que cresceram depois do snapshot (nunca os corpos inteiros).
+    - Registros incompletos no fim de um segmento (crash no meio do append)
+      sao descartados e o arquivo e truncado.
+    - Compactacao reescreve apenas os registros vivos quando a fracao de
+      bytes mortos passa de `compact_ratio`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = 16 * 1024 * 1024,
+        compact_ratio: float = 0.5,
+        compact_min_bytes: int = 1024 * 1024,
+        index_flush_interval: int = 100,
+        fsync: bool = False
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.index_flush_interval = index_flush_interval
+        self.fsync = fsync
+
+        self.index: Dict[str, _Location] = {}
+        self.segment_sizes: Dict[int, int] = {}
+        self.dead_bytes = 0
+        self.active_segment = 0
+        self.compactions = 0
+        self.lock = threading.RLock()
+
+        self._writer = None
+        self._readers: Dict[int, Any] = {}
+        self._writes_since_flush = 0
+        self._compacting = False
+
+        self._open()
+
+    # ------------------------------------------------------------------
+    # API publica
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Le o corpo de uma chave (um seek no segmento)"""
+        with self.lock:
+            loc = self.index.get(key)
+            if loc is None:
+                return None
+            record = self._read_at(loc.segment, loc.offset, loc.size)
+            if record is None:
+                self._drop(key)
+                return None
+            crc, meta_len, body_len = _HEADER.unpack_from(record)
+            payload = record[_HEADER.size:]
+            if zlib.crc32(payload) != crc:
+                self._drop(key)
+                return None
+            return payload[meta_len:]
+
+    def get_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retorna os metadados de uma chave sem ler o corpo"""
+        with self.lock:
+            loc = self.index.get(key)
+            return dict(loc.meta) if loc else None
+
+    def value_size(self, key: str) -> int:
+        """Tamanho em bytes do corpo de uma chave (0 se ausente)"""
+        loc = self.index.get(key)
+        return loc.body_len if loc else 0
+
+    def put(self, key: str, value: bytes, meta: Dict[str, Any] = None):
+        """Anexa um registro e atualiza o indice"""
+        record_meta = dict(meta or {})
+        record_meta["k"] = key
+        with self.lock:
+            loc = self._append(record_meta, value)
+            old = self.index.get(key)
+            if old is not None:
+                self.dead_bytes += old.size
+            loc.meta = dict(meta or {})
+            self.index[key] = loc
+            self._after_write()
+
+    def delete(self, key: str) -> bool:
+        """Remove uma chave gravando um tombstone"""
+        with self.lock:
+            old = self.index.pop(key, None)
+            if old is None:
+                return False
+            loc = self._append({"k": key, "d": 1}, b"")
+            self.dead_bytes += old.size + loc.size
+            self._after_write()
+            return True
+
+    def clear(self):
+        """Remove todos os segmentos e o indice"""
+        with self.lock:
+            self._close_files()
+            for seg in set(self.segment_sizes) | set(self._list_segments()):
+                self._segment_path(seg).unlink(missing_ok=True)
+            (self.directory / _INDEX_FILE).unlink(missing_ok=True)
+            self.index.clear()
+            self.segment_sizes.clear()
+            self.dead_bytes = 0
+            self.active_segment = 1
+            self.segment_sizes[self.active_segment] = 0
+            self._write_index()
+
+    def keys(self) -> List[str]:
+        with self.lock:
+            return list(self.index.keys())
+
+    def items_meta(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Itera (chave, metadados) sem tocar nos segmentos"""
+        with self.lock:
+            snapshot = [(k, loc.meta) for k, loc in self.index.items()]
+        return iter(snapshot)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def flush(self):
+        """Persiste o snapshot do indice"""
+        with self.lock:
+            if self._writer:
+                self._writer.flush()
+            self._write_index()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self._close_files()
+
+    def compact(self):
+        """Reescreve os registros vivos em segmentos novos e remove os antigos"""
+        with self.lock:
+            old_segments = sorted(self.segment_sizes)
+            live = sorted(self.index.items(), key=lambda kv: (kv[1].segment, kv[1].offset))
+            self._close_files()
+            self._compacting = True
+
+            self.segment_sizes = {}
+            self.active_segment = (old_segments[-1] if old_segments else 0) + 1
+            self.segment_sizes[self.active_segment] = 0
+
+            new_index: Dict[str, _Location] = {}
+            for key, loc in live:
+                record = self._read_from_old(loc)
+                if record is None:
+                    continue
+                new_loc = self._append_raw(record, loc.meta_len, loc.body_len)
+                new_loc.meta = loc.meta
+                new_index[key] = new_loc
+
+            if self._writer:
+                self._writer.flush()
+                if self.fsync:
+                    os.fsync(self._writer.fileno())
+
+            self._compacting = False
+            self.index = new_index
+            self.dead_bytes = 0
+            self._write_index()
+            self._close_readers()
+
+            for seg in old_segments:
+                if seg not in self.segment_sizes:
+                    self._segment_path(seg).unlink(missing_ok=True)
+            self.compactions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = sum(self.segment_sizes.values())
+            return {
+                "segments": len(self.segment_sizes),
+                "disk_bytes": total,
+                "dead_bytes": self.dead_bytes,
+                "compactions": self.compactions
+            }
+
+    # ------------------------------------------------------------------
+    # Abertura / recuperacao
+    # ------------------------------------------------------------------
+
+    def _open(self):
+        on_disk = self._list_segments()
+        snapshot_sizes = self._read_index()
+
+        # Depois de um segmento varrido inteiro, os seguintes tambem sao:
+        # seus tombstones ja aplicados no snapshot precisam ser reaplicados
+        # por cima dos registros antigos que a varredura trouxe de volta
+        replay = False
+        for seg in on_disk:
+            path = self._segment_path(seg)
+            actual = path.stat().st_size
+            known = snapshot_sizes.get(seg)
+            if known is None or replay:
+                # Segmento nao coberto pelo snapshot: varre inteiro
+                replay = True
+                if known is not None and actual < known:
+                    self._forget_segment(seg)
+                self.segment_sizes[seg] = self._scan(seg, 0, actual)
+            elif actual > known:
+                # Segmento cresceu apos o snapshot: varre so a cauda
+                self.segment_sizes[seg] = self._scan(seg, known, actual)
+            elif actual < known:
+                # Snapshot aponta para alem do fim do arquivo: reconstroi
+                replay = True
+                self._forget_segment(seg)
+                self.segment_sizes[seg] = self._scan(seg, 0, actual)
+            else:
+                self.segment_sizes[seg] = actual
+
+        # Entradas de segmentos que sumiram do disco
+        for key in [k for k, loc in self.index.items() if loc.segment not in self.segment_sizes]:
+            del self.index[key]
+
+        live_bytes = sum(loc.size for loc in self.index.values())
+        self.dead_bytes = max(0, sum(self.segment_sizes.values()) - live_bytes)
+
+        if self.segment_sizes:
+            self.active_segment = max(self.segment_sizes)
+        else:
+            self.active_segment = 1
+            self.segment_sizes[self.active_segment] = 0
+
+        if snapshot_sizes != self.segment_sizes:
+            self._write_index()
+
+    def _read_index(self) -> Dict[int, int]:
+        """Carrega o snapshot do indice; retorna tamanhos conhecidos dos segmentos"""
+        path = self.directory / _INDEX_FILE
+        if not path.exists():
+            return {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") != _INDEX_VERSION:
+                return {}
+            self.index = {k: _Location.from_list(v) for k, v in data.get("entries", {}).items()}
+            return {int(s): int(n) for s, n in data.get("segments", {}).items()}
+        except (OSError, ValueError, TypeError, IndexError, AttributeError):
+            self.index = {}
+            return {}
+
+    def _write_index(self):
+        """Grava o snapshot do indice de forma atomica (tmp + rename)"""
+        data = {
+            "version": _INDEX_VERSION,
+            "segments": {str(s): n for s, n in self.segment_sizes.items()},
+            "entries": {k: loc.to_list() for k, loc in self.index.items()}
+        }
+        path = self.directory / _INDEX_FILE
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._writes_since_flush = 0
+
+    def _scan(self, seg: int, start: int, end: int) -> int:
+        """
+        Varre registros de [start, end) lendo apenas cabecalho + meta.
+        Retorna o offset do ultimo registro valido (trunca cauda corrompida).
+        """
+        path = self._segment_path(seg)
+        offset = start
+        with open(path, "rb") as f:
+            f.seek(start)
+            while offset + _HEADER.size <= end:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                crc, meta_len, body_len = _HEADER.unpack(header)
+                if offset + _HEADER.size + meta_len + body_len > end:
+                    break
+                meta_bytes = f.read(meta_len)
+                try:
+                    meta = json.loads(meta_bytes.decode("utf-8"))
+                    key = meta.pop("k")
+                except (ValueError, KeyError, UnicodeDecodeError):
+                    break
+                body = f.read(body_len)
+                if len(body) < body_len or crc != zlib.crc32(body, zlib.crc32(meta_bytes)):
+                    break
+
+                # So aplica o registro se ele for mais novo que o indexado
+                # (o snapshot pode apontar para segmentos posteriores)
+                current = self.index.get(key)
+                if current is None or (current.segment, current.offset) <= (seg, offset):
+                    if meta.pop("d", 0):
+                        self.index.pop(key, None)
+                    else:
+                        self.index[key] = _Location(seg, offset, meta_len, body_len, meta)
+                offset += _HEADER.size + meta_len + body_len
+
+        if offset < end:
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+        return offset
+
+    def _forget_segment(self, seg: int):
+        for key in [k for k, loc in self.index.items() if loc.segment == seg]:
+            del self.index[key]
+
+    def _list_segments(self) -> List[int]:
+        segments = []
+        for path in self.directory.glob(f"{_SEGMENT_PREFIX}*{_SEGMENT_SUFFIX}"):
+            try:
+                segments.append(int(path.stem[len(_SEGMENT_PREFIX):]))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    # ------------------------------------------------------------------
+    # Escrita / leitura de baixo nivel
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, seg: int) -> Path:
+        return self.directory / f"{_SEGMENT_PREFIX}{seg:06d}{_SEGMENT_SUFFIX}"
+
+    def _append(self, meta: Dict[str, Any], body: bytes) -> _Location:
+        meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        crc = zlib.crc32(body, zlib.crc32(meta_bytes))
+        record = _HEADER.pack(crc, len(meta_bytes), len(body)) + meta_bytes + body
+        return self._append_raw(record, len(meta_bytes), len(body))
+
+    def _append_raw(self, record: bytes, meta_len: int, body_len: int) -> _Location:
+        if self.segment_sizes.get(self.active_segment, 0) + len(record) > self.max_segment_bytes \
+                and self.segment_sizes.get(self.active_segment, 0) > 0:
+            self._roll_segment()
+
+        writer = self._get_writer()
+        offset = self.segment_sizes[self.active_segment]
+        writer.write(record)
+        writer.flush()
+        if self.fsync:
+            os.fsync(writer.fileno())
+        self.segment_sizes[self.active_segment] = offset + len(record)
+        return _Location(self.active_segment, offset, meta_len, body_len, {})
+
+    def _roll_segment(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        self.active_segment += 1
+        self.segment_sizes[self.active_segment] = 0
+        if not self._compacting:
+            self._write_index()
+
+    def _get_writer(self):
+        if self._writer is None:
+            self._writer = open(self._segment_path(self.active_segment), "ab")
+        return self._writer
+
+    def _read_at(self, seg: int, offset: int, size: int) -> Optional[bytes]:
+        reader = self._readers.get(seg)
+        if reader is None:
+            path = self._segment_path(seg)
+            if not path.exists():
+                return None
+            reader = open(path, "rb")
+            self._readers[seg] = reader
+        reader.seek(offset)
+        data = reader.read(size)
+        return data if len(data) == size else None
+
+    def _read_from_old(self, loc: _Location) -> Optional[bytes]:
+        path = self._segment_path(loc.segment)
+        try:
+            with open(path, "rb") as f:
+                f.seek(loc.offset)
+                data = f.read(loc.size)
+        except OSError:
+            return None
+        if len(data) != loc.size:
+            return None
+        crc = _HEADER.unpack_from(data)[0]
+        return data if zlib.crc32(data[_HEADER.size:]) == crc else None
+
+    def _drop(self, key: str):
+        loc = self.index.pop(key, None)
+        if loc is not None:
+            self.dead_bytes += loc.size
+
+    def _after_write(self):
+        self._writes_since_flush += 1
+        total = sum(self.segment_sizes.values())
+        if self.dead_bytes >= self.compact_min_bytes and total and self.dead_bytes / total >= self.compact_ratio:
+            self.compact()
+        elif self._writes_since_flush >= self.index_flush_interval:
+            self._write_index()
+
+    def _close_readers(self):
+        for reader in self._readers.values():
+            try:
+                reader.close()
+            except OSError:
+                pass
+        self._readers.clear()
+
+    def _close_files(self):
+        if self._writer:
+            try:
+                self._writer.close()
+            except OSError:
+                pass
+            self._writer = None
+        self._close_readers()
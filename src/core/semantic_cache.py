@@ -0,0 +1,242 @@
+"""
+Semantic Cache - Camada de quase-duplicatas para o ResponseCache
+Normaliza prompts (caixa, acentos, pontuacao, espacos) e encontra prompts
+parecidos com MinHash + LSH sobre shingles de caracteres. 100% offline.
+
+Similaridade de caracteres nao ve sentido: "ordem crescente" e "ordem
+decrescente" ficam acima de 0.9, e shingles ignoram a ordem das palavras
+("origem para destino" e "destino para origem"). Por isso um candidato so e
+aceito se os dois prompts tiverem os mesmos numeros, a mesma polaridade
+(negacoes e palavras que so diferem por prefixo de negacao, ver
+`polarity_conflict`) e as palavras em comum na mesma ordem (`order_conflict`).
+"""
+
+import hashlib
+import random
+import re
+import struct
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from .segment_store import SegmentStore
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"\d+")
+
+# Tokens de negacao (ja normalizados: "não" -> "nao")
+NEGATION_TOKENS = frozenset({
+    "nao", "sem", "nunca", "nem", "jamais", "nenhum", "nenhuma",
+    "not", "no", "never", "without", "nor", "dont", "doesnt", "isnt",
+})
+# Prefixos que invertem o sentido: crescente/decrescente, valido/invalido
+NEGATION_PREFIXES = ("des", "de", "in", "im", "ir", "un", "dis", "non", "anti")
+
+
+def normalize_prompt(text: str) -> str:
+    """Normaliza prompt: minusculas, sem acentos, sem pontuacao, espacos colapsados"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCTUATION_RE.sub(" ", text.lower())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def polarity_conflict(text_a: str, text_b: str) -> bool:
+    """
+    True se dois prompts normalizados diferem em numeros ou em polaridade:
+    tokens de negacao diferentes, ou uma palavra de um lado que e outra
+    palavra do outro lado com prefixo de negacao (crescente/decrescente).
+    """
+    if sorted(_NUMBER_RE.findall(text_a)) != sorted(_NUMBER_RE.findall(text_b)):
+        return True
+    words_a, words_b = set(text_a.split()), set(text_b.split())
+    if words_a & NEGATION_TOKENS != words_b & NEGATION_TOKENS:
+        return True
+    for only, other in ((words_a - words_b, words_b), (words_b - words_a, words_a)):
+        for word in only:
+            for prefix in NEGATION_PREFIXES:
+                if word.startswith(prefix) and len(word) - len(prefix) >= 3 and word[len(prefix):] in other:
+                    return True
+    return False
+
+
+def order_conflict(text_a: str, text_b: str) -> bool:
+    """
+    True se as palavras que os dois prompts normalizados tem em comum
+    aparecem em outra ordem (primeira ocorrencia de cada uma).
+    """
+    words_a, words_b = text_a.split(), text_b.split()
+    common = set(words_a) & set(words_b)
+
+    def sequence(words: List[str]) -> List[str]:
+        seen: Set[str] = set()
+        ordered = []
+        for word in words:
+            if word in common and word not in seen:
+                seen.add(word)
+                ordered.append(word)
+        return ordered
+
+    return sequence(words_a) != sequence(words_b)
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Shingles de caracteres do texto ja normalizado"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """Assinaturas MinHash com permutacoes deterministicas (estaveis entre execucoes)"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        self.num_perm = num_perm
+        rng = random.Random(seed)
+        self.params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, tokens: Set[str]) -> Tuple[int, ...]:
+        if not tokens:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashes = [
+            int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=4).digest(), "little")
+            for t in tokens
+        ]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.params
+        )
+
+    @staticmethod
+    def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+        """Estimativa de Jaccard entre duas assinaturas"""
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class SemanticIndex:
+    """
+    Indice LSH (bandas de MinHash) de prompts normalizados -> chave do ResponseCache.
+
+    Apenas prompts com o mesmo modelo e o mesmo contexto (hash exato) sao
+    comparados. As chaves de banda ficam nos metadados do SegmentStore, entao
+    o cold start so le o indice; a assinatura completa e o prompt normalizado
+    sao lidos (um seek) apenas para confirmar candidatos contra o `threshold`,
+    `polarity_conflict` e `order_conflict`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        threshold: float = 0.95,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm deve ser multiplo de bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self.store = SegmentStore(directory, max_segment_bytes=4 * 1024 * 1024)
+        self.buckets: Dict[int, Set[str]] = {}
+        self.lock = threading.Lock()
+
+        for key, meta in self.store.items_meta():
+            for band_key in meta.get("b", []):
+                self.buckets.setdefault(band_key, set()).add(key)
+
+    def _scope(self, model: str, context_hash: str) -> bytes:
+        return f"{model}\x00{context_hash}".encode("utf-8")
+
+    def _band_keys(self, sig: Tuple[int, ...], scope: bytes) -> List[int]:
+        keys = []
+        for band in range(self.bands):
+            chunk = sig[band * self.rows:(band + 1) * self.rows]
+            data = scope + struct.pack(f">H{self.rows}I", band, *chunk)
+            keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little"))
+        return keys
+
+    def signature(self, prompt: str) -> Tuple[int, ...]:
+        return self.hasher.signature(shingles(normalize_prompt(prompt), self.shingle_size))
+
+    def add(self, key: str, prompt: str, model: str, context_hash: str):
+        """Registra o prompt de uma entrada do cache"""
+        text = normalize_prompt(prompt)
+        sig = self.hasher.signature(shingles(text, self.shingle_size))
+        band_keys = self._band_keys(sig, self._scope(model, context_hash))
+        # Corpo: assinatura seguida do prompt normalizado (para polarity/order_conflict)
+        body = struct.pack(f">{len(sig)}I", *sig) + text.encode("utf-8")
+        with self.lock:
+            self._discard(key)
+            self.store.put(key, body, {"b": band_keys})
+            for band_key in band_keys:
+                self.buckets.setdefault(band_key, set()).add(key)
+
+    def lookup(self, prompt: str, model: str, context_hash: str) -> Optional[Tuple[str, float]]:
+        """Retorna (chave, similaridade) do melhor candidato acima do threshold"""
+        text = normalize_prompt(prompt)
+        sig = self.hasher.signature(shingles(text, self.shingle_size))
+        sig_bytes = 4 * len(sig)
+        band_keys = self._band_keys(sig, self._scope(model, context_hash))
+        with self.lock:
+            candidates: Set[str] = set()
+            for band_key in band_keys:
+                candidates.update(self.buckets.get(band_key, ()))
+
+            best: Optional[Tuple[str, float]] = None
+            for key in candidates:
+                raw = self.store.get(key)
+                if raw is None:
+                    for band_key in band_keys:
+                        self.buckets.get(band_key, set()).discard(key)
+                    continue
+                other = struct.unpack(f">{len(sig)}I", raw[:sig_bytes]) if len(raw) >= sig_bytes else ()
+                score = MinHasher.similarity(sig, other)
+                if score < self.threshold or (best is not None and score <= best[1]):
+                    continue
+                # Entradas sem o prompt gravado nao podem ser conferidas
+                other_text = raw[sig_bytes:].decode("utf-8", errors="replace")
+                if not other_text or polarity_conflict(text, other_text) or order_conflict(text, other_text):
+                    continue
+                best = (key, score)
+            return best
+
+    def remove(self, key: str):
+        with self.lock:
+            self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.store.clear()
+            self.buckets.clear()
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        self.store.close()
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def _discard(self, key: str):
+        meta = self.store.get_meta(key)
+        if meta is None:
+            return
+        for band_key in meta.get("b", []):
+            bucket = self.buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+        self.store.delete(key)
@@ -0,0 +1,168 @@
+"""
+Single Flight - Coalescencia de requisicoes identicas em andamento
+Threads que pedem a mesma chave enquanto uma chamada esta em voo esperam
+por ela e compartilham o resultado (ou a excecao), inclusive em streaming.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Generator, Iterable, List, Tuple
+
+
+class LeaderCancelled(Exception):
+    """O consumidor do lider abandonou o stream: os seguidores nao recebem o resto"""
+
+
+class _Call:
+    """Chamada bloqueante em voo"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class _StreamCall:
+    """Chamada em streaming em voo: chunks acumulados para os seguidores"""
+
+    __slots__ = ("cond", "chunks", "finished", "error")
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """Executa no maximo uma chamada por chave ao mesmo tempo"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, _Call] = {}
+        self.streams: Dict[str, _StreamCall] = {}
+        self.tasks: Dict[Tuple[int, str], "asyncio.Task"] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Executa `fn` ou espera a execucao em voo da mesma chave"""
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self.calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Versao asyncio de `do`: corrotinas da mesma chave aguardam a mesma task"""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self.lock:
+            task = self.tasks.get(flight_key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                task = loop.create_task(factory())
+                self.tasks[flight_key] = task
+                self.executed += 1
+                task.add_done_callback(lambda t: self._forget_task(flight_key, t))
+
+        # shield: cancelar um seguidor nao cancela a chamada compartilhada
+        return await asyncio.shield(task)
+
+    def _forget_task(self, flight_key: Tuple[int, str], task: "asyncio.Task"):
+        with self.lock:
+            if self.tasks.get(flight_key) is task:
+                del self.tasks[flight_key]
+
+    def stream(self, key: str, factory: Callable[[], Iterable[Any]]) -> Generator[Any, None, None]:
+        """
+        Versao streaming de `do`: o lider consome `factory()` e repassa cada
+        chunk; seguidores recebem os mesmos chunks (desde o inicio) em tempo real.
+        A eleicao do lider acontece na primeira iteracao do gerador.
+        """
+        with self.lock:
+            call = self.streams.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _StreamCall()
+                self.streams[key] = call
+                self.executed += 1
+                leader = True
+
+        if leader:
+            yield from self._lead_stream(key, call, factory)
+        else:
+            yield from self._follow_stream(call)
+
+    def _lead_stream(self, key: str, call: _StreamCall, factory: Callable[[], Iterable[Any]]):
+        try:
+            for chunk in factory():
+                with call.cond:
+                    call.chunks.append(chunk)
+                    call.cond.notify_all()
+                yield chunk
+        except GeneratorExit:
+            # Lider abandonou o stream: seguidores nao podem tomar a resposta
+            # parcial como completa
+            call.error = LeaderCancelled(f"Stream lider cancelado para a chave {key}")
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.streams.pop(key, None)
+            with call.cond:
+                call.finished = True
+                call.cond.notify_all()
+
+    def _follow_stream(self, call: _StreamCall):
+        index = 0
+        while True:
+            with call.cond:
+                while index >= len(call.chunks) and not call.finished:
+                    call.cond.wait()
+                pending = call.chunks[index:]
+                finished = call.finished
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+            if finished and index >= len(call.chunks):
+                if call.error is not None:
+                    raise call.error
+                return
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "in_flight": len(self.calls) + len(self.streams) + len(self.tasks),
+                "executed": self.executed,
+                "coalesced": self.coalesced
+            }
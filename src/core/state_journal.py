@@ -0,0 +1,165 @@
+"""
+State Journal - Persistencia incremental de estado (snapshot + journal JSONL)
+Cada alteracao vira uma linha anexada ao journal (custo constante por evento);
+o estado completo so e reescrito na compactacao, de forma atomica.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class StateJournal:
+    """
+    Write-ahead journal ao lado de um arquivo de snapshot JSON.
+
+    - `append(evento)`: uma linha JSON com numero de sequencia.
+    - `write_snapshot(estado)`: grava tmp + os.replace e zera o journal.
+      O snapshot guarda a ultima sequencia aplicada, entao um crash entre
+      o rename e o truncamento nao reaplica eventos.
+    - `load()`: retorna (snapshot, eventos posteriores ao snapshot).
+      Uma ultima linha incompleta (crash no meio do append) e descartada.
+    - Compactacao sugerida quando o journal passa de `compact_ratio` vezes
+      o tamanho do snapshot (e de `compact_min_bytes`): custo amortizado
+      constante por evento.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        journal_path: str = None,
+        compact_ratio: float = 1.0,
+        compact_min_bytes: int = 256 * 1024,
+        fsync: bool = False
+    ):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path) if journal_path else self.snapshot_path.with_suffix(".journal.jsonl")
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.fsync = fsync
+
+        self.seq = 0
+        self.snapshot_bytes = 0
+        self.journal_bytes = 0
+        self.events_since_snapshot = 0
+        self._handle = None
+        self.lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Le o snapshot e os eventos do journal ainda nao incorporados a ele"""
+        snapshot = None
+        snapshot_seq = 0
+        if self.snapshot_path.exists():
+            raw = self.snapshot_path.read_bytes()
+            self.snapshot_bytes = len(raw)
+            snapshot = json.loads(raw.decode("utf-8-sig"))
+            snapshot_seq = int(snapshot.get("journal_seq", 0))
+        self.seq = snapshot_seq
+
+        events = []
+        if self.journal_path.exists():
+            good = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break
+                    good += len(line)
+                    seq = int(event.get("seq", 0))
+                    if seq > snapshot_seq:
+                        events.append(event)
+                        self.seq = max(self.seq, seq)
+            if good != self.journal_path.stat().st_size:
+                # Cauda corrompida: trunca para nao anexar depois do lixo
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good)
+            self.journal_bytes = good
+        self.events_since_snapshot = len(events)
+        return snapshot, events
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def append(self, event: Dict[str, Any]):
+        """Anexa um evento (uma linha JSON) ao journal"""
+        self.append_many([event])
+
+    def append_many(self, events: List[Dict[str, Any]]):
+        """Anexa varios eventos com uma unica escrita (e um unico fsync)"""
+        if not events:
+            return
+        with self.lock:
+            lines = []
+            for event in events:
+                self.seq += 1
+                record = dict(event)
+                record["seq"] = self.seq
+                lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+            data = "".join(lines).encode("utf-8")
+            handle = self._open()
+            handle.write(data)
+            handle.flush()
+            if self.fsync:
+                os.fsync(handle.fileno())
+            self.journal_bytes += len(data)
+            self.events_since_snapshot += len(events)
+
+    def needs_compaction(self) -> bool:
+        return self.journal_bytes >= max(self.compact_min_bytes, self.snapshot_bytes * self.compact_ratio)
+
+    def write_snapshot(self, state: Dict[str, Any], indent: int = None):
+        """Grava o estado completo atomicamente e descarta o journal"""
+        with self.lock:
+            state = dict(state)
+            state["journal_seq"] = self.seq
+            data = json.dumps(state, indent=indent, ensure_ascii=False).encode("utf-8")
+
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            self.snapshot_bytes = len(data)
+
+            # Eventos ja estao no snapshot (journal_seq): pode truncar
+            self._close()
+            with open(self.journal_path, "wb"):
+                pass
+            self.journal_bytes = 0
+            self.events_since_snapshot = 0
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _open(self):
+        if self._handle is None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = open(self.journal_path, "ab")
+        return self._handle
+
+    def _close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "snapshot_bytes": self.snapshot_bytes,
+            "journal_bytes": self.journal_bytes,
+            "events_since_snapshot": self.events_since_snapshot
+        }
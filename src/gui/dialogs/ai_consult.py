@@ -479,6 +479,9 @@ class AICard(QFrame):
                             if str(nid) in node_map:
                                 group.contained_nodes.append(node_map[str(nid)])
 
+                # Validar o fluxo carregado (roda em thread no CreateAIDialog)
+                dialog.flow_scene.flow_changed.emit()
+
                 # Disparar updates visuais apos a inicializacao nativa do Qt (render pipeline)
                 def force_update():
                     for item in dialog.flow_scene.items():
@@ -17,13 +17,15 @@ from PyQt6.QtWidgets import (
     QGraphicsRectItem, QGraphicsTextItem, QGraphicsItem, QGraphicsEllipseItem,
     QMenu, QInputDialog, QColorDialog
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QPointF, QRectF, QLineF, QPoint, QTimer
+from PyQt6.QtCore import Qt, pyqtSignal, QPointF, QRectF, QLineF, QPoint, QTimer, QThread
 from PyQt6.QtGui import QFont, QPainterPath, QPen, QBrush, QColor, QPainter, QTransform
 
 from ...core.custom_ai_manager import (
     CustomAIManager, CustomAIModel,
     AVAILABLE_BASE_MODELS, AI_TEMPLATES
 )
+from ...core.json_flow_engine import FlowEngine
+from ...core.flow_analysis import FlowAnalyzer
 
 
 # ========== CATALOGO DE CARDS BOTFORGE ==========
@@ -1035,6 +1037,8 @@ class FlowNode(QGraphicsItem):
                 self.extra_data['btn_global'] = modal.chk_always_global.isChecked()
                 
             self.update()
+            if isinstance(self.scene(), FlowScene):
+                self.scene().flow_changed.emit()
 
     def get_port_color(self, port_type):
         if port_type.startswith("out_"):
@@ -1070,7 +1074,13 @@ class FlowNode(QGraphicsItem):
     def add_connection(self, conn):
         self.connections.append(conn)
 
+    def remove_connection(self, conn):
+        if conn in self.connections:
+            self.connections.remove(conn)
+
 class FlowScene(QGraphicsScene):
+    flow_changed = pyqtSignal()  # Nodes/conexões/portas editados (dispara a validação do fluxo)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setBackgroundBrush(QBrush(QColor("#0e1116")))  # Fundo noturno profundo BotForge
@@ -1161,12 +1171,14 @@ class FlowScene(QGraphicsScene):
                     self.drawing_conn.source_node.add_connection(self.drawing_conn)
                     self.drawing_conn.dest_node.add_connection(self.drawing_conn)
                     self.drawing_conn.update_path()
+                    self.flow_changed.emit()
                 elif not is_backward and item != self.drawing_conn.source_node:
                     self.drawing_conn.dest_node = item
                     self.drawing_conn.dest_port = "in"
                     self.drawing_conn.source_node.add_connection(self.drawing_conn)
                     item.add_connection(self.drawing_conn)
                     self.drawing_conn.update_path()
+                    self.flow_changed.emit()
                 else:
                     self.removeItem(self.drawing_conn)
             else:
@@ -1189,6 +1201,7 @@ class FlowScene(QGraphicsScene):
                     if item.dest_node and item in item.dest_node.connections:
                         item.dest_node.remove_connection(item)
                     self.removeItem(item)
+                    self.flow_changed.emit()
                 # Opcional: deletar nodes, mas por enquanto mantemos delete apenas no painel e botão delete item.
             event.accept()
         else:
@@ -1234,6 +1247,7 @@ class FlowScene(QGraphicsScene):
                         new_node.add_connection(connection_to_link)
                     
                     connection_to_link.update_path()
+                    self.flow_changed.emit()
             return True
         return False
 
@@ -1426,16 +1440,45 @@ class FlowView(QGraphicsView):
             if isinstance(child, ZoomOverlay):
                 child.move(self.width() - child.width() - 20, self.height() - child.height() - 20)
 
+class FlowAnalysisThread(QThread):
+    """Thread para validar o fluxo (FlowEngine + FlowAnalyzer) sem travar o canvas"""
+    finished_analysis = pyqtSignal(list)
+    error = pyqtSignal(str)
+
+    def __init__(self, analyzer: FlowAnalyzer, nodes: list, conns: list):
+        super().__init__()
+        self.analyzer = analyzer
+        self.nodes = nodes
+        self.conns = conns
+
+    def run(self):
+        try:
+            self.finished_analysis.emit(self.analyzer.analyze(FlowEngine(self.nodes, self.conns)))
+        except Exception as e:
+            self.error.emit(str(e))
+
+
 class CreateAIDialog(QDialog):
     """Dialog para criar nova IA/Bot — estilo BotForge Studio com 6 abas"""
 
     ai_created = pyqtSignal(object)
 
+    # Espera após a última edição do canvas antes de revalidar o fluxo
+    FLOW_ANALYSIS_DELAY_MS = 300
+    # Máximo de diagnósticos exibidos na lista (o resumo conta todos)
+    FLOW_DIAGNOSTICS_SHOWN = 300
+
     def __init__(self, custom_ai_manager: CustomAIManager, parent=None):
         super().__init__(parent)
         self.manager = custom_ai_manager
         self.flow_nodes = []  # Lista de nodes do fluxo
         self.chat_messages = []  # Histórico do chat de teste
+        # Validação incremental do fluxo: uma análise por vez, em thread;
+        # o FlowAnalyzer é mantido para reaproveitar a análise de keywords
+        self.flow_analyzer = FlowAnalyzer()
+        self._analysis_thread = None
+        self._analysis_pending = False
+        self._last_flow_key = None
         self.setWindowTitle("🤖 Criar Nova IA / Bot — BotForge Studio")
         self.setMinimumSize(820, 650)
         self.setStyleSheet(self._get_styles())
@@ -1615,6 +1658,20 @@ class CreateAIDialog(QDialog):
 
         layout.addLayout(btn_row)
 
+        # Validação do fluxo (roda sozinha após cada edição no canvas)
+        self.flow_diag_label = QLabel("🔎 Validação: fluxo vazio")
+        layout.addWidget(self.flow_diag_label)
+        self.flow_diag_list = QListWidget()
+        self.flow_diag_list.setMaximumHeight(110)
+        self.flow_diag_list.itemClicked.connect(self._focus_diagnostic_node)
+        layout.addWidget(self.flow_diag_list)
+
+        self._analysis_timer = QTimer(self)
+        self._analysis_timer.setSingleShot(True)
+        self._analysis_timer.setInterval(self.FLOW_ANALYSIS_DELAY_MS)
+        self._analysis_timer.timeout.connect(self._run_flow_analysis)
+        self.flow_scene.flow_changed.connect(self._analysis_timer.start)
+
         # Detalhes do node selecionado
         detail_group = QGroupBox("Detalhes para Novo Node")
         dg_layout = QVBoxLayout(detail_group)
@@ -1873,6 +1930,7 @@ class CreateAIDialog(QDialog):
         node_item = FlowNode(node_id, card_id, label, msg, color)
         node_item.setPos(x, y)
         self.flow_scene.addItem(node_item)
+        self.flow_scene.flow_changed.emit()
         return node_item
 
     def _add_flow_node(self):
@@ -1916,6 +1974,7 @@ class CreateAIDialog(QDialog):
                     if conn.source_node and conn in conn.source_node.connections:
                         conn.source_node.connections.remove(conn)
                 self.flow_scene.removeItem(item)
+        self.flow_scene.flow_changed.emit()
 
     def _add_card_to_flow(self, card_id, card_name):
         # find color
@@ -1935,6 +1994,7 @@ class CreateAIDialog(QDialog):
         y = 50 + (len(self.flow_nodes) // 3) * 80
         node_item.setPos(x, y)
         self.flow_scene.addItem(node_item)
+        self.flow_scene.flow_changed.emit()
         
         self.tabs.setCurrentIndex(1)  # Ir para aba Fluxo
 
@@ -2023,10 +2083,118 @@ class CreateAIDialog(QDialog):
                 for node in group.contained_nodes:
                     node.setZValue(1)
                 
+            self.flow_scene.flow_changed.emit()
             QMessageBox.information(self, "Importação", f"{len(nodes)} nodes e {len(groups)} sessões importados.")
         except Exception as e:
             QMessageBox.critical(self, "Erro", f"Falha ao importar fluxo:\n{str(e)}")
 
+    # ==================== VALIDAÇÃO DO FLUXO ====================
+    def _snapshot_flow(self):
+        """
+        Copia o canvas para dicts (mesmo formato e mesma ordem salvos em
+        _flow_nodes/_flow_conns: o FlowEngine depende da ordem para o nó
+        inicial de fallback e para o primeiro NLP).
+        Roda na thread da UI: os itens do Qt não podem ser lidos pela thread de análise.
+        """
+        nodes, conns = [], []
+        for it in self.flow_scene.items():
+            if isinstance(it, FlowNode):
+                node_data = {
+                    "id": it.node_id,
+                    "type": it.node_type,
+                    "label": it.label,
+                    "msg": getattr(it, "message", ""),
+                    "out_labels": list(getattr(it, "out_labels", [])),
+                    "out_keywords": list(getattr(it, "out_keywords", []))
+                }
+                for key, val in (it.extra_data or {}).items():
+                    node_data.setdefault(key, val)
+                nodes.append(node_data)
+            elif isinstance(it, FlowConnection) and it.source_node and it.dest_node:
+                conns.append({
+                    "source": it.source_node.node_id,
+                    "source_port": it.source_port,
+                    "target": it.dest_node.node_id,
+                    "target_port": it.dest_port
+                })
+        return nodes, conns
+
+    @staticmethod
+    def _flow_key(nodes, conns):
+        """Chave canônica do snapshot (detecta mudanças de conteúdo ou de ordem)"""
+        return json.dumps([nodes, conns], sort_keys=True, ensure_ascii=False, default=str)
+
+    def _run_flow_analysis(self):
+        """Dispara a análise em thread; se já houver uma rodando, agenda outra ao final"""
+        if self._analysis_thread is not None and self._analysis_thread.isRunning():
+            self._analysis_pending = True
+            return
+        self._analysis_pending = False
+        snapshot = self._snapshot_flow()
+        key = self._flow_key(*snapshot)
+        if key == self._last_flow_key:
+            return  # Só posição/seleção mudou
+        self._last_flow_key = key
+        if not snapshot[0]:
+            self.flow_diag_list.clear()
+            self.flow_diag_label.setText("🔎 Validação: fluxo vazio")
+            return
+
+        self.flow_diag_label.setText("🔎 Validando fluxo...")
+        self._analysis_thread = FlowAnalysisThread(self.flow_analyzer, *snapshot)
+        self._analysis_thread.finished_analysis.connect(self._show_flow_diagnostics)
+        self._analysis_thread.error.connect(lambda e: self.flow_diag_label.setText(f"❌ Falha na validação: {e}"))
+        self._analysis_thread.finished.connect(self._on_flow_analysis_finished)
+        self._analysis_thread.start()
+
+    def _on_flow_analysis_finished(self):
+        if self._analysis_pending:
+            self._run_flow_analysis()
+
+    def _show_flow_diagnostics(self, diagnostics):
+        if self._analysis_pending:
+            return  # Resultado já desatualizado: a próxima análise vai substituí-lo
+        counts = {"error": 0, "warning": 0, "info": 0}
+        for diag in diagnostics:
+            counts[diag.severity] = counts.get(diag.severity, 0) + 1
+        if not diagnostics:
+            self.flow_diag_label.setText("✅ Validação: nenhum problema encontrado")
+        else:
+            self.flow_diag_label.setText(
+                f"🔎 Validação: {counts['error']} erro(s), {counts['warning']} aviso(s), {counts['info']} info(s)"
+            )
+
+        order = {"error": 0, "warning": 1, "info": 2}
+        shown = sorted(diagnostics, key=lambda d: order.get(d.severity, 3))[:self.FLOW_DIAGNOSTICS_SHOWN]
+        self.flow_diag_list.clear()
+        for diag in shown:
+            item = QListWidgetItem(str(diag))
+            item.setData(Qt.ItemDataRole.UserRole, diag.node_id)
+            item.setToolTip(diag.code)
+            self.flow_diag_list.addItem(item)
+        if len(diagnostics) > len(shown):
+            self.flow_diag_list.addItem(f"… mais {len(diagnostics) - len(shown)} diagnóstico(s)")
+
+    def _focus_diagnostic_node(self, item):
+        """Seleciona e centraliza no canvas o node do diagnóstico clicado"""
+        node_id = item.data(Qt.ItemDataRole.UserRole)
+        if node_id is None:
+            return
+        for it in self.flow_scene.items():
+            if isinstance(it, FlowNode) and it.node_id == node_id:
+                self.flow_scene.clearSelection()
+                it.setSelected(True)
+                self.flow_view.centerOn(it)
+                break
+
+    def done(self, result):
+        # Não destruir o dialog com a thread de validação ainda rodando
+        self._analysis_timer.stop()
+        self._analysis_pending = False
+        if self._analysis_thread is not None:
+            self._analysis_thread.wait()
+        super().done(result)
+
     def _send_test_message(self):
         """Simula resposta local do bot baseada no fluxo e system prompt"""
         user_msg = self.test_input.text().strip()
@@ -4,13 +4,16 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QTabWidget, QScrollArea, QComboBox, QSizePolicy, 
                              QToolButton, QDialog, QGraphicsOpacityEffect, QMenu,
                              QMenuBar, QStackedWidget, QInputDialog, QMessageBox,
-                             QFileDialog, QApplication, QListWidget, QListWidgetItem)
+                             QFileDialog, QApplication, QListWidget, QListWidgetItem,
+                             QListView, QStyledItemDelegate, QAbstractItemView)
 from PyQt6.QtCore import (Qt, QSize, QDir, QRect, QPropertyAnimation, 
                           QEasingCurve, QSequentialAnimationGroup, QThread, 
-                          pyqtSignal, QProcess, QEvent, QStandardPaths, QTimer)
+                          pyqtSignal, QProcess, QEvent, QStandardPaths, QTimer,
+                          QObject, QAbstractListModel, QModelIndex)
 from PyQt6.QtGui import (QIcon, QFont, QColor, QPalette, QFileSystemModel, 
                          QSyntaxHighlighter, QTextCharFormat, QAction, QKeyEvent,
-                         QCursor, QPixmap, QImage, QKeySequence, QShortcut, QTextCursor)
+                         QCursor, QPixmap, QImage, QKeySequence, QShortcut, QTextCursor,
+                         QTextDocument, QAbstractTextDocumentLayout, QPainter, QFontMetrics)
 
 import os
 import sys
@@ -19,11 +22,15 @@ import tempfile
 import shutil
 import json
 import re
+import time
+import codecs
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
 
 # AI Integration - Novos componentes otimizados
-from ..core import AIManager, TokenOptimizer, CustomAIManager, TrainingManager
+from ..core import AIManager, TokenOptimizer, CustomAIManager, TrainingManager, ChatHistoryStore, PersistenceWorker
 from .dialogs import CreateAIDialog, ManageAIDialog, TrainingDialog
 
 # Pygments for syntax highlighting
@@ -31,13 +38,16 @@ try:
     from pygments import highlight
     from pygments.lexers import get_lexer_for_filename, get_lexer_by_name
     from pygments.token import Token
+    from pygments.lexer import RegexLexer, ExtendedRegexLexer
     PYGMENTS_AVAILABLE = True
+    # Classe dos tipos de token (Token.Keyword, ...), sem importar nome privado
+    _TOKEN_TYPE = type(Token)
 except ImportError:
     PYGMENTS_AVAILABLE = False
 
 
-def markdown_to_html(text):
-    """Converte markdown básico para HTML para exibição nos balões de chat."""
+def _inline_markdown_to_html(text):
+    """Converte markdown básico (sem blocos de código) para HTML."""
     # Escapar HTML existente
     text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
     
@@ -64,7 +74,177 @@ def markdown_to_html(text):
     return text
 
 
+_FENCE_RE = re.compile(r'[ \t]*(```|~~~)[ \t]*([\w+#.-]*)')
+
+
+def _code_block_html(block):
+    """Renderiza um bloco cercado por ``` (fechado ou ainda em streaming)."""
+    lines = block.rstrip("\n").split("\n")
+    match = _FENCE_RE.match(lines[0])
+    lang = match.group(2) if match else ""
+    body = lines[1:]
+    if body and body[-1].strip() == match.group(1):
+        body = body[:-1]
+    code = "\n".join(body).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    header = f'<div style="color:#8b949e; font-size:10px;">{lang}</div>' if lang else ""
+    return (f'{header}<pre style="background:#161b22; border:1px solid #30363d; padding:6px; '
+            f'font-family:Consolas; font-size:11px; white-space:pre-wrap;">{code}</pre>')
+
+
+def _next_markdown_block(text, pos):
+    """
+    Localiza o bloco que começa em `pos`: (fim, é_código, completo).
+    Prosa termina após uma linha em branco ou antes de uma cerca ```;
+    código termina na linha da cerca de fechamento.
+    """
+    n = len(text)
+    line_end = text.find("\n", pos)
+    fence = _FENCE_RE.match(text, pos, line_end if line_end != -1 else n)
+    if fence:
+        marker = fence.group(1)
+        if line_end == -1:
+            return n, True, False
+        cursor = line_end + 1
+        while cursor < n:
+            line_end = text.find("\n", cursor)
+            if line_end == -1:
+                return n, True, False
+            if text[cursor:line_end].strip() == marker:
+                return line_end + 1, True, True
+            cursor = line_end + 1
+        return n, True, False
+
+    cursor = pos
+    while True:
+        line_end = text.find("\n", cursor)
+        if line_end == -1:
+            return n, False, False
+        cursor = line_end + 1
+        if cursor >= n:
+            return n, False, False
+        if text[cursor] == "\n":
+            return cursor + 1, False, True
+        # Linha seguinte parcial pode ainda virar uma cerca: espera mais texto
+        next_end = text.find("\n", cursor)
+        head = text[cursor:next_end if next_end != -1 else n]
+        if _FENCE_RE.match(head):
+            return cursor, False, True
+        if len(head.lstrip(" \t")) < 3 and next_end == -1:
+            return n, False, False
+
+
+def _render_markdown_block(block, is_code):
+    return _code_block_html(block) if is_code else _inline_markdown_to_html(block)
+
+
+class IncrementalMarkdownRenderer:
+    """
+    Renderizador de markdown para texto que só cresce (streaming).
+    Blocos completos ficam com o HTML em cache; a cada chamada só o bloco
+    final, ainda aberto, é renderizado de novo.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._done_src = ""
+        self._done_html = ""
+
+    def render(self, text):
+        if not text.startswith(self._done_src):
+            # Texto reescrito (não é continuação): recomeça do zero
+            self.reset()
+        pos = len(self._done_src)
+        parts = []
+        tail_html = ""
+        while pos < len(text):
+            end, is_code, complete = _next_markdown_block(text, pos)
+            html = _render_markdown_block(text[pos:end], is_code)
+            if not complete:
+                tail_html = html
+                break
+            parts.append(html)
+            pos = end
+        if parts:
+            self._done_src = text[:pos]
+            self._done_html += "".join(parts)
+        return self._done_html + tail_html
+
+
+def markdown_to_html(text):
+    """Converte markdown básico para HTML para exibição nos balões de chat."""
+    return IncrementalMarkdownRenderer().render(text)
+
+
+def _lex_line(lexer, text, stack):
+    """
+    Versão de RegexLexer.get_tokens_unprocessed que começa na pilha de estados
+    `stack` e devolve também a pilha final: (tokens, pilha).
+    A API pública não expõe a pilha final, então isto lê a tabela compilada
+    `lexer._tokens` (Pygments fixado em <3 no requirements.txt). Se o formato
+    mudar, o CodeHighlighter cai para o realce por linha da API pública.
+    """
+    tokens = []
+    pos = 0
+    tokendefs = lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    while True:
+        for rexmatch, action, new_state in statetokens:
+            m = rexmatch(text, pos)
+            if m:
+                if action is not None:
+                    if type(action) is _TOKEN_TYPE:
+                        tokens.append((pos, action, m.group()))
+                    else:
+                        tokens.extend(action(lexer, m))
+                pos = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == '#pop':
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                break
+        else:
+            if pos >= len(text):
+                break
+            if text[pos] == '\n':
+                # Fim de linha sem regra: volta para "root" (como o Pygments)
+                statestack = ['root']
+                statetokens = tokendefs['root']
+            pos += 1
+    return tokens, tuple(statestack)
+
+
 class CodeHighlighter(QSyntaxHighlighter):
+    """
+    Realce incremental: cada bloco (linha) guarda a pilha de estados do lexer
+    via setCurrentBlockState. Ao editar, o Qt re-realça o bloco e segue para
+    os próximos só enquanto o estado final mudar (strings/comentários de
+    várias linhas continuam corretos sem re-lexar o arquivo).
+    """
+    # Formatos compartilhados entre todos os editores (o tema é fixo)
+    _format_cache = {}
+    # Passadas longas (abrir arquivo grande, abrir uma string de várias
+    # linhas) são fatiadas: blocos além do orçamento ficam pendentes e são
+    # realçados nas próximas voltas do event loop
+    SLICE_MS = 30
+    PENDING_STATE = -2
+
     def __init__(self, parent, filename_or_ext):
         super().__init__(parent)
         self._lexer = None
@@ -76,24 +256,89 @@ class CodeHighlighter(QSyntaxHighlighter):
                     self._lexer = get_lexer_by_name(filename_or_ext)
             except:
                 pass
-        self.formats = {}
+        self.formats = self._format_cache
+        # Lexers com tabela de regex simples permitem retomar a partir de um estado;
+        # os demais (e tabelas num formato desconhecido) são realçados por linha
+        self._stateful = (PYGMENTS_AVAILABLE and isinstance(self._lexer, RegexLexer)
+                          and not isinstance(self._lexer, ExtendedRegexLexer)
+                          and isinstance(getattr(self._lexer, "_tokens", None), dict))
+        # Pilhas de estados <-> inteiros guardados nos blocos
+        self._stacks = [("root",)]
+        self._stack_ids = {("root",): 0}
+        self._slice_deadline = None
+        self._pending_from = None
+
+    def _stack_id(self, stack):
+        state = self._stack_ids.get(stack)
+        if state is None:
+            state = len(self._stacks)
+            self._stacks.append(stack)
+            self._stack_ids[stack] = state
+        return state
+
+    def _over_budget(self):
+        now = time.perf_counter()
+        if self._slice_deadline is None:
+            self._slice_deadline = now + self.SLICE_MS / 1000.0
+            QTimer.singleShot(0, self._end_slice)
+            return False
+        return now > self._slice_deadline
+
+    def _end_slice(self):
+        self._slice_deadline = None
+
+    def _defer_block(self):
+        """Marca o bloco atual como pendente e agenda a continuação."""
+        number = self.currentBlock().blockNumber()
+        if self._pending_from is None:
+            QTimer.singleShot(0, self._resume)
+        if self._pending_from is None or number < self._pending_from:
+            self._pending_from = number
+        self.setCurrentBlockState(self.PENDING_STATE)
+
+    def _resume(self):
+        number, self._pending_from = self._pending_from, None
+        document = self.document()
+        if number is None or document is None:
+            return
+        block = document.findBlockByNumber(number)
+        if block.isValid() and block.userState() == self.PENDING_STATE:
+            self.rehighlightBlock(block)
 
     def highlightBlock(self, text):
         if not self._lexer: return
-        lexer = self._lexer
-        for token, content in lexer.get_tokens(text):
-            length = len(content)
-            idx = 0
-            while True:
-                idx = text.find(content, idx)
-                if idx == -1: break
-                fmt = self.get_format(token)
-                self.setFormat(idx, length, fmt)
-                idx += length
+        if self._over_budget() or self.previousBlockState() == self.PENDING_STATE:
+            self._defer_block()
+            return
+        if not self._stateful:
+            self._highlight_line(text)
+            return
+
+        previous = self.previousBlockState()
+        stack = self._stacks[previous] if 0 <= previous < len(self._stacks) else ("root",)
+        try:
+            tokens, stack = _lex_line(self._lexer, text + "\n", stack)
+        except Exception:
+            # Tabela interna do Pygments num formato inesperado: API pública por linha
+            self._stateful = False
+            self._highlight_line(text)
+            return
+        length = len(text)
+        for index, token, content in tokens:
+            if index >= length:
                 break
+            self.setFormat(index, min(len(content), length - index), self.get_format(token))
+        self.setCurrentBlockState(self._stack_id(stack))
+
+    def _highlight_line(self, text):
+        """Realce da linha isolada pela API pública (sem estado entre linhas)."""
+        for index, token, content in self._lexer.get_tokens_unprocessed(text):
+            self.setFormat(index, len(content), self.get_format(token))
+        self.setCurrentBlockState(0)
 
     def get_format(self, token):
-        if token in self.formats: return self.formats[token]
+        fmt = self.formats.get(token)
+        if fmt is not None: return fmt
         fmt = QTextCharFormat()
         if token in Token.Keyword: fmt.setForeground(QColor("#569cd6"))
         elif token in Token.Name.Function: fmt.setForeground(QColor("#dcdcaa"))
@@ -106,9 +351,17 @@ class CodeHighlighter(QSyntaxHighlighter):
         return fmt
 
 class ExecutionThread(QThread):
+    """
+    Executa um comando e repassa a saída em lotes: uma thread leitora faz
+    leituras grandes e bloqueantes do pipe (funciona também no Windows, onde
+    select não aceita pipes) e esta thread emite o acumulado a cada intervalo.
+    """
     output_ready = pyqtSignal(str)
     finished_execution = pyqtSignal(int)
 
+    READ_CHUNK = 65536
+    FLUSH_INTERVAL = 0.016
+
     def __init__(self, command, cwd):
         super().__init__()
         self.command = command
@@ -129,25 +382,61 @@ class ExecutionThread(QThread):
                 env=env,
                 bufsize=0
             )
-            buffer = bytearray()
-            while True:
-                char = process.stdout.read(1)
-                if not char and process.poll() is not None:
-                    if buffer:
-                        self.output_ready.emit(buffer.decode('utf-8', errors='replace'))
-                    break
-                if char:
-                    buffer.extend(char)
-                    if char in (b'\n', b'\r') or len(buffer) > 100:
-                        self.output_ready.emit(buffer.decode('utf-8', errors='replace'))
-                        buffer.clear()
-                        
+            self._pump(process.stdout)
             process.wait()
             self.finished_execution.emit(process.returncode)
         except Exception as e:
             self.output_ready.emit(f"Erro na execução: {e}\n")
             self.finished_execution.emit(-1)
 
+    def _pump(self, stream):
+        """Lê o pipe em blocos e emite no máximo um sinal por FLUSH_INTERVAL."""
+        chunks = []
+        state = {"eof": False}
+        cond = threading.Condition()
+
+        def reader():
+            fd = stream.fileno()
+            try:
+                while True:
+                    data = os.read(fd, self.READ_CHUNK)
+                    with cond:
+                        if not data:
+                            break
+                        chunks.append(data)
+                        cond.notify()
+            except OSError:
+                pass
+            finally:
+                with cond:
+                    state["eof"] = True
+                    cond.notify()
+
+        threading.Thread(target=reader, daemon=True).start()
+        # Decodificador incremental: caractere UTF-8 dividido entre leituras não vira lixo
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        last_emit = 0.0
+        while True:
+            with cond:
+                while not chunks and not state["eof"]:
+                    cond.wait()
+                # Junta o que chegar até completar o intervalo desde o último envio
+                deadline = last_emit + self.FLUSH_INTERVAL
+                while not state["eof"]:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    cond.wait(remaining)
+                data = b"".join(chunks)
+                chunks.clear()
+                eof = state["eof"]
+            text = decoder.decode(data, final=eof)
+            if text:
+                self.output_ready.emit(text)
+                last_emit = time.monotonic()
+            if eof:
+                break
+
 class AboutDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -251,110 +540,380 @@ class ActivityBar(QFrame):
         return f"QToolButton {{ color: {color}; font-size: 20px; border: none; background-color: #333333; border-left: 2px solid {color}; }}"
 
 
-class ChatMessage(QFrame):
-    action_clicked = pyqtSignal(str)
+_ACTIONS_RE = re.compile(r"<!--ACTIONS:\s*(\[.*?\])\s*-->")
 
-    def __init__(self, sender, text, is_user=False, parent=None):
+
+def split_chat_actions(text):
+    """Separa a tag <!--ACTIONS: [...]--> do texto: (texto, lista de ações)."""
+    if "<!--ACTIONS" not in text:
+        return text, []
+    match = _ACTIONS_RE.search(text)
+    if not match:
+        return text, []
+    try:
+        actions = json.loads(match.group(1))
+    except ValueError:
+        return text, []
+    return text.replace(match.group(0), "").strip(), actions
+
+
+class _TranscriptRow:
+    """Estado de exibição de uma linha: HTML em cache e altura medida."""
+
+    __slots__ = ("text", "html", "actions", "version", "renderer", "height", "height_key", "measured")
+
+    def __init__(self):
+        self.text = None
+        self.html = None
+        self.actions = []
+        self.version = 0
+        self.renderer = None
+        self.height = 0
+        self.height_key = None
+        self.measured = False
+
+    def get_html(self):
+        """HTML da mensagem, gerado só na primeira vez que a linha é pintada."""
+        if self.html is None:
+            self.html = markdown_to_html(self.text)
+        return self.html
+
+
+class ChatTranscriptModel(QAbstractListModel):
+    """
+    Modelo do transcript do chat sobre a lista de mensagens da sessão.
+    O HTML de cada mensagem é gerado sob demanda (só quando a linha é pintada).
+    """
+    SenderRole = Qt.ItemDataRole.UserRole + 1
+    IsUserRole = Qt.ItemDataRole.UserRole + 2
+    HtmlRole = Qt.ItemDataRole.UserRole + 3
+    ActionsRole = Qt.ItemDataRole.UserRole + 4
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.layout = QVBoxLayout(self)
-        self.layout.setContentsMargins(10, 5, 10, 5)
-        align = Qt.AlignmentFlag.AlignRight if is_user else Qt.AlignmentFlag.AlignLeft
-        self.layout.setAlignment(align)
-        
-        self.bubble = QWidget()
-        self.bubble_layout = QVBoxLayout(self.bubble)
-        self.bubble_layout.setContentsMargins(10, 8, 10, 8)
-        self.bubble_layout.setSpacing(4)
-        bg_color = "#1f6feb" if is_user else "#21262d"
-        self.bubble.setStyleSheet(f"background-color: {bg_color}; border-radius: 8px; border: 1px solid #30363d;")
-        self.bubble.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
-        
-        sender_label = QLabel(sender)
-        sender_label.setStyleSheet(f"font-weight: bold; color: {'#7dd3fc' if is_user else '#c9d1d9'}; font-size: 10px;")
-        
-        self.text_label = QLabel()
-        self.text_label.setTextFormat(Qt.TextFormat.RichText)
-        self.text_label.setWordWrap(True)
-        self.text_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        self.text_label.setStyleSheet("color: #f0f6fc; font-size: 12px; line-height: 1.3; background: transparent; border: none;")
-        self.text_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
-        
-        self.actions_container = QWidget()
-        self.actions_layout = QVBoxLayout(self.actions_container)
-        self.actions_layout.setContentsMargins(0, 5, 0, 0)
-        self.actions_layout.setSpacing(5)
-        self.actions_container.setVisible(False)
-        self.actions_container.setStyleSheet("background: transparent;")
-
-        self.bubble_layout.addWidget(sender_label)
-        self.bubble_layout.addWidget(self.text_label)
-        self.bubble_layout.addWidget(self.actions_container)
-        
-        self.layout.addWidget(self.bubble)
-        
-        self.eff = QGraphicsOpacityEffect(self)
-        self.setGraphicsEffect(self.eff)
-        self.anim = QPropertyAnimation(self.eff, b"opacity")
-        self.anim.setDuration(300)
-        self.anim.setStartValue(0)
-        self.anim.setEndValue(1)
-        self.anim.start()
-
-        self.update_text(text)
+        self._messages = []
+        self._rows = []
 
-    def update_text(self, new_text):
-        """Atualiza o texto do balão (usado para streaming de IA)."""
-        import re, json
-        # Buscar por tags <!--ACTIONS: [...]-->
-        match = re.search(r"<!--ACTIONS:\s*(\[.*?\])\s*-->", new_text)
-        actions = []
-        if match:
-            try:
-                actions = json.loads(match.group(1))
-                new_text = new_text.replace(match.group(0), "").strip()
-            except:
-                pass
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._messages)
 
-        html_text = markdown_to_html(new_text)
-        self.text_label.setText(html_text)
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._messages):
+            return None
+        record = self._messages[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.row_state(index.row()).text
+        if role == self.SenderRole:
+            return record.get("sender", "?")
+        if role == self.IsUserRole:
+            return bool(record.get("is_user", False))
+        if role == self.HtmlRole:
+            return self.row_state(index.row()).get_html()
+        if role == self.ActionsRole:
+            return self.row_state(index.row()).actions
+        return None
 
-        # Atualizar botões
-        # Limpar botões antigos
-        while self.actions_layout.count():
-            item = self.actions_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-        
+    def row_state(self, row):
+        """Estado de exibição da linha (texto sem a tag de ações, altura em cache)."""
+        state = self._rows[row]
+        if state is None:
+            state = _TranscriptRow()
+            self._rows[row] = state
+        if state.text is None:
+            state.text, state.actions = split_chat_actions(self._messages[row].get("text", ""))
+        return state
+
+    def set_messages(self, messages):
+        """Passa a exibir `messages` (a própria lista da sessão, sem cópia)."""
+        self.beginResetModel()
+        self._messages = messages
+        self._rows = [None] * len(messages)
+        self.endResetModel()
+
+    def append_message(self, record):
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append(record)
+        self._rows.append(None)
+        self.endInsertRows()
+        return row
+
+    def row_of(self, record):
+        """Linha de `record` (busca a partir do fim: o streaming é na última)."""
+        for row in range(len(self._messages) - 1, -1, -1):
+            if self._messages[row] is record:
+                return row
+        return -1
+
+    def set_display_text(self, record, text):
+        """Atualiza o texto exibido de uma mensagem (re-render incremental)."""
+        row = self.row_of(record)
+        if row < 0:
+            return
+        state = self._rows[row] or _TranscriptRow()
+        self._rows[row] = state
+        if state.renderer is None:
+            state.renderer = IncrementalMarkdownRenderer()
+        text, state.actions = split_chat_actions(text)
+        state.text = text
+        state.html = state.renderer.render(text)
+        state.version += 1
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+
+class ChatMessageDelegate(QStyledItemDelegate):
+    """
+    Pinta os balões do chat direto no viewport, sem um widget por mensagem.
+    Linhas ainda não pintadas usam uma altura estimada; ao pintar, a altura
+    real é medida, guardada na linha e o layout é corrigido se mudou.
+    """
+    action_clicked = pyqtSignal(str)
+
+    MARGIN_H = 10
+    MARGIN_V = 5
+    PADDING_H = 10
+    PADDING_V = 8
+    SPACING = 4
+    BUTTON_HEIGHT = 26
+    BUTTON_SPACING = 5
+    DOC_CACHE_SIZE = 256
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.sender_font = QFont(view.font())
+        self.sender_font.setPixelSize(10)
+        self.sender_font.setBold(True)
+        self.text_font = QFont(view.font())
+        self.text_font.setPixelSize(12)
+        self.button_font = QFont(view.font())
+        self.button_font.setBold(True)
+        self._text_metrics = QFontMetrics(self.text_font)
+        self._sender_height = QFontMetrics(self.sender_font).height()
+        self._docs = OrderedDict()
+        self._relayout_pending = False
+
+    def clear_cache(self):
+        self._docs.clear()
+
+    def _text_width(self):
+        width = self.view.viewport().width()
+        return max(50, width - 2 * (self.MARGIN_H + self.PADDING_H))
+
+    def _chrome_height(self, actions):
+        height = 2 * (self.MARGIN_V + self.PADDING_V) + self._sender_height + self.SPACING
         if actions:
-            self.actions_container.setVisible(True)
-            for action in actions:
-                btn = QPushButton(action)
-                btn.setStyleSheet("QPushButton { background-color: #238636; color: white; border: 1px solid #2ea043; border-radius: 4px; padding: 4px 8px; font-weight: bold; } QPushButton:hover { background-color: #2ea043; }")
-                if "Negado" in action or "❌" in action:
-                    btn.setStyleSheet("QPushButton { background-color: #da3633; color: white; border: 1px solid #f85149; border-radius: 4px; padding: 4px 8px; font-weight: bold; } QPushButton:hover { background-color: #f85149; }")
-                elif "Sempre" in action or "🔄" in action:
-                    btn.setStyleSheet("QPushButton { background-color: #1f6feb; color: white; border: 1px solid #388bfd; border-radius: 4px; padding: 4px 8px; font-weight: bold; } QPushButton:hover { background-color: #388bfd; }")
-                
-                btn.clicked.connect(lambda checked, a=action: self.action_clicked.emit(a))
-                self.actions_layout.addWidget(btn)
-            self.actions_layout.addStretch()
-        else:
-            self.actions_container.setVisible(False)
+            height += self.BUTTON_SPACING + len(actions) * (self.BUTTON_HEIGHT + self.BUTTON_SPACING)
+        return height
+
+    def _estimate_text_height(self, text, width):
+        char_width = max(1, self._text_metrics.averageCharWidth())
+        per_line = max(1, width // char_width)
+        lines = 0
+        for line in text.split("\n"):
+            lines += max(1, -(-len(line) // per_line))
+        return lines * self._text_metrics.lineSpacing() + 8
+
+    def _document(self, state, width):
+        """QTextDocument da linha (LRU limitado às linhas pintadas recentemente)."""
+        key = id(state)
+        cached = self._docs.get(key)
+        if cached is not None and cached[0] == state.version and cached[1] == width:
+            self._docs.move_to_end(key)
+            return cached[2]
+        doc = QTextDocument()
+        doc.setDefaultFont(self.text_font)
+        doc.setDocumentMargin(0)
+        doc.setHtml(state.get_html())
+        doc.setTextWidth(width)
+        self._docs[key] = (state.version, width, doc)
+        self._docs.move_to_end(key)
+        while len(self._docs) > self.DOC_CACHE_SIZE:
+            self._docs.popitem(last=False)
+        return doc
+
+    def _schedule_relayout(self):
+        """
+        sizeHintChanged refaz o layout de todas as linhas: várias medições
+        no mesmo ciclo de pintura viram um único relayout.
+        """
+        if not self._relayout_pending:
+            self._relayout_pending = True
+            QTimer.singleShot(0, self._emit_relayout)
+
+    def _emit_relayout(self):
+        self._relayout_pending = False
+        self.sizeHintChanged.emit(QModelIndex())
+
+    def sizeHint(self, option, index):
+        state = index.model().row_state(index.row())
+        width = self._text_width()
+        key = (state.version, width)
+        if state.height_key != key:
+            if id(state) in self._docs:
+                # Linha pintada recentemente (ex.: streaming): mede de verdade
+                doc_height = int(self._document(state, width).size().height()) + 1
+                state.height = self._chrome_height(state.actions) + doc_height
+                state.measured = True
+            else:
+                state.height = self._chrome_height(state.actions) + self._estimate_text_height(state.text, width)
+                state.measured = False
+            state.height_key = key
+        return QSize(self.view.viewport().width(), state.height)
+
+    def _button_rects(self, bubble, doc_height, actions):
+        top = bubble.top() + self.PADDING_V + self._sender_height + self.SPACING + doc_height + self.BUTTON_SPACING
+        rects = []
+        for _ in actions:
+            rects.append(QRect(bubble.left() + self.PADDING_H, top, bubble.width() - 2 * self.PADDING_H, self.BUTTON_HEIGHT))
+            top += self.BUTTON_HEIGHT + self.BUTTON_SPACING
+        return rects
+
+    def paint(self, painter, option, index):
+        state = index.model().row_state(index.row())
+        is_user = index.data(ChatTranscriptModel.IsUserRole)
+        width = self._text_width()
+        doc = self._document(state, width)
+        doc_height = int(doc.size().height()) + 1
+
+        # Altura real: corrige a estimativa usada no layout
+        height = self._chrome_height(state.actions) + doc_height
+        key = (state.version, width)
+        if not state.measured or state.height_key != key or state.height != height:
+            changed = state.height != height or state.height_key != key
+            state.height, state.height_key, state.measured = height, key, True
+            if changed:
+                self._schedule_relayout()
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        bubble = option.rect.adjusted(self.MARGIN_H, self.MARGIN_V, -self.MARGIN_H, -self.MARGIN_V)
+        painter.setPen(QColor("#30363d"))
+        painter.setBrush(QColor("#1f6feb" if is_user else "#21262d"))
+        painter.drawRoundedRect(bubble, 8, 8)
+
+        painter.setFont(self.sender_font)
+        painter.setPen(QColor("#7dd3fc" if is_user else "#c9d1d9"))
+        sender_rect = QRect(bubble.left() + self.PADDING_H, bubble.top() + self.PADDING_V,
+                            bubble.width() - 2 * self.PADDING_H, self._sender_height)
+        painter.drawText(sender_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                         index.data(ChatTranscriptModel.SenderRole))
+
+        painter.translate(sender_rect.left(), sender_rect.bottom() + 1 + self.SPACING)
+        ctx = QAbstractTextDocumentLayout.PaintContext()
+        ctx.palette.setColor(QPalette.ColorRole.Text, QColor("#f0f6fc"))
+        doc.documentLayout().draw(painter, ctx)
+        painter.translate(-sender_rect.left(), -(sender_rect.bottom() + 1 + self.SPACING))
+
+        painter.setFont(self.button_font)
+        for rect, action in zip(self._button_rects(bubble, doc_height, state.actions), state.actions):
+            bg, border = "#238636", "#2ea043"
+            if "Negado" in action or "❌" in action:
+                bg, border = "#da3633", "#f85149"
+            elif "Sempre" in action or "🔄" in action:
+                bg, border = "#1f6feb", "#388bfd"
+            painter.setPen(QColor(border))
+            painter.setBrush(QColor(bg))
+            painter.drawRoundedRect(rect, 4, 4)
+            painter.setPen(QColor("white"))
+            painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, action)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        """Clique nos botões de ação pintados emite action_clicked."""
+        if event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            state = model.row_state(index.row())
+            if state.actions:
+                doc = self._document(state, self._text_width())
+                bubble = option.rect.adjusted(self.MARGIN_H, self.MARGIN_V, -self.MARGIN_H, -self.MARGIN_V)
+                rects = self._button_rects(bubble, int(doc.size().height()) + 1, state.actions)
+                for rect, action in zip(rects, state.actions):
+                    if rect.contains(event.position().toPoint()):
+                        self.action_clicked.emit(action)
+                        return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ChatMessage(QObject):
+    """
+    Referência a uma mensagem do transcript, usada para atualizá-la
+    (streaming da IA). O re-render é limitado a um por intervalo.
+    """
+    # Intervalo minimo entre re-renders durante o streaming
+    STREAM_RENDER_INTERVAL_MS = 50
+
+    def __init__(self, model, record, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.record = record
+        self.text = record.get("text", "")
+        self._render_pending = False
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.setInterval(self.STREAM_RENDER_INTERVAL_MS)
+        self._render_timer.timeout.connect(self._flush_render)
+
+    def begin_stream(self):
+        """Prepara a mensagem para receber chunks (o primeiro substitui o placeholder)."""
+        self.text = ""
+        self._render_pending = False
+
+    def append_text(self, chunk):
+        """Acrescenta um chunk do streaming; no maximo um re-render por intervalo."""
+        self.text += chunk
+        if self._render_timer.isActive():
+            self._render_pending = True
+            return
+        # Primeiro chunk renderiza na hora: o time-to-first-token e o que o usuario ve
+        self.update_text(self.text)
+        self._render_timer.start()
+
+    def finish_stream(self):
+        """Renderiza o texto final imediatamente, descartando o re-render agendado."""
+        self._render_timer.stop()
+        self._render_pending = False
+        self.update_text(self.text)
+
+    def _flush_render(self):
+        if self._render_pending:
+            self._render_pending = False
+            self.update_text(self.text)
+            self._render_timer.start()
+
+    def update_text(self, new_text):
+        """Atualiza o texto exibido; só o bloco final do markdown é refeito."""
+        self.model.set_display_text(self.record, new_text)
 
 
 class ChatHistoryPanel(QWidget):
-    """Painel de histórico de conversas para a sidebar com persistência JSON."""
+    """Painel de histórico de conversas para a sidebar, persistido em SQLite."""
     
     session_selected = pyqtSignal(str)  # Emite session_id ao clicar
     new_chat_requested = pyqtSignal()
+    # Emitido pela thread de persistência; entregue na thread da interface
+    _session_saved = pyqtSignal(dict)
     
-    def __init__(self, parent=None):
+    PAGE_SIZE = 50
+    SEARCH_DEBOUNCE_MS = 200
+    
+    def __init__(self, parent=None, persistence=None):
         super().__init__(parent)
-        self._sessions_dir = os.path.join(
+        self._persistence = persistence
+        data_dir = os.path.join(
             QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation) or tempfile.gettempdir(),
-            "ai_code_assistant", "chat_sessions"
+            "ai_code_assistant"
         )
-        os.makedirs(self._sessions_dir, exist_ok=True)
+        # Diretório do formato antigo (um JSON por sessão), importado uma única vez
+        self._sessions_dir = os.path.join(data_dir, "chat_sessions")
+        self.store = ChatHistoryStore(os.path.join(data_dir, "chat_history.db"))
+        self.store.import_json_sessions(self._sessions_dir)
+        
+        self._items = {}          # session_id -> QListWidgetItem
+        self._loaded = 0          # sessões já carregadas na lista (paginação)
+        self._exhausted = False
+        self._search_query = ""
+        self._session_saved.connect(self._move_to_top)
         
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
@@ -382,6 +941,27 @@ class ChatHistoryPanel(QWidget):
         
         layout.addWidget(header)
         
+        # Busca em todas as conversas (com debounce para não consultar a cada tecla)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("🔍 Buscar nas conversas...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.setStyleSheet("""
+            QLineEdit {
+                background-color: #0d1117;
+                border: none;
+                border-bottom: 1px solid #30363d;
+                color: #c9d1d9;
+                font-size: 12px;
+                padding: 6px 10px;
+            }
+        """)
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+        self._search_timer.timeout.connect(self._run_search)
+        self.search_input.textChanged.connect(self._search_timer.start)
+        layout.addWidget(self.search_input)
+        
         # Lista de sessões com scroll
         self.session_list = QListWidget()
         self.session_list.setStyleSheet("""
@@ -418,137 +998,162 @@ class ChatHistoryPanel(QWidget):
             }
         """)
         self.session_list.itemClicked.connect(self._on_item_clicked)
+        self.session_list.verticalScrollBar().valueChanged.connect(self._on_list_scrolled)
         layout.addWidget(self.session_list)
         
-        # Carregar sessões existentes
+        # Carregar a primeira página de sessões
         self._load_session_list()
     
-    def _get_sessions_index_path(self):
-        return os.path.join(self._sessions_dir, "sessions_index.json")
+    @staticmethod
+    def _format_item_text(session, snippet=""):
+        title = session.get("title", "Conversa sem título")
+        date_str = session.get("updated_at", "")
+        try:
+            friendly_date = datetime.fromisoformat(date_str).strftime("%d/%m %H:%M")
+        except (TypeError, ValueError):
+            friendly_date = ""
+        lines = [title]
+        if snippet:
+            lines.append(snippet.replace("\n", " "))
+        if friendly_date:
+            lines.append(friendly_date)
+        return "\n".join(lines)
+    
+    def _make_item(self, session, snippet=""):
+        session_id = session.get("id", "")
+        item = QListWidgetItem(self._format_item_text(session, snippet))
+        item.setData(Qt.ItemDataRole.UserRole, session_id)
+        item.setToolTip(f"Sessão: {session_id}\n{session.get('updated_at', '')}")
+        self._items[session_id] = item
+        return item
     
     def _load_session_list(self):
-        """Carrega a lista de sessões do disco."""
+        """Recarrega a lista a partir da primeira página (ou refaz a busca ativa)."""
+        if self._search_query:
+            self._run_search()
+            return
         self.session_list.clear()
-        index_path = self._get_sessions_index_path()
-        if not os.path.exists(index_path):
+        self._items = {}
+        self._loaded = 0
+        self._exhausted = False
+        self._load_next_page()
+    
+    def _load_next_page(self):
+        """Anexa a próxima página de sessões ao final da lista."""
+        if self._exhausted or self._search_query:
             return
-        
         try:
-            with open(index_path, 'r', encoding='utf-8') as f:
-                sessions = json.load(f)
-            
-            # Ordenar por data (mais recente primeiro)
-            sessions.sort(key=lambda s: s.get("updated_at", ""), reverse=True)
-            
-            for session in sessions:
-                title = session.get("title", "Conversa sem título")
-                date_str = session.get("updated_at", "")
-                session_id = session.get("id", "")
-                
-                # Formatar data amigável
-                try:
-                    dt = datetime.fromisoformat(date_str)
-                    friendly_date = dt.strftime("%d/%m %H:%M")
-                except:
-                    friendly_date = ""
-                
-                display = f"{title}\n{friendly_date}" if friendly_date else title
-                item = QListWidgetItem(display)
-                item.setData(Qt.ItemDataRole.UserRole, session_id)
-                item.setToolTip(f"Sessão: {session_id}\n{date_str}")
-                self.session_list.addItem(item)
+            page = self.store.list_sessions(self._loaded, self.PAGE_SIZE)
         except Exception as e:
             print(f"Erro ao carregar histórico: {e}")
+            return
+        self._loaded += len(page)
+        self._exhausted = len(page) < self.PAGE_SIZE
+        for session in page:
+            if session["id"] not in self._items:
+                self.session_list.addItem(self._make_item(session))
+    
+    def _on_list_scrolled(self, value):
+        bar = self.session_list.verticalScrollBar()
+        if value >= bar.maximum() - bar.pageStep() // 2:
+            self._load_next_page()
+    
+    def _run_search(self):
+        """Mostra as conversas que casam com a busca (FTS no texto e no título)."""
+        self._search_query = self.search_input.text().strip()
+        if not self._search_query:
+            self._load_session_list()
+            return
+        try:
+            results = self.store.search(self._search_query, limit=self.PAGE_SIZE * 2)
+        except Exception as e:
+            print(f"Erro na busca do histórico: {e}")
+            results = []
+        self.session_list.clear()
+        self._items = {}
+        for session in results:
+            self.session_list.addItem(self._make_item(session, session.get("snippet", "")))
     
     def _on_item_clicked(self, item):
         session_id = item.data(Qt.ItemDataRole.UserRole)
         if session_id:
             self.session_selected.emit(session_id)
     
+    def _move_to_top(self, session):
+        """Atualiza só o item da sessão salva, levando-o ao topo da lista."""
+        if self._search_query:
+            return
+        item = self._items.pop(session["id"], None)
+        if item is not None:
+            self.session_list.takeItem(self.session_list.row(item))
+        else:
+            self._loaded += 1
+        self.session_list.insertItem(0, self._make_item(session))
+    
     def save_session(self, session_id, title, messages):
-        """Salva uma sessão de chat no disco."""
-        # Salvar mensagens da sessão
-        session_file = os.path.join(self._sessions_dir, f"{session_id}.json")
-        session_data = {
-            "id": session_id,
-            "title": title,
-            "messages": messages,
-            "updated_at": datetime.now().isoformat()
-        }
+        """Salva uma sessão de chat (só as mensagens novas ou alteradas)."""
         try:
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(session_data, f, ensure_ascii=False, indent=2)
+            session = self.store.save_session(session_id, title, messages)
         except Exception as e:
             print(f"Erro ao salvar sessão: {e}")
             return
+        self._move_to_top(session)
+    
+    def schedule_save(self, session_id, title, messages):
+        """Agenda a gravação em background; saves em rajada viram uma escrita só."""
+        if self._persistence is None:
+            self.save_session(session_id, title, messages)
+            return
         
-        # Atualizar índice
-        index_path = self._get_sessions_index_path()
-        sessions = []
-        if os.path.exists(index_path):
-            try:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    sessions = json.load(f)
-            except:
-                sessions = []
-        
-        # Atualizar ou adicionar
-        found = False
-        for s in sessions:
-            if s.get("id") == session_id:
-                s["title"] = title
-                s["updated_at"] = datetime.now().isoformat()
-                found = True
-                break
-        if not found:
-            sessions.append({
-                "id": session_id,
-                "title": title,
-                "updated_at": datetime.now().isoformat()
-            })
-        
-        try:
-            with open(index_path, 'w', encoding='utf-8') as f:
-                json.dump(sessions, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Erro ao salvar índice: {e}")
+        def write():
+            # Roda na thread do worker: lê a lista da sessão no momento da escrita
+            self._session_saved.emit(self.store.save_session(session_id, title, messages))
         
-        self._load_session_list()
+        self._persistence.submit(f"chat:{session_id}", write)
     
     def load_session(self, session_id):
         """Carrega mensagens de uma sessão."""
-        session_file = os.path.join(self._sessions_dir, f"{session_id}.json")
-        if not os.path.exists(session_file):
-            return None
+        if self._persistence is not None:
+            # Uma gravação pendente desta sessão precisa chegar ao banco antes
+            self._persistence.flush()
         try:
-            with open(session_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
+            return self.store.load_session(session_id)
+        except Exception as e:
+            print(f"Erro ao carregar sessão: {e}")
             return None
     
+    def rename_session(self, session_id, title):
+        """Renomeia uma sessão e atualiza o item correspondente na lista."""
+        try:
+            if not self.store.rename_session(session_id, title):
+                return False
+        except Exception as e:
+            print(f"Erro ao renomear: {e}")
+            return False
+        item = self._items.get(session_id)
+        session = self.store.get_session(session_id)
+        if item is not None and session:
+            item.setText(self._format_item_text(session))
+        return True
+    
     def delete_session(self, session_id):
-        """Remove uma sessão do disco."""
-        session_file = os.path.join(self._sessions_dir, f"{session_id}.json")
+        """Remove uma sessão do histórico."""
         try:
-            os.remove(session_file)
-        except:
-            pass
-        
-        index_path = self._get_sessions_index_path()
-        if os.path.exists(index_path):
-            try:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    sessions = json.load(f)
-                sessions = [s for s in sessions if s.get("id") != session_id]
-                with open(index_path, 'w', encoding='utf-8') as f:
-                    json.dump(sessions, f, ensure_ascii=False, indent=2)
-            except:
-                pass
-        self._load_session_list()
+            self.store.delete_session(session_id)
+        except Exception as e:
+            print(f"Erro ao remover sessão: {e}")
+        item = self._items.pop(session_id, None)
+        if item is not None:
+            self.session_list.takeItem(self.session_list.row(item))
+            self._loaded = max(0, self._loaded - 1)
 
 
 class InteractiveTerminalWidget(QWidget):
     """Terminal Interativo usando QProcess — suporta stdin/stdout em tempo real."""
+    MAX_OUTPUT_LINES = 5000
+    # Linhas extras toleradas antes de cortar (o corte é feito em blocos)
+    TRIM_SLACK_LINES = 500
+    FLUSH_INTERVAL_MS = 16
     
     def __init__(self):
         super().__init__()
@@ -564,6 +1169,16 @@ class InteractiveTerminalWidget(QWidget):
         self.output.setReadOnly(False)
         layout.addWidget(self.output)
         
+        # Saída em lotes (um insert por intervalo) e limitada a MAX_OUTPUT_LINES
+        self._pending_output = []
+        self._truncated_lines = 0
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self._flush_timer.timeout.connect(self._flush_output)
+        self._stdout_decoder = None
+        self._stderr_decoder = None
+        
         self.process = None
         self._script_process = None
         self.current_cwd = os.getcwd()
@@ -649,14 +1264,15 @@ class InteractiveTerminalWidget(QWidget):
                 cmd = cmd[len(prefix):]
                 break
         
+        self._flush_output()
         self.output.moveCursor(cursor.MoveOperation.End)
         self.output.insertPlainText("\n")
         if not cmd: return
 
         self.output.insertPlainText(f"> {cmd}\n")
         thread = ExecutionThread(cmd, self.current_cwd)
-        thread.output_ready.connect(lambda l: self.output.insertPlainText(l))
-        thread.finished_execution.connect(lambda c: self.output.insertPlainText(f"\nExit: {c}\n> "))
+        thread.output_ready.connect(self.append_output)
+        thread.finished_execution.connect(lambda c: self.append_output(f"\nExit: {c}\n> "))
         thread.start()
         self.last_thread = thread
 
@@ -670,6 +1286,9 @@ class InteractiveTerminalWidget(QWidget):
             self._script_process.kill()
             self._script_process.waitForFinished(1000)
         
+        self._flush_output()
+        self._stdout_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._stderr_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
         self._script_process = QProcess(self)
         self._script_process.setWorkingDirectory(work_dir)
         
@@ -706,24 +1325,59 @@ class InteractiveTerminalWidget(QWidget):
         
         self._waiting_input = True
 
+    def append_output(self, text):
+        """Enfileira saída de processo; vai para a tela em lotes a cada FLUSH_INTERVAL_MS."""
+        if not text:
+            return
+        self._pending_output.append(text)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _flush_output(self):
+        if not self._pending_output:
+            return
+        text = "".join(self._pending_output)
+        self._pending_output.clear()
+        self.output.moveCursor(QTextCursor.MoveOperation.End)
+        self.output.insertPlainText(text)
+        self._trim_output()
+        self.output.moveCursor(QTextCursor.MoveOperation.End)
+
+    def _trim_output(self):
+        """Descarta as linhas mais antigas e mantém um marcador com o total cortado."""
+        doc = self.output.document()
+        first = 1 if self._truncated_lines else 0
+        excess = doc.blockCount() - first - self.MAX_OUTPUT_LINES
+        if excess < self.TRIM_SLACK_LINES:
+            return
+        cursor = QTextCursor(doc.findBlockByNumber(first))
+        cursor.setPosition(doc.findBlockByNumber(first + excess).position(), QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        self._truncated_lines += excess
+
+        marker = f"[... {self._truncated_lines} linhas truncadas ...]"
+        cursor = QTextCursor(doc.firstBlock())
+        if first:
+            cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock, QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(marker)
+        else:
+            cursor.insertText(marker + "\n")
+
     def _on_script_stdout(self):
         if self._script_process:
             data = self._script_process.readAllStandardOutput()
-            text = bytes(data).decode("utf-8", errors="replace")
-            self.output.moveCursor(QTextCursor.MoveOperation.End)
-            self.output.insertPlainText(text)
-            self.output.moveCursor(QTextCursor.MoveOperation.End)
+            self.append_output(self._stdout_decoder.decode(bytes(data)))
 
     def _on_script_stderr(self):
         if self._script_process:
             data = self._script_process.readAllStandardError()
-            text = bytes(data).decode("utf-8", errors="replace")
-            self.output.moveCursor(QTextCursor.MoveOperation.End)
-            self.output.insertPlainText(text)
-            self.output.moveCursor(QTextCursor.MoveOperation.End)
+            self.append_output(self._stderr_decoder.decode(bytes(data)))
 
     def _on_script_finished(self, exit_code, exit_status):
         self._waiting_input = False
+        self.append_output(self._stdout_decoder.decode(b"", final=True))
+        self.append_output(self._stderr_decoder.decode(b"", final=True))
+        self._flush_output()
         self.output.moveCursor(QTextCursor.MoveOperation.End)
         status_text = "sucesso" if exit_code == 0 else f"código {exit_code}"
         self.output.insertPlainText(f"\n> Execução finalizada ({status_text}).\n> ")
@@ -777,7 +1431,7 @@ class ChatInput(QTextEdit):
 
 
 class AIStreamThread(QThread):
-    """Thread para streaming de respostas da IA"""
+    """Thread para streaming de respostas da IA (emite cada chunk conforme chega)"""
     chunk_ready = pyqtSignal(str)
     finished_streaming = pyqtSignal()
     error_occurred = pyqtSignal(str)
@@ -794,16 +1448,17 @@ class AIStreamThread(QThread):
             full_message = self.message
             if self.system_prompt:
                 full_message = f"[Sistema: {self.system_prompt}]\n\nUsuario: {self.message}"
-            response = self.ai_manager.send_message(full_message, self.context)
-            self.chunk_ready.emit(response)
+            for chunk in self.ai_manager.stream_message(full_message, self.context):
+                if self.isInterruptionRequested():
+                    break
+                if chunk:
+                    self.chunk_ready.emit(chunk)
             self.finished_streaming.emit()
         except Exception as e:
             self.error_occurred.emit(str(e))
 
 
 class MainWindowV3(QMainWindow):
-    MAX_CHAT_MESSAGES = 50
-
     def __init__(self):
         super().__init__()
         self.ai_manager = None
@@ -812,6 +1467,10 @@ class MainWindowV3(QMainWindow):
         self.richie = None
         self.ai_thread = None
         self.current_ai_message = None
+        self._current_ai_record = None
+        self._ai_scroll_pending = False
+        # Gravações de histórico/estado saem da thread da interface
+        self.persistence = PersistenceWorker(debounce_seconds=1.0, max_delay_seconds=5.0, name="chat-persistence")
         self.active_custom_ai = None
         self._message_count = 0
         self._threads = []
@@ -1047,7 +1706,7 @@ class MainWindowV3(QMainWindow):
         
         # === SIDEBAR VIEWS: Chat History (index 2), Debug, Lab, IAs, Config (index 3-6) ===
         # Index 2: Chat History Panel (FUNCIONAL)
-        self.chat_history_panel = ChatHistoryPanel()
+        self.chat_history_panel = ChatHistoryPanel(persistence=self.persistence)
         self.chat_history_panel.session_selected.connect(self._load_chat_session)
         self.chat_history_panel.new_chat_requested.connect(self._clear_chat)
         self.sidebar.addWidget(self.chat_history_panel)
@@ -1193,12 +1852,27 @@ class MainWindowV3(QMainWindow):
         chat_full_layout = QVBoxLayout(self.chat_container)
         chat_full_layout.setContentsMargins(0,0,0,0)
         
-        self.chat_scroll = QScrollArea()
-        self.chat_scroll.setWidgetResizable(True)
-        self.chat_scroll.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        self.chat_scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.chat_scroll.setStyleSheet("""
-            QScrollArea { border:none; border-left: 1px solid #1e293b; background: #0d1117; }
+        # Transcript virtualizado: só as linhas visíveis são pintadas
+        self.chat_model = ChatTranscriptModel(self)
+        self.chat_model.set_messages(self._current_session_messages)
+        self.chat_view = QListView()
+        self.chat_view.setModel(self.chat_model)
+        self.chat_delegate = ChatMessageDelegate(self.chat_view)
+        self.chat_delegate.action_clicked.connect(self._handle_chat_action)
+        self.chat_view.setItemDelegate(self.chat_delegate)
+        self.chat_model.modelReset.connect(self.chat_delegate.clear_cache)
+        self.chat_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.chat_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.chat_view.verticalScrollBar().setSingleStep(20)
+        self.chat_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.chat_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.chat_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.chat_view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self.chat_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.chat_view.customContextMenuRequested.connect(self._show_chat_message_menu)
+        self.chat_view.setStyleSheet("""
+            QListView { border:none; border-left: 1px solid #1e293b; background: #0d1117; padding: 8px 0; }
+            QListView::item, QListView::item:hover { background: transparent; }
             QScrollBar:vertical {
                 background: #0d1117;
                 width: 8px;
@@ -1216,15 +1890,7 @@ class MainWindowV3(QMainWindow):
                 height: 0px;
             }
         """)
-        self.chat_messages_widget = QWidget()
-        self.chat_messages_widget.setStyleSheet("background: #0d1117;")
-        self.chat_messages_widget.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred)
-        self.chat_v_layout = QVBoxLayout(self.chat_messages_widget)
-        self.chat_v_layout.setContentsMargins(8, 8, 8, 8)
-        self.chat_v_layout.setSpacing(8)
-        self.chat_v_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.chat_scroll.setWidget(self.chat_messages_widget)
-        chat_full_layout.addWidget(self.chat_scroll)
+        chat_full_layout.addWidget(self.chat_view)
         
         # Input Area
         self.input_frame = QFrame()
@@ -1314,9 +1980,11 @@ class MainWindowV3(QMainWindow):
         import uuid
         self._current_session_id = str(uuid.uuid4())[:8]
         self._current_session_messages = []
+        if hasattr(self, "chat_model"):
+            self.chat_model.set_messages(self._current_session_messages)
 
     def _save_current_session(self):
-        """Salva a sessão de chat atual no histórico."""
+        """Agenda a gravação da sessão de chat atual no histórico (em background)."""
         if not self._current_session_messages:
             return
         
@@ -1329,7 +1997,7 @@ class MainWindowV3(QMainWindow):
                     title += "..."
                 break
         
-        self.chat_history_panel.save_session(
+        self.chat_history_panel.schedule_save(
             self._current_session_id,
             title,
             self._current_session_messages
@@ -1345,18 +2013,10 @@ class MainWindowV3(QMainWindow):
         # Limpar chat atual
         self._clear_chat_widgets()
         
-        # Restaurar sessão
+        # Restaurar sessão (o modelo só renderiza as mensagens visíveis)
         self._current_session_id = session_id
         self._current_session_messages = data.get("messages", [])
-        
-        # Recriar mensagens
-        for msg in self._current_session_messages:
-            sender = msg.get("sender", "?")
-            text = msg.get("text", "")
-            is_user = msg.get("is_user", False)
-            chat_msg = ChatMessage(sender, text, is_user)
-            self.chat_v_layout.addWidget(chat_msg)
-        
+        self.chat_model.set_messages(self._current_session_messages)
         self._message_count = len(self._current_session_messages)
         
         # Scroll ao final após carregar
@@ -1364,12 +2024,12 @@ class MainWindowV3(QMainWindow):
         self.status.showMessage(f"Sessão carregada: {data.get('title', session_id)}", 2000)
 
     def _clear_chat_widgets(self):
-        """Remove todos os widgets de mensagem do layout."""
-        while self.chat_v_layout.count():
-            item = self.chat_v_layout.takeAt(0)
-            if item and item.widget():
-                item.widget().deleteLater()
+        """Esvazia o transcript exibido (a sessão em si não é alterada)."""
+        self.chat_model.set_messages([])
         self._message_count = 0
+        # Chunks que ainda chegarem do stream em andamento sao descartados
+        self._release_ai_message()
+        self._current_ai_record = None
 
     # ==========================================
     # === SHELL COMBOBOX ===
@@ -1425,6 +2085,7 @@ class MainWindowV3(QMainWindow):
         try:
             from ..core.richie_ai import RichieAI
             self.richie = RichieAI()
+            self.richie.set_persistence(self.persistence)
             # Carregar FlowEngine com o modelo Richie do JSON
             self._load_richie_flow_engine()
             self.status.showMessage("🤖 Richie AI inicializada (modo offline)!", 3000)
@@ -1570,16 +2231,11 @@ class MainWindowV3(QMainWindow):
         scroll_layout.setSpacing(6)
         scroll_layout.setContentsMargins(4, 4, 4, 4)
         
-        # Carregar sessões do index
-        index_path = self.chat_history_panel._get_sessions_index_path()
-        sessions = []
-        if os.path.exists(index_path):
-            try:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    sessions = json.load(f)
-                sessions.sort(key=lambda s: s.get("updated_at", ""), reverse=True)
-            except:
-                pass
+        # Carregar sessões do histórico (já ordenadas pela mais recente)
+        try:
+            sessions = self.chat_history_panel.store.list_sessions(limit=None)
+        except Exception:
+            sessions = []
         
         if not sessions:
             empty_label = QLabel("Nenhuma conversa salva ainda.\nEnvie mensagens e clique '+ Novo' para salvar.")
@@ -1654,37 +2310,11 @@ class MainWindowV3(QMainWindow):
             text=title_label.text().replace("💬 ", "")
         )
         if ok and new_title.strip():
-            # Atualizar no index
-            index_path = self.chat_history_panel._get_sessions_index_path()
-            if os.path.exists(index_path):
-                try:
-                    with open(index_path, 'r', encoding='utf-8') as f:
-                        sessions = json.load(f)
-                    for s in sessions:
-                        if s.get("id") == session_id:
-                            s["title"] = new_title.strip()
-                            break
-                    with open(index_path, 'w', encoding='utf-8') as f:
-                        json.dump(sessions, f, ensure_ascii=False, indent=2)
-                except Exception as e:
-                    print(f"Erro ao renomear: {e}")
-            
-            # Atualizar no arquivo da sessão
-            session_file = os.path.join(self.chat_history_panel._sessions_dir, f"{session_id}.json")
-            if os.path.exists(session_file):
-                try:
-                    with open(session_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    data["title"] = new_title.strip()
-                    with open(session_file, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, ensure_ascii=False, indent=2)
-                except:
-                    pass
+            if not self.chat_history_panel.rename_session(session_id, new_title.strip()):
+                return
             
             # Atualizar label visual
             title_label.setText(f"💬 {new_title.strip()}")
-            # Recarregar lista no painel lateral
-            self.chat_history_panel._load_session_list()
             self.status.showMessage(f"Conversa renomeada: {new_title.strip()}", 2000)
 
     # ==========================================
@@ -2145,10 +2775,13 @@ class MainWindowV3(QMainWindow):
         ai_name = self._get_ai_sender_name()
         if self.active_custom_ai:
             system_prompt = self.active_custom_ai.system_prompt
+        self._release_ai_message()
         self.current_ai_message = self.add_message(ai_name, "Processando...", return_widget=True)
+        self._current_ai_record = self.current_ai_message.record
+        self.current_ai_message.begin_stream()
         self.ai_thread = AIStreamThread(self.ai_manager, message, context)
         self.ai_thread.system_prompt = system_prompt
-        self.ai_thread.chunk_ready.connect(self._on_ai_response)
+        self.ai_thread.chunk_ready.connect(self._on_ai_chunk)
         self.ai_thread.error_occurred.connect(self._on_ai_error)
         self.ai_thread.finished_streaming.connect(self._on_ai_finished)
         self._threads.append(self.ai_thread)
@@ -2213,20 +2846,48 @@ class MainWindowV3(QMainWindow):
         if intent.get("language"):
             self.richie.learn("linguagem_preferida", intent["language"])
 
-    def _on_ai_response(self, response):
+    def _on_ai_chunk(self, chunk):
+        """Acrescenta um chunk ao balão atual (re-render limitado pelo ChatMessage)."""
         if self.current_ai_message:
-            self.current_ai_message.update_text(response)
-        self.current_ai_message = None
+            self.current_ai_message.append_text(chunk)
+            if not self._ai_scroll_pending:
+                self._ai_scroll_pending = True
+                QTimer.singleShot(ChatMessage.STREAM_RENDER_INTERVAL_MS, self._scroll_chat_after_chunk)
+
+    def _scroll_chat_after_chunk(self):
+        self._ai_scroll_pending = False
+        self._scroll_chat_to_bottom()
 
     def _on_ai_error(self, error):
         if self.current_ai_message:
+            self.current_ai_message.finish_stream()
             self.current_ai_message.update_text(f"❌ Erro: {error}")
-        self.current_ai_message = None
+            self._finish_ai_record(f"❌ Erro: {error}")
+        self._release_ai_message()
 
     def _on_ai_finished(self):
-        self.current_ai_message = None
+        if self.current_ai_message:
+            if not self.current_ai_message.text:
+                self.current_ai_message.text = "Sem resposta."
+            self.current_ai_message.finish_stream()
+            self._finish_ai_record(self.current_ai_message.text)
+            QTimer.singleShot(50, self._scroll_chat_to_bottom)
+        self._release_ai_message()
         self._threads = [t for t in self._threads if t.isRunning()]
 
+    def _release_ai_message(self):
+        """Libera o ChatMessage do stream (QObject com QTimer próprio, um por resposta)."""
+        if self.current_ai_message is not None:
+            self.current_ai_message.deleteLater()
+        self.current_ai_message = None
+
+    def _finish_ai_record(self, text):
+        """Grava na sessão o texto final no lugar do placeholder."""
+        if self._current_ai_record is not None:
+            self._current_ai_record["text"] = text
+            self._save_current_session()
+        self._current_ai_record = None
+
     def _update_chat_stretch(self):
         """Stub mantido por compatibilidade — stretch removido na v22.0.8."""
         pass
@@ -2245,8 +2906,17 @@ class MainWindowV3(QMainWindow):
 
     def _scroll_chat_to_bottom(self):
         """Scroll suave para o final do chat."""
-        sb = self.chat_scroll.verticalScrollBar()
-        sb.setValue(sb.maximum())
+        self.chat_view.scrollToBottom()
+
+    def _show_chat_message_menu(self, pos):
+        """Menu de contexto de uma mensagem (o texto pintado não é selecionável)."""
+        index = self.chat_view.indexAt(pos)
+        if not index.isValid():
+            return
+        menu = QMenu(self)
+        copy_action = menu.addAction("Copiar mensagem")
+        if menu.exec(self.chat_view.viewport().mapToGlobal(pos)) == copy_action:
+            QApplication.clipboard().setText(index.data(Qt.ItemDataRole.DisplayRole) or "")
 
     def _handle_chat_action(self, action: str):
         """Lida com clique em botões dinâmicos de chat."""
@@ -2260,35 +2930,23 @@ class MainWindowV3(QMainWindow):
 
     def add_message(self, s, t, is_user=False, return_widget=False):
         """Adiciona mensagem ao chat com scroll correto via QTimer."""
-        self._message_count += 1
-
-        # Limitar mensagens para performance
-        if self._message_count > self.MAX_CHAT_MESSAGES:
-            item = self.chat_v_layout.takeAt(0)
-            if item and item.widget():
-                item.widget().deleteLater()
-            self._message_count -= 1
-
-        # Remover stretch do topo quando conteudo preenche a area
-        self._update_chat_stretch()
-
-        msg = ChatMessage(s, t, is_user)
-        msg.action_clicked.connect(self._handle_chat_action)
-        self.chat_v_layout.addWidget(msg)
-
-        # Registrar na sessão atual
-        self._current_session_messages.append({
+        record = {
             "sender": s,
             "text": t,
             "is_user": is_user,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        # Registrar na sessão atual (o modelo exibe a própria lista da sessão)
+        self.chat_model.append_message(record)
+        self._message_count = self.chat_model.rowCount()
+        # Autosave (com debounce no worker de persistência)
+        self._save_current_session()
 
         # Scroll com delay para garantir que o layout atualizou
         QTimer.singleShot(50, self._scroll_chat_to_bottom)
 
         if return_widget:
-            return msg
+            return ChatMessage(self.chat_model, record, self)
 
     # ==========================================
     # === TERMINAL TOGGLE ===
@@ -2777,13 +3435,24 @@ class MainWindowV3(QMainWindow):
                 self.richie._save_state()
             except Exception:
                 pass
+        if self.custom_ai_manager:
+            try:
+                self.custom_ai_manager.flush()
+            except Exception as e:
+                print(f"Erro ao salvar modelos: {e}")
+        # Grava tudo o que ainda está na fila antes de sair
+        if not self.persistence.close(timeout=10):
+            print("Aviso: gravações pendentes não concluídas ao fechar")
         for thread in self._threads:
             if thread.isRunning():
                 thread.quit()
                 thread.wait(1000)
         if self.ai_thread and self.ai_thread.isRunning():
+            self.ai_thread.requestInterruption()
             self.ai_thread.quit()
             self.ai_thread.wait(1000)
+        if self.ai_manager:
+            self.ai_manager.close()
         if self.terminal_widget._script_process and self.terminal_widget._script_process.state() != QProcess.ProcessState.NotRunning:
             self.terminal_widget._script_process.kill()
             self.terminal_widget._script_process.waitForFinished(1000)
@@ -6,12 +6,16 @@ from .base_provider import BaseAIProvider
 from .openai_provider import OpenAIProvider
 from .anthropic_provider import AnthropicProvider
 from .deepseek_provider import DeepSeekProvider
+from .http_pool import get_async_http_client, close_async_http_client, BackgroundLoop
 
 __all__ = [
     'BaseAIProvider',
     'OpenAIProvider',
     'AnthropicProvider',
-    'DeepSeekProvider'
+    'DeepSeekProvider',
+    'get_async_http_client',
+    'close_async_http_client',
+    'BackgroundLoop'
 ]
 
 def get_provider(provider_name: str, config: dict):
@@ -3,7 +3,9 @@ Anthropic Provider - Integracao com Claude API
 """
 
 from .base_provider import BaseAIProvider
-from typing import List, Dict, Any, Optional, Generator
+from .http_pool import get_async_http_client, LoopLocal
+from .rate_limiter import get_rate_limiter, estimate_tokens, classify_error
+from typing import List, Dict, Any, Optional, Generator, AsyncGenerator
 import re
 
 class AnthropicProvider(BaseAIProvider):
@@ -25,6 +27,8 @@ class AnthropicProvider(BaseAIProvider):
             self.MODELS['claude-3.5-sonnet']
         )
         self.client = None
+        self._async_clients = LoopLocal()
+        self.rate_limiter = get_rate_limiter('anthropic', config.get('rate_limit'))
         self._init_client()
 
     def _init_client(self):
@@ -37,23 +41,20 @@ class AnthropicProvider(BaseAIProvider):
         except ImportError:
             raise ImportError("Instale anthropic: pip install anthropic")
 
-    def send_message(
-        self,
-        message: str,
-        context: List[Dict] = None,
-        system_prompt: str = None,
-        max_tokens: int = 4096,
-        temperature: float = 0.7,
-        stream: bool = False
-    ) -> str:
-        """Envia mensagem para Claude"""
-        if not self.client:
-            return "Erro: API key nao configurada"
+    def _get_async_client(self):
+        """Cliente AsyncAnthropic do loop atual, sobre o pool HTTP compartilhado"""
+        from anthropic import AsyncAnthropic
+        return self._async_clients.get(lambda: AsyncAnthropic(
+            api_key=self.api_key,
+            http_client=get_async_http_client()
+        ))
 
+    def _build_messages(self, message: str, context: List[Dict] = None, use_history: bool = True) -> List[Dict]:
+        """Monta historico + contexto + mensagem atual"""
         messages = []
 
-        # Adicionar historico
-        for hist_msg in self.history[-10:]:
+        # Adicionar historico (chamadas sem estado nao leem)
+        for hist_msg in (self.history[-10:] if use_history else []):
             messages.append({
                 "role": hist_msg["role"],
                 "content": hist_msg["content"]
@@ -66,22 +67,41 @@ class AnthropicProvider(BaseAIProvider):
 
         # Mensagem atual
         messages.append({"role": "user", "content": message})
+        return messages
+
+    def send_message(
+        self,
+        message: str,
+        context: List[Dict] = None,
+        system_prompt: str = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        stream: bool = False
+    ) -> str:
+        """Envia mensagem para Claude"""
+        if not self.client:
+            return "Erro: API key nao configurada"
+
+        messages = self._build_messages(message, context)
 
         system = system_prompt or "Voce e um assistente de programacao especializado. Responda em portugues."
 
         if stream:
             return self._stream_response(messages, system, max_tokens, temperature)
 
+        tokens = estimate_tokens(messages) + max_tokens
+
         try:
-            response = self.client.messages.create(
+            response = self.rate_limiter.call(lambda: self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
                 system=system,
                 messages=messages,
                 temperature=temperature
-            )
+            ), tokens)
 
             result = response.content[0].text
+            self._charge_usage(response, tokens)
             self.add_to_history("user", message)
             self.add_to_history("assistant", result)
             return result
@@ -96,7 +116,9 @@ class AnthropicProvider(BaseAIProvider):
         max_tokens: int,
         temperature: float
     ) -> Generator:
-        """Gera resposta em streaming"""
+        """Gera resposta em streaming (falhas sobem como excecao, nunca como texto)"""
+        self.rate_limiter.acquire(estimate_tokens(messages) + max_tokens)
+        status, retry_after = None, None
         try:
             with self.client.messages.stream(
                 model=self.model,
@@ -113,7 +135,97 @@ class AnthropicProvider(BaseAIProvider):
                 self.add_to_history("user", messages[-1]["content"])
                 self.add_to_history("assistant", full_response)
         except Exception as e:
-            yield f"Erro: {str(e)}"
+            status, retry_after = classify_error(e)
+            status = status or 0
+            raise
+        finally:
+            self.rate_limiter.release(status, retry_after)
+
+    def _charge_usage(self, response, estimated: int):
+        """Informa ao limiter os tokens realmente consumidos"""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            actual = (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "output_tokens", 0) or 0)
+            self.rate_limiter.charge_tokens(actual, estimated)
+
+    async def asend_message(
+        self,
+        message: str,
+        context: List[Dict] = None,
+        system_prompt: str = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        use_history: bool = True
+    ) -> str:
+        """Versao assincrona de send_message (use_history=False: sem ler nem gravar historico)"""
+        if not self.api_key:
+            return "Erro: API key nao configurada"
+
+        messages = self._build_messages(message, context, use_history)
+        system = system_prompt or "Voce e um assistente de programacao especializado. Responda em portugues."
+
+        tokens = estimate_tokens(messages) + max_tokens
+
+        try:
+            response = await self.rate_limiter.acall(lambda: self._get_async_client().messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                system=system,
+                messages=messages,
+                temperature=temperature
+            ), tokens)
+
+            result = response.content[0].text
+            self._charge_usage(response, tokens)
+            if use_history:
+                self.add_to_history("user", message)
+                self.add_to_history("assistant", result)
+            return result
+
+        except Exception as e:
+            return f"Erro: {str(e)}"
+
+    async def astream(
+        self,
+        message: str,
+        context: List[Dict] = None,
+        system_prompt: str = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        use_history: bool = True
+    ) -> AsyncGenerator[str, None]:
+        """Streaming assincrono (falhas sobem como excecao, nunca como texto)"""
+        if not self.api_key:
+            yield "Erro: API key nao configurada"
+            return
+
+        messages = self._build_messages(message, context, use_history)
+        system = system_prompt or "Voce e um assistente de programacao especializado. Responda em portugues."
+
+        await self.rate_limiter.aacquire(estimate_tokens(messages) + max_tokens)
+        status, retry_after = None, None
+        try:
+            async with self._get_async_client().messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                system=system,
+                messages=messages,
+                temperature=temperature
+            ) as stream:
+                full_response = ""
+                async for text in stream.text_stream:
+                    full_response += text
+                    yield text
+
+                if use_history:
+                    self.add_to_history("user", message)
+                    self.add_to_history("assistant", full_response)
+        except Exception as e:
+            status, retry_after = classify_error(e)
+            status = status or 0
+            raise
+        finally:
+            self.rate_limiter.release(status, retry_after)
 
     def analyze_code(self, code: str, language: str = None, analysis_type: str = "review") -> Dict[str, Any]:
         """Analisa codigo com Claude"""
@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncGenerator
+import asyncio
+import functools
+import inspect
 
 class BaseAIProvider(ABC):
     """Classe base para provedores de IA"""
@@ -24,6 +27,22 @@ class BaseAIProvider(ABC):
         """Gera código baseado em um prompt"""
         pass
     
+    async def asend_message(self, message: str, context: List[Dict] = None, use_history: bool = True, **kwargs) -> str:
+        """
+        Versão assíncrona de send_message (padrão: executa em thread).
+        use_history=False pede uma chamada sem estado (sem ler nem gravar o
+        histórico), repassada a send_message quando ele aceita o parâmetro.
+        """
+        if not use_history and 'use_history' in inspect.signature(self.send_message).parameters:
+            kwargs['use_history'] = False
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.send_message, message, context, **kwargs)
+        return await loop.run_in_executor(None, call)
+
+    async def astream(self, message: str, context: List[Dict] = None, use_history: bool = True, **kwargs) -> AsyncGenerator[str, None]:
+        """Streaming assíncrono (padrão: resposta inteira em um único chunk)"""
+        yield await self.asend_message(message, context, use_history, **kwargs)
+
     def add_to_history(self, role: str, content: str):
         """Adiciona uma mensagem ao histórico"""
         self.history.append({"role": role, "content": content})
\ No newline at end of file
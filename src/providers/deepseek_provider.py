@@ -4,7 +4,12 @@ Otimizado para codigo - custo muito baixo
 """
 
 from .base_provider import BaseAIProvider
-from typing import List, Dict, Any, Optional, Generator
+from .http_pool import get_async_http_client
+from .rate_limiter import (
+    get_rate_limiter, estimate_tokens, classify_error, parse_retry_after,
+    RateLimitExceeded, OVERLOAD_STATUSES
+)
+from typing import List, Dict, Any, Optional, Generator, AsyncGenerator
 import requests
 import json
 import re
@@ -25,10 +30,8 @@ class DeepSeekProvider(BaseAIProvider):
         self.api_key = config.get('api_key', '')
         self.model = config.get('model', 'deepseek-coder')
         self.session = requests.Session()
-        self.session.headers.update({
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        })
+        self.session.headers.update(self._auth_headers())
+        self.rate_limiter = get_rate_limiter('deepseek', config.get('rate_limit'))
 
     def send_message(
         self,
@@ -43,14 +46,52 @@ class DeepSeekProvider(BaseAIProvider):
         if not self.api_key:
             return "Erro: API key nao configurada"
 
+        payload = self._build_payload(message, context, system_prompt, max_tokens, temperature, stream)
+
+        if stream:
+            return self._stream_response(payload, message)
+
+        tokens = estimate_tokens(payload["messages"])
+
+        try:
+            response = self.rate_limiter.call(lambda: self._check_overload(self.session.post(
+                f"{self.BASE_URL}/chat/completions",
+                json=payload,
+                timeout=60
+            )), tokens)
+
+            if response.status_code != 200:
+                return f"Erro DeepSeek: {response.status_code} - {response.text}"
+
+            data = response.json()
+            result = data["choices"][0]["message"]["content"]
+            self.rate_limiter.charge_tokens(data.get("usage", {}).get("total_tokens", 0), tokens)
+            self.add_to_history("user", message)
+            self.add_to_history("assistant", result)
+            return result
+
+        except Exception as e:
+            return f"Erro: {str(e)}"
+
+    def _build_payload(
+        self,
+        message: str,
+        context: List[Dict],
+        system_prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stream: bool,
+        use_history: bool = True
+    ) -> Dict[str, Any]:
+        """Monta o payload de chat/completions"""
         messages = []
 
         # Sistema
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
 
-        # Historico
-        for hist_msg in self.history[-10:]:
+        # Historico (chamadas sem estado nao leem)
+        for hist_msg in (self.history[-10:] if use_history else []):
             messages.append(hist_msg)
 
         # Contexto adicional
@@ -61,7 +102,7 @@ class DeepSeekProvider(BaseAIProvider):
         # Mensagem atual
         messages.append({"role": "user", "content": message})
 
-        payload = {
+        return {
             "model": self.model,
             "messages": messages,
             "max_tokens": max_tokens,
@@ -69,61 +110,159 @@ class DeepSeekProvider(BaseAIProvider):
             "stream": stream
         }
 
-        if stream:
-            return self._stream_response(payload, message)
+    def _check_overload(self, response):
+        """Converte 429/503 em RateLimitExceeded (com Retry-After) para o limiter"""
+        if response.status_code in OVERLOAD_STATUSES:
+            raise RateLimitExceeded(
+                response.status_code,
+                parse_retry_after(response.headers.get("Retry-After")),
+                f"Erro DeepSeek: {response.status_code} - {response.text}"
+            )
+        return response
+
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        """Extrai o texto de uma linha SSE; '' para linhas sem conteudo, None no [DONE]"""
+        if not line.startswith('data: '):
+            return ""
+        data = line[6:]
+        if data == '[DONE]':
+            return None
+        try:
+            chunk = json.loads(data)
+            delta = chunk["choices"][0].get("delta", {})
+            return delta.get("content", "") or ""
+        except:
+            return ""
 
+    def _stream_response(self, payload: Dict, user_content: str) -> Generator:
+        """Stream de resposta (falhas sobem como excecao, nunca como texto)"""
+        self.rate_limiter.acquire(estimate_tokens(payload["messages"]))
+        status, retry_after = None, None
         try:
-            response = self.session.post(
+            response = self._check_overload(self.session.post(
                 f"{self.BASE_URL}/chat/completions",
                 json=payload,
+                stream=True,
                 timeout=60
-            )
+            ))
+
+            full_response = ""
+
+            for line in response.iter_lines():
+                if line:
+                    content = self._parse_stream_line(line.decode('utf-8'))
+                    if content is None:
+                        break
+                    if content:
+                        full_response += content
+                        yield content
+
+            self.add_to_history("user", user_content)
+            self.add_to_history("assistant", full_response)
+
+        except Exception as e:
+            status, retry_after = classify_error(e)
+            status = status or 0
+            raise
+        finally:
+            self.rate_limiter.release(status, retry_after)
+
+    def _auth_headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    async def asend_message(
+        self,
+        message: str,
+        context: List[Dict] = None,
+        system_prompt: str = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        use_history: bool = True
+    ) -> str:
+        """Versao assincrona de send_message (pool HTTP compartilhado; use_history=False: sem estado)"""
+        if not self.api_key:
+            return "Erro: API key nao configurada"
+
+        payload = self._build_payload(message, context, system_prompt, max_tokens, temperature, False, use_history)
+        tokens = estimate_tokens(payload["messages"])
+
+        async def post():
+            return self._check_overload(await get_async_http_client().post(
+                f"{self.BASE_URL}/chat/completions",
+                json=payload,
+                headers=self._auth_headers()
+            ))
+
+        try:
+            response = await self.rate_limiter.acall(post, tokens)
 
             if response.status_code != 200:
                 return f"Erro DeepSeek: {response.status_code} - {response.text}"
 
-            result = response.json()["choices"][0]["message"]["content"]
-            self.add_to_history("user", message)
-            self.add_to_history("assistant", result)
+            data = response.json()
+            result = data["choices"][0]["message"]["content"]
+            self.rate_limiter.charge_tokens(data.get("usage", {}).get("total_tokens", 0), tokens)
+            if use_history:
+                self.add_to_history("user", message)
+                self.add_to_history("assistant", result)
             return result
 
         except Exception as e:
             return f"Erro: {str(e)}"
 
-    def _stream_response(self, payload: Dict, user_content: str) -> Generator:
-        """Stream de resposta"""
+    async def astream(
+        self,
+        message: str,
+        context: List[Dict] = None,
+        system_prompt: str = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        use_history: bool = True
+    ) -> AsyncGenerator[str, None]:
+        """Streaming assincrono via SSE (falhas sobem como excecao, nunca como texto)"""
+        if not self.api_key:
+            yield "Erro: API key nao configurada"
+            return
+
+        payload = self._build_payload(message, context, system_prompt, max_tokens, temperature, True, use_history)
+
+        await self.rate_limiter.aacquire(estimate_tokens(payload["messages"]))
+        status, retry_after = None, None
         try:
-            response = self.session.post(
+            async with get_async_http_client().stream(
+                "POST",
                 f"{self.BASE_URL}/chat/completions",
                 json=payload,
-                stream=True,
-                timeout=60
-            )
-
-            full_response = ""
-
-            for line in response.iter_lines():
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        data = line[6:]
-                        if data == '[DONE]':
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            delta = chunk["choices"][0].get("delta", {})
-                            content = delta.get("content", "")
-                            if content:
-                                full_response += content
-                                yield content
-                        except:
-                            continue
-
-            self.add_to_history("user", user_content)
-            self.add_to_history("assistant", full_response)
+                headers=self._auth_headers()
+            ) as response:
+                if response.status_code in OVERLOAD_STATUSES:
+                    await response.aread()
+                    self._check_overload(response)
+                full_response = ""
+
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    content = self._parse_stream_line(line)
+                    if content is None:
+                        break
+                    if content:
+                        full_response += content
+                        yield content
+
+            if use_history:
+                self.add_to_history("user", message)
+                self.add_to_history("assistant", full_response)
 
         except Exception as e:
-            yield f"Erro: {str(e)}"
+            status, retry_after = classify_error(e)
+            status = status or 0
+            raise
+        finally:
+            self.rate_limiter.release(status, retry_after)
 
     def analyze_code(self, code: str, language: str = None, analysis_type: str = "review") -> Dict[str, Any]:
         """Analisa codigo - DeepSeek e otimizado para isso"""
@@ -0,0 +1,125 @@
+"""
+HTTP Pool - Clientes HTTP assincronos compartilhados entre providers
+Um httpx.AsyncClient por event loop, reaproveitando conexoes keep-alive.
+Chamadores sincronos usam um BackgroundLoop: um loop de longa duracao
+numa thread propria, dono do cliente, fechado apenas no shutdown.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import weakref
+from typing import Any, Awaitable, Optional
+
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+TIMEOUT_SECONDS = 60.0
+CONNECT_TIMEOUT_SECONDS = 10.0
+
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> Any:
+    """Retorna o cliente httpx compartilhado do event loop atual"""
+    try:
+        import httpx
+    except ImportError:
+        raise ImportError("Instale httpx: pip install httpx")
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS)
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_http_client():
+    """Fecha o cliente compartilhado do event loop atual"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+class LoopLocal:
+    """Cache de objetos por event loop (clientes SDK presos ao loop)"""
+
+    def __init__(self):
+        self._values: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def get(self, factory):
+        loop = asyncio.get_running_loop()
+        value = self._values.get(loop)
+        if value is None:
+            value = factory()
+            self._values[loop] = value
+        return value
+
+
+class BackgroundLoop:
+    """
+    Event loop de longa duracao numa thread daemon. `run()` executa uma
+    corrotina nele a partir de qualquer thread sem loop (ex. QThread) e
+    bloqueia ate o resultado; o cliente HTTP do loop (e suas conexoes
+    keep-alive) e reaproveitado entre chamadas ate `close()`.
+    """
+
+    def __init__(self, name: str = "ai-http-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def run(self, coro: Awaitable[Any], timeout: float = None) -> Any:
+        return self.submit(coro).result(timeout)
+
+    def submit(self, coro: Awaitable[Any]) -> "concurrent.futures.Future":
+        """Agenda a corrotina sem esperar; `cancel()` no future cancela a task"""
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop chamado de dentro do proprio loop")
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._serve, args=(loop,), name=self.name, daemon=True
+                )
+                self._loop = loop
+                self._thread.start()
+            return self._loop
+
+    @staticmethod
+    def _serve(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def close(self, timeout: float = 5.0):
+        """Fecha o cliente HTTP do loop e encerra a thread"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(close_async_http_client(), loop).result(timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and not self._loop.is_closed()
@@ -1,6 +1,8 @@
 from .base_provider import BaseAIProvider
+from .http_pool import get_async_http_client, LoopLocal
+from .rate_limiter import get_rate_limiter, estimate_tokens, classify_error
 import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncGenerator, Generator
 
 class OpenAIProvider(BaseAIProvider):
     """Provedor para OpenAI API"""
@@ -8,8 +10,10 @@ class OpenAIProvider(BaseAIProvider):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.client = openai.OpenAI(api_key=config.get('api_key', ''))
+        self._async_clients = LoopLocal()
+        self.rate_limiter = get_rate_limiter('openai', config.get('rate_limit'))
         
-    def send_message(self, message: str, context: List[Dict] = None) -> str:
+    def _build_messages(self, message: str, context: List[Dict] = None) -> List[Dict]:
         messages = []
         
         # Adicionar contexto se existir
@@ -18,18 +22,116 @@ class OpenAIProvider(BaseAIProvider):
         
         # Adicionar mensagem atual
         messages.append({"role": "user", "content": message})
+        return messages
         
-        response = self.client.chat.completions.create(
+    def _get_async_client(self):
+        """Cliente AsyncOpenAI do loop atual, sobre o pool HTTP compartilhado"""
+        return self._async_clients.get(lambda: openai.AsyncOpenAI(
+            api_key=self.config.get('api_key', ''),
+            http_client=get_async_http_client()
+        ))
+        
+    def send_message(self, message: str, context: List[Dict] = None, stream: bool = False) -> str:
+        messages = self._build_messages(message, context)
+        tokens = estimate_tokens(messages)
+        
+        if stream:
+            return self._stream_response(messages, tokens)
+        
+        response = self.rate_limiter.call(lambda: self.client.chat.completions.create(
             model=self.config.get('model', 'gpt-4'),
             messages=messages,
             temperature=0.7
-        )
+        ), tokens)
         
         reply = response.choices[0].message.content
+        self._charge_usage(response, tokens)
         self.add_to_history("assistant", reply)
         
         return reply
     
+    def _stream_response(self, messages: List[Dict], tokens: int) -> Generator[str, None, None]:
+        """Gera a resposta em streaming (chunks de texto conforme chegam)"""
+        self.rate_limiter.acquire(tokens)
+        status, retry_after = None, None
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.config.get('model', 'gpt-4'),
+                messages=messages,
+                temperature=0.7,
+                stream=True
+            )
+            
+            full_response = ""
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    full_response += content
+                    yield content
+            
+            self.add_to_history("assistant", full_response)
+        except Exception as e:
+            status, retry_after = classify_error(e)
+            status = status or 0
+            raise
+        finally:
+            self.rate_limiter.release(status, retry_after)
+    
+    async def asend_message(self, message: str, context: List[Dict] = None, use_history: bool = True, **kwargs) -> str:
+        messages = self._build_messages(message, context)
+        tokens = estimate_tokens(messages)
+        
+        response = await self.rate_limiter.acall(lambda: self._get_async_client().chat.completions.create(
+            model=self.config.get('model', 'gpt-4'),
+            messages=messages,
+            temperature=0.7
+        ), tokens)
+        
+        reply = response.choices[0].message.content
+        self._charge_usage(response, tokens)
+        if use_history:
+            self.add_to_history("assistant", reply)
+        
+        return reply
+    
+    async def astream(self, message: str, context: List[Dict] = None, use_history: bool = True, **kwargs) -> AsyncGenerator[str, None]:
+        messages = self._build_messages(message, context)
+        
+        await self.rate_limiter.aacquire(estimate_tokens(messages))
+        status, retry_after = None, None
+        try:
+            stream = await self._get_async_client().chat.completions.create(
+                model=self.config.get('model', 'gpt-4'),
+                messages=messages,
+                temperature=0.7,
+                stream=True
+            )
+            
+            full_response = ""
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    full_response += content
+                    yield content
+            
+            if use_history:
+                self.add_to_history("assistant", full_response)
+        except Exception as e:
+            status, retry_after = classify_error(e)
+            status = status or 0
+            raise
+        finally:
+            self.rate_limiter.release(status, retry_after)
+    
+    def _charge_usage(self, response, estimated: int):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.rate_limiter.charge_tokens(getattr(usage, "total_tokens", 0) or 0, estimated)
+    
     def analyze_code(self, code: str, language: str = None) -> Dict[str, Any]:
         prompt = f"Analise este código {language if language else ''}:\n\n{code}"
         
@@ -0,0 +1,308 @@
+"""
+Rate Limiter - Controle de taxa por provider
+Token buckets (requisicoes/min e tokens/min) + concorrencia adaptativa AIMD.
+Recua em 429/503 respeitando Retry-After. Um limiter por provider, compartilhado
+entre chamadas sincronas, assincronas e streaming.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 529 = "overloaded" da Anthropic
+OVERLOAD_STATUSES = (429, 503, 529)
+
+
+class RateLimitExceeded(Exception):
+    """Provider respondeu 429/503/529"""
+
+    def __init__(self, status_code: int, retry_after: float = None, message: str = ""):
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """Converte o header Retry-After (segundos) em float"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc: BaseException) -> Tuple[Optional[int], Optional[float]]:
+    """Extrai (status HTTP, Retry-After) de excecoes dos SDKs/httpx/requests"""
+    if isinstance(exc, RateLimitExceeded):
+        return exc.status_code, exc.retry_after
+
+    status = getattr(exc, "status_code", None)
+    response = getattr(exc, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            retry_after = parse_retry_after(headers.get("retry-after") or headers.get("Retry-After"))
+        except AttributeError:
+            retry_after = None
+    return status, retry_after
+
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    """Estimativa rapida (~4 caracteres por token) para o bucket de tokens/min"""
+    return sum(len(str(m.get("content", ""))) for m in messages) // 4 + 4 * len(messages)
+
+
+class TokenBucket:
+    """Bucket com reserva: retorna quanto esperar, sem segurar o lock dormindo"""
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Consome `amount` (pode ficar negativo) e retorna a espera em segundos"""
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def adjust(self, delta: float):
+        """Corrige uma reserva (ex.: tokens reais diferentes da estimativa)"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class AdaptiveConcurrency:
+    """Limite de concorrencia AIMD: +1/limite por sucesso, metade em sobrecarga"""
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self.cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, overloaded: bool = False):
+        with self.cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if overloaded:
+                self.limit = max(float(self.minimum), self.limit / 2)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+
+class RateLimiter:
+    """Limiter de um provider: buckets RPM/TPM + concorrencia AIMD + Retry-After"""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        initial_concurrency: int = None,
+        max_retries: int = 2,
+        max_backoff_seconds: float = 60.0
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(
+            initial=initial_concurrency or max_concurrency,
+            minimum=min_concurrency,
+            maximum=max_concurrency
+        )
+        self.max_retries = max_retries
+        self.max_backoff_seconds = max_backoff_seconds
+        self.blocked_until = 0.0
+        self.consecutive_overloads = 0
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "wait_seconds": 0.0, "overloads": 0, "retries": 0}
+
+    @classmethod
+    def from_config(cls, name: str, config: Optional[Dict[str, Any]]) -> "RateLimiter":
+        config = config or {}
+        return cls(
+            name,
+            requests_per_minute=config.get("requests_per_minute", 0),
+            tokens_per_minute=config.get("tokens_per_minute", 0),
+            max_concurrency=config.get("max_concurrency", 8),
+            min_concurrency=config.get("min_concurrency", 1),
+            initial_concurrency=config.get("initial_concurrency"),
+            max_retries=config.get("max_retries", 2),
+            max_backoff_seconds=config.get("max_backoff_seconds", 60.0)
+        )
+
+    # ------------------------------------------------------------------
+    # Reserva / liberacao
+    # ------------------------------------------------------------------
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserva RPM/TPM e retorna quanto esperar (inclui Retry-After)"""
+        wait = max(0.0, self.blocked_until - time.monotonic())
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self.lock:
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["wait_seconds"] += wait
+        return wait
+
+    def acquire(self, tokens: int = 0):
+        """Bloqueia ate haver slot de concorrencia e orcamento de taxa"""
+        self.concurrency.acquire()
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        """Versao asyncio de acquire (nao bloqueia o event loop)"""
+        while not self.concurrency.try_acquire():
+            await asyncio.sleep(0.02)
+        wait = self._reserve(tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.concurrency.release()
+                raise
+
+    def release(self, status: int = None, retry_after: float = None):
+        """Libera o slot; 429/503 reduzem a concorrencia e bloqueiam novas chamadas"""
+        overloaded = status in OVERLOAD_STATUSES
+        if overloaded:
+            with self.lock:
+                self.stats["overloads"] += 1
+                self.consecutive_overloads += 1
+                backoff = retry_after
+                if backoff is None:
+                    backoff = min(self.max_backoff_seconds, 2 ** (self.consecutive_overloads - 1))
+                self.blocked_until = max(self.blocked_until, time.monotonic() + min(backoff, self.max_backoff_seconds))
+        elif status is None:
+            with self.lock:
+                self.consecutive_overloads = 0
+        self.concurrency.release(overloaded)
+
+    def charge_tokens(self, actual: int, estimated: int):
+        """Ajusta o bucket de tokens com o uso real informado pelo provider"""
+        if self.tokens and actual:
+            self.tokens.adjust(actual - estimated)
+
+    @contextmanager
+    def slot(self, tokens: int = 0):
+        """with limiter.slot(n): ... — adquire e libera classificando erros"""
+        self.acquire(tokens)
+        status, retry_after = None, None
+        try:
+            yield self
+        except Exception as e:
+            status, retry_after = classify_error(e)
+            if status is None:
+                status = 0
+            raise
+        finally:
+            self.release(status, retry_after)
+
+    @asynccontextmanager
+    async def aslot(self, tokens: int = 0):
+        await self.aacquire(tokens)
+        status, retry_after = None, None
+        try:
+            yield self
+        except Exception as e:
+            status, retry_after = classify_error(e)
+            if status is None:
+                status = 0
+            raise
+        finally:
+            self.release(status, retry_after)
+
+    def call(self, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        """Executa `fn` dentro de um slot, repetindo em 429/503 (apos o Retry-After)"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot(tokens):
+                    return fn()
+            except Exception as e:
+                status, _ = classify_error(e)
+                if status not in OVERLOAD_STATUSES or attempt >= self.max_retries:
+                    raise
+                with self.lock:
+                    self.stats["retries"] += 1
+
+    async def acall(self, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        """Versao asyncio de call; `fn` retorna um awaitable"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.aslot(tokens):
+                    return await fn()
+            except Exception as e:
+                status, _ = classify_error(e)
+                if status not in OVERLOAD_STATUSES or attempt >= self.max_retries:
+                    raise
+                with self.lock:
+                    self.stats["retries"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+        stats["concurrency_limit"] = round(self.concurrency.limit, 2)
+        stats["in_flight"] = self.concurrency.in_flight
+        stats["blocked_for_seconds"] = round(max(0.0, self.blocked_until - time.monotonic()), 2)
+        return stats
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, config: Optional[Dict[str, Any]] = None) -> RateLimiter:
+    """Retorna o limiter compartilhado do provider (criado na primeira chamada)"""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = RateLimiter.from_config(name, config)
+            _limiters[name] = limiter
+        return limiter
+
+
+def get_all_rate_limiters() -> Dict[str, RateLimiter]:
+    with _limiters_lock:
+        return dict(_limiters)
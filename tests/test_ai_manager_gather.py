@@ -0,0 +1,66 @@
+"""
+Testes do fan-out do AIManager: prompts de um lote sao chamadas sem estado,
+entao nao leem nem gravam o historico da conversa do provider.
+"""
+
+import asyncio
+
+import pytest
+
+from src.core.ai_manager import AIManager
+from src.core.single_flight import SingleFlight
+from src.providers.base_provider import BaseAIProvider
+from src.providers.http_pool import BackgroundLoop
+
+
+class HistoryProvider(BaseAIProvider):
+    """Responde com o tamanho do historico que viu, como um provider com memoria"""
+
+    def __init__(self):
+        self.history = []
+
+    def send_message(self, message, context=None):
+        return f"{message}:{len(self.history)}"
+
+    def analyze_code(self, code, language=None):
+        return {}
+
+    def generate_code(self, prompt, language="python"):
+        return ""
+
+    async def asend_message(self, message, context=None, use_history=True, **kwargs):
+        seen = len(self.history) if use_history else 0
+        await asyncio.sleep(0.01)
+        if use_history:
+            self.add_to_history("user", message)
+            self.add_to_history("assistant", message)
+        return f"{message}:{seen}"
+
+
+@pytest.fixture
+def manager():
+    m = AIManager.__new__(AIManager)
+    m.providers = {"a": HistoryProvider()}
+    m.active_provider = "a"
+    m.optimizer = None
+    m.cache = None
+    m.config = {"fallback": {"enabled": False}}
+    m.flight = SingleFlight()
+    m.first_token_latency = {}
+    m.hedge_stats = {"hedged_requests": 0, "hedges_launched": 0, "hedge_wins": 0}
+    m.health = None
+    m.background = BackgroundLoop()
+    yield m
+    m.close()
+
+
+def test_gather_does_not_touch_chat_history(manager):
+    manager.providers["a"].add_to_history("user", "conversa anterior")
+
+    assert manager.gather(["p1", "p2", "p3"], concurrency=1) == ["p1:0", "p2:0", "p3:0"]
+    assert manager.providers["a"].history == [{"role": "user", "content": "conversa anterior"}]
+
+
+def test_chat_call_still_uses_history(manager):
+    assert manager._run_async(manager.asend_message("oi", use_cache=False)) == "oi:0"
+    assert manager._run_async(manager.asend_message("de novo", use_cache=False)) == "de novo:2"
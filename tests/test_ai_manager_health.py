@@ -0,0 +1,119 @@
+"""
+Testes do circuit breaker no AIManager: um stream abandonado (GeneratorExit)
+ou um hedge cancelado devolve o slot de teste do half-open, e falhas do
+streaming levantam excecao em vez de virar chunk.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from src.core.ai_manager import AIManager, ProviderErrorResponse
+from src.core.provider_stats import HALF_OPEN, OPEN, ProviderHealth
+from src.core.single_flight import SingleFlight
+from src.providers.base_provider import BaseAIProvider
+from src.providers.http_pool import BackgroundLoop
+
+
+class FakeProvider(BaseAIProvider):
+    def __init__(self, delay: float = 0.0, chunks=("um ", "dois ", "tres")):
+        self.history = []
+        self.delay = delay
+        self.chunks = list(chunks)
+
+    def send_message(self, message, context=None, stream=False):
+        if stream:
+            return iter(self.chunks)
+        return "".join(self.chunks)
+
+    def analyze_code(self, code, language=None):
+        return {}
+
+    def generate_code(self, prompt, language="python"):
+        return ""
+
+    async def astream(self, message, context=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        for chunk in self.chunks:
+            await asyncio.sleep(0.01)
+            yield chunk
+
+
+@pytest.fixture
+def manager():
+    m = AIManager.__new__(AIManager)
+    m.providers = {"a": FakeProvider(delay=0.5), "b": FakeProvider(delay=0.05)}
+    m.active_provider = "a"
+    m.optimizer = None
+    m.cache = None
+    m.config = {"fallback": {"enabled": True, "order": ["a", "b"]}}
+    m.flight = SingleFlight()
+    m.first_token_latency = {}
+    m.hedge_stats = {"hedged_requests": 0, "hedges_launched": 0, "hedge_wins": 0}
+    m.health = ProviderHealth(state_file=None)
+    m.background = BackgroundLoop()
+    yield m
+    m.close()
+
+
+def half_open(manager, name):
+    breaker = manager.health.get(name)
+    breaker.state = HALF_OPEN
+    breaker.half_open_calls = 0
+    return breaker
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_abandoned_stream_releases_half_open_slot(manager):
+    breaker = half_open(manager, "a")
+
+    stream = manager.stream_message("x", use_cache=False)
+    assert next(stream) == "um "
+    stream.close()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.half_open_calls == 0
+    assert list(manager.stream_message("x", use_cache=False)) == ["um ", "dois ", "tres"]
+    assert breaker.state != HALF_OPEN
+
+
+def test_abandoned_hedged_stream_releases_every_slot(manager):
+    manager.config["fallback"]["hedging"] = {"enabled": True, "budget_ms": 50}
+    breakers = [half_open(manager, "a"), half_open(manager, "b")]
+
+    stream = manager.stream_message("x", use_cache=False)
+    assert next(stream) == "um "
+    stream.close()
+
+    # O perdedor e cancelado no loop de fundo
+    assert wait_for(lambda: all(b.half_open_calls == 0 for b in breakers))
+    assert manager.hedge_stats["hedge_wins"] == 1
+
+
+def test_answer_starting_with_the_word_erro_is_not_a_failure(manager):
+    manager.providers["a"] = FakeProvider(chunks=["Erros comuns em Python: ", "indentacao"])
+
+    assert "".join(manager.stream_message("x", use_cache=False)) == "Erros comuns em Python: indentacao"
+    assert manager.health.get("a").successes == 1
+
+
+def test_open_circuit_raises_instead_of_yielding(manager):
+    manager.config["fallback"]["enabled"] = False
+    breaker = manager.health.get("a")
+    breaker.state = OPEN
+    breaker.opened_at = time.time()
+
+    with pytest.raises(ProviderErrorResponse, match="Circuito aberto"):
+        list(manager.stream_message("x", use_cache=False))
+
+
+def test_missing_provider_raises(manager):
+    with pytest.raises(ProviderErrorResponse, match="Nenhum provider"):
+        list(manager.stream_message("x", provider_name="nenhum"))
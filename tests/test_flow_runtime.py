@@ -0,0 +1,118 @@
+"""
+Testes do FlowRuntime: captura de variaveis, volta, end, conexoes para
+ids inexistentes e ciclos sem ponto de espera.
+"""
+
+from src.core.flow_runtime import FlowCursor
+from src.core.json_flow_engine import FlowEngine
+
+
+def _engine(nodes, conns, model_data=None):
+    connections = [{"source": s, "source_port": p, "target": t} for s, p, t in conns]
+    return FlowEngine(nodes, connections, model_data or {"name": "Bot", "version": "1.0"})
+
+
+def _talk(engine, *messages):
+    runtime = engine.get_runtime()
+    cursor = FlowCursor()
+    turns = [runtime.step(cursor, message) for message in messages]
+    return cursor, turns
+
+
+def test_question_captures_var_on_next_turn():
+    engine = _engine(
+        [{"id": "recv", "type": "recv"},
+         {"id": "ask", "type": "question", "msg": "Qual o seu nome?", "var": "nome"},
+         {"id": "hi", "type": "send", "msg": "Prazer, {nome}! Eu sou o {bot_name}."},
+         {"id": "back", "type": "volta"}],
+        [("recv", "out", "ask"), ("ask", "out", "hi"), ("hi", "out", "back")],
+    )
+    cursor, (first, second) = _talk(engine, "oi", "Ana")
+
+    assert first.outputs == ["Qual o seu nome?"]
+    assert first.waiting_on == "ask"
+    assert second.outputs == ["Prazer, Ana! Eu sou o Bot."]
+    assert cursor.context["nome"] == "Ana"
+    assert cursor.turn == 2
+
+
+def test_volta_restarts_from_the_beginning():
+    engine = _engine(
+        [{"id": "recv", "type": "recv"},
+         {"id": "echo", "type": "send", "msg": "Voce disse: {input}"},
+         {"id": "back", "type": "volta"}],
+        [("recv", "out", "echo"), ("echo", "out", "back")],
+    )
+    cursor, turns = _talk(engine, "um", "dois")
+
+    assert [t.outputs for t in turns] == [["Voce disse: um"], ["Voce disse: dois"]]
+    assert [t.path for t in turns] == [["recv", "echo", "back"]] * 2
+    assert cursor.node is None
+
+
+def test_end_clears_the_conversation():
+    engine = _engine(
+        [{"id": "recv", "type": "recv", "var": "pedido"},
+         {"id": "bye", "type": "send", "msg": "Pedido {pedido} registrado."},
+         {"id": "end", "type": "end"}],
+        [("recv", "out", "bye"), ("bye", "out", "end")],
+    )
+    cursor, (turn,) = _talk(engine, "pizza")
+
+    assert turn.outputs == ["Pedido pizza registrado."]
+    assert turn.ended
+    assert cursor.context == {}
+    assert cursor.node is None
+
+
+def test_dangling_target_ends_the_flow():
+    engine = _engine(
+        [{"id": "recv", "type": "recv"},
+         {"id": "send", "type": "send", "msg": "ok"}],
+        [("recv", "out", "ghost"), ("recv", "out", "send")],
+    )
+    cursor, (turn,) = _talk(engine, "oi")
+
+    assert turn.path == ["recv"]
+    assert turn.outputs == []
+    assert not turn.truncated
+    assert cursor.to_dict()["turn"] == 1
+
+
+def test_dangling_target_after_output():
+    engine = _engine(
+        [{"id": "recv", "type": "recv"},
+         {"id": "send", "type": "send", "msg": "ok"}],
+        [("recv", "out", "send"), ("send", "out", "ghost")],
+    )
+    _, turns = _talk(engine, "oi", "de novo")
+
+    assert [t.outputs for t in turns] == [["ok"], ["ok"]]
+
+
+def test_cycle_without_wait_point_emits_each_node_once():
+    engine = _engine(
+        [{"id": "recv", "type": "recv"},
+         {"id": "a", "type": "send", "msg": "A"},
+         {"id": "b", "type": "send", "msg": "B"}],
+        [("recv", "out", "a"), ("a", "out", "b"), ("b", "out", "a")],
+    )
+    cursor, (turn,) = _talk(engine, "oi")
+
+    assert turn.truncated
+    assert turn.outputs == ["A", "B"]
+    assert turn.path == ["recv", "a", "b"]
+    assert cursor.node is None
+
+
+def test_loop_back_to_input_waits_instead_of_truncating():
+    engine = _engine(
+        [{"id": "recv", "type": "recv"},
+         {"id": "echo", "type": "send", "msg": "{input}"}],
+        [("recv", "out", "echo"), ("echo", "out", "recv")],
+    )
+    cursor, turns = _talk(engine, "um", "dois")
+
+    assert [t.outputs for t in turns] == [["um"], ["dois"]]
+    assert not any(t.truncated for t in turns)
+    assert cursor.node == "recv"
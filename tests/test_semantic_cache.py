@@ -0,0 +1,53 @@
+"""
+Testes do tier semantico do ResponseCache: prompts quase identicos com
+sentido oposto (numeros, negacao, prefixos, ordem das palavras) nunca
+compartilham resposta.
+"""
+
+import pytest
+
+from src.core.response_cache import ResponseCache
+from src.core.semantic_cache import (
+    MinHasher, SemanticIndex, normalize_prompt, order_conflict, polarity_conflict
+)
+
+OPPOSITE_PAIRS = [
+    ("ordene a lista de numeros em ordem crescente", "ordene a lista de numeros em ordem decrescente"),
+    ("como usar async nessa funcao em python", "como nao usar async nessa funcao em python"),
+    ("converta 100 dolares para reais pela cotacao de hoje", "converta 900 dolares para reais pela cotacao de hoje"),
+    ("copie os arquivos da pasta origem para a pasta destino", "copie os arquivos da pasta destino para a pasta origem"),
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    # Threshold baixo de proposito: a rejeicao nao pode depender dele
+    return ResponseCache(str(tmp_path / "cache"), semantic_threshold=0.8)
+
+
+@pytest.mark.parametrize("cached, asked", OPPOSITE_PAIRS + [(b, a) for a, b in OPPOSITE_PAIRS])
+def test_opposite_prompts_do_not_share_answers(cache, cached, asked):
+    cache.set(cached, "", "resposta de: " + cached, "m")
+
+    assert cache.get_similar(asked, "", "m") is None
+    assert cache.semantic_hits == 0
+
+
+@pytest.mark.parametrize("a, b", OPPOSITE_PAIRS)
+def test_opposite_pairs_are_similar_enough_to_need_the_guard(tmp_path, a, b):
+    index = SemanticIndex(str(tmp_path / "semantic"))
+    assert MinHasher.similarity(index.signature(a), index.signature(b)) >= 0.8
+    a, b = normalize_prompt(a), normalize_prompt(b)
+    assert polarity_conflict(a, b) or order_conflict(a, b)
+
+
+def test_near_duplicate_still_hits(cache):
+    cache.set("Como usar async nessa função em Python?", "", "use asyncio.run", "m")
+
+    assert cache.get_similar("como usar async nessa funcao em python", "", "m") == "use asyncio.run"
+    assert cache.semantic_hits == 1
+
+
+def test_default_threshold_is_strict(tmp_path):
+    index = SemanticIndex(str(tmp_path / "semantic"))
+    assert index.threshold >= 0.95